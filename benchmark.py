@@ -0,0 +1,190 @@
+"""
+Benchmarks for the report pipeline on synthetic reports.
+
+For each size, generates Domubank-schema reports with make_test_data.py
+(kept under data/synthetic/<rows>_<days>d and reused by later runs), then
+times every stage of the pipeline and records its memory:
+
+    load_data (csv)      parse the CSVs (sidecars removed first)
+    load_data (sidecar)  read the typed sidecars written by the first load
+    define_events        apply the event rules
+    compute_call_level_metrics / compute_loan_level_metrics
+    time_series          resample the hourly table to every granularity
+    plot_*               each chart builder in charts.py, on its usual input
+
+seconds is the best of --repeat runs; peak_bytes is the tracemalloc peak
+above the level at stage start during one extra traced run (NumPy and pandas
+allocations are traced, Arrow's own buffers are not).
+
+Usage:
+    python benchmark.py --sizes 10K 100K 1M --save benchmarks/baseline.json
+    python benchmark.py --sizes 10K 100K --compare benchmarks/baseline.json
+
+--compare prints each stage's time against the baseline and exits with
+status 1 when any stage is slower than --tolerance times its baseline.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from make_test_data import OUTPUT_DIR, parse_rows, write_reports
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "src"))
+from aggregates import CallAggregates
+from charts import (
+    plot_activity_heatmap, plot_attempts_to_value_distribution, plot_forwarded_by_attempt, plot_metrics_over_time,
+    plot_minutes_to_value_distribution, plot_non_value_reasons, plot_promise_breakdown, plot_time_distribution,
+    plot_value_event_by_attempt
+)
+from metrics import compute_call_level_metrics, compute_loan_level_metrics, define_events, load_data
+from report_dataset import report_paths
+from report_io import sidecar_path
+from snapshot import chart_series
+
+DEFAULT_SIZES = ['10K', '100K', '1M']
+
+
+def dataset(rows, days, regenerate=False):
+    """Synthetic report files for rows calls over days files, generated once."""
+    out_dir = OUTPUT_DIR / f"{rows}_{days}d"
+    paths = report_paths(out_dir)
+    if regenerate or len(paths) != days:
+        paths = tuple(write_reports(out_dir, rows, days))
+    return paths
+
+
+def remove_sidecars(paths):
+    for path in paths:
+        sidecar_path(path).unlink(missing_ok=True)
+
+
+def measure(fn, repeat, setup=None):
+    """(best seconds over repeat runs, traced peak bytes of one more run, last result)."""
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    if setup is not None:
+        setup()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    result = fn()
+    peak = max(0, tracemalloc.get_traced_memory()[1] - base)
+    if not tracing:
+        tracemalloc.stop()
+    return best, peak, result
+
+
+def run_size(rows, days, repeat, regenerate=False):
+    """Benchmark results (one dict per stage) for one dataset size."""
+    paths = dataset(rows, days, regenerate)
+    results = []
+
+    def record(stage, fn, setup=None):
+        seconds, peak, result = measure(fn, repeat, setup)
+        results.append({'rows': rows, 'stage': stage, 'seconds': round(seconds, 6), 'peak_bytes': peak})
+        print(f"{rows:>12,}  {stage:<40} {seconds:>10.4f}s {peak / 1e6:>10.1f} MB", flush=True)
+        return result
+
+    record('load_data (csv)', lambda: load_data(paths), setup=lambda: remove_sidecars(paths))
+    df = record('load_data (sidecar)', lambda: load_data(paths))
+    # define_events adds columns to its input; give every run the same loaded frame
+    events = record('define_events', lambda: define_events(df.copy()))
+    call_metrics = record('compute_call_level_metrics', lambda: compute_call_level_metrics(events))
+    loan_metrics_df, _ = record('compute_loan_level_metrics', lambda: compute_loan_level_metrics(events))
+
+    call_aggs = CallAggregates.from_frame(events)
+    series = chart_series(call_aggs)
+    time_series = record('time_series', call_aggs.time_series)
+    record('plot_value_event_by_attempt', lambda: plot_value_event_by_attempt(series['attempt_stats']))
+    record('plot_minutes_to_value_distribution', lambda: plot_minutes_to_value_distribution(loan_metrics_df))
+    record('plot_promise_breakdown', lambda: plot_promise_breakdown(series['promise_category_counts']))
+    record('plot_attempts_to_value_distribution', lambda: plot_attempts_to_value_distribution(loan_metrics_df))
+    record('plot_metrics_over_time', lambda: plot_metrics_over_time(time_series.stats('day')))
+    record('plot_activity_heatmap', lambda: plot_activity_heatmap(time_series.heatmap()))
+    record('plot_forwarded_by_attempt', lambda: plot_forwarded_by_attempt(series['forward_by_attempt']))
+    record('plot_non_value_reasons', lambda: plot_non_value_reasons(series['non_value_end_reason_counts']))
+    record('plot_time_distribution', lambda: plot_time_distribution(call_metrics))
+    return results
+
+
+def environment():
+    """Where a baseline was measured; timings only compare within one machine."""
+    return {
+        'recorded_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print each stage against the baseline; returns the stages slower than tolerance times baseline."""
+    saved = {(row['rows'], row['stage']): row for row in baseline['results']}
+    regressions = []
+    print(f"\n{'rows':>12}  {'stage':<40} {'baseline':>10} {'now':>10} {'ratio':>7}")
+    for row in results:
+        before = saved.get((row['rows'], row['stage']))
+        if before is None:
+            continue
+        ratio = row['seconds'] / before['seconds'] if before['seconds'] else float('inf')
+        flag = ""
+        if ratio > tolerance:
+            flag = "  SLOWER"
+            regressions.append(row)
+        print(f"{row['rows']:>12,}  {row['stage']:<40} {before['seconds']:>9.4f}s {row['seconds']:>9.4f}s "
+              f"{ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the report pipeline on synthetic reports.")
+    parser.add_argument('--sizes', nargs='+', type=parse_rows, default=[parse_rows(s) for s in DEFAULT_SIZES],
+                        help="total calls per dataset, e.g. 10K 1M 50M")
+    parser.add_argument('--days', type=int, default=7, help="report files per dataset")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per stage (the best is kept)")
+    parser.add_argument('--regenerate', action='store_true', help="rewrite the synthetic reports")
+    parser.add_argument('--save', help="write the results as a baseline JSON file")
+    parser.add_argument('--compare', help="baseline JSON file to compare against")
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help="slowdown ratio above which a stage counts as a regression")
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>12}  {'stage':<40} {'seconds':>11} {'peak':>13}")
+    results = [row for rows in args.sizes for row in run_size(rows, args.days, args.repeat, args.regenerate)]
+
+    if args.save:
+        out = Path(args.save)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps({'environment': environment(), 'days': args.days, 'results': results},
+                                  indent=2) + "\n")
+        print(f"\nSaved baseline to {out}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
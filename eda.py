@@ -3,10 +3,14 @@ Exploratory Data Analysis (EDA) for Domubank Report
 This script helps understand the structure, columns, and patterns in the call data.
 """
 
+import sys
 import pandas as pd
 import numpy as np
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / "src"))
+from report_io import read_report
+
 # Load the data
 data_file = Path("data/domubank_report_11272025 - Domubankreport.csv")
 print("=" * 80)
@@ -14,7 +18,8 @@ print("DOMUBANK REPORT - EXPLORATORY DATA ANALYSIS")
 print("=" * 80)
 print(f"\nLoading data from: {data_file}")
 
-df = pd.read_csv(data_file)
+# Typed columns come from the sidecar cache when it is fresh
+df = read_report(data_file)
 
 # Remove unnamed columns (empty columns at the end)
 df = df.loc[:, ~df.columns.str.contains('^Unnamed')]
@@ -71,7 +76,7 @@ print(f"\n{'='*80}")
 print("4. CATEGORICAL COLUMNS - VALUE COUNTS")
 print("="*80)
 
-categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
+categorical_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
 
 for col in categorical_cols:
     unique_count = df[col].nunique()
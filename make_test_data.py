@@ -1,43 +1,350 @@
-import json
-import pandas as pd
-from datetime import datetime, timedelta
+"""
+Synthetic Domubank reports for testing and benchmarking the pipeline at scale.
+
+Writes report CSVs with the same columns and value formats as the real
+exports (domubank_report_MMDDYYYY.csv, one file per day), from 10K to tens of
+millions of rows. Everything is generated with vectorized NumPy, one chunk
+at a time, so memory stays bounded by the chunk size whatever the row count.
+
+Each loan gets a sequence of attempts 1..k (k drawn from the attempt mix of
+the sample report), one call per attempt on successive days, and stops being
+called after its first promise or forward. A share of the loans (CARRY_SHARE)
+is still being called when a report is exported: their remaining attempts go
+to the next day's report, so a loan's calls can span several files.
+Category, end_reason and status
+are drawn jointly from the combinations seen in the sample report, and
+calls that never connected have no started_at, duration or recording, as
+in the exports. Transcripts and summaries are optional, since they dominate
+file size.
+
+Usage:
+    python make_test_data.py --rows 1M --days 7
+    python make_test_data.py --rows 10K --transcripts -o /tmp/reports
+"""
+
+import argparse
+import sys
 from pathlib import Path
 
-# Ensure data directory exists
-DATA_DIR = Path("data")
-DATA_DIR.mkdir(exist_ok=True)
-
-# Generate synthetic call-level data
-base = datetime(2026, 1, 10, 14, 0)
-
-rows = []
-for i in range(50):
-    rows.append({
-        "call_id": f"call_{i}",
-        "client_id": "bank_01" if i < 30 else "bank_02",
-        "start_time": (base + timedelta(minutes=i)).isoformat(),
-        "duration_sec": 60 + i * 3,
-        "status": "completed" if i % 5 != 0 else "dropped",
-        "resolution": (
-            "promise_to_pay"
-            if i % 4 == 0
-            else "paid"
-            if i % 7 == 0
-            else "none"
-        ),
-        "llm_latency_ms": 280 + (i % 10) * 15
-    })
-
-df = pd.DataFrame(rows)
-
-# Write CSV
-csv_path = DATA_DIR / "calls.csv"
-df.to_csv(csv_path, index=False)
-
-# Write JSON (array format)
-json_path = DATA_DIR / "calls.json"
-with open(json_path, "w") as f:
-    json.dump(rows, f, indent=2)
-
-print(f"Created {csv_path}")
-print(f"Created {json_path}")
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "src"))
+from report_io import write_export
+
+# Generated reports go here by default (outside the dashboard's data directory)
+OUTPUT_DIR = Path("data/synthetic")
+
+# Rows generated and written at a time
+CHUNK_ROWS = 500_000
+
+REPORT_COLUMNS = [
+    'loan_number', 'created_at', 'started_at', 'target_id', 'external_id', 'phone_number', 'category',
+    'end_reason', 'status', 'duration', 'attempt', 'state', 'recording_url', 'transcript', 'summary'
+]
+
+# Loans with exactly k attempts, from the attempt counts of the sample report
+ATTEMPT_WEIGHTS = np.array([2, 10, 23, 70, 7, 30, 27, 18, 9], dtype=float)
+
+# (category, end_reason, status, weight, mean duration in seconds, transcript kind);
+# weights are the sample report's counts, duration None means the call never connected
+OUTCOMES = [
+    ('VOICEMAIL', 'customer-ended-call', 'voicemailed', 149, 83.5, 'voicemail'),
+    (None, None, 'failed', 112, None, None),
+    ('NO_ANSWER', 'silence-timed-out', 'picked_up', 96, 25.9, 'greeting'),
+    ('VOICEMAIL', 'silence-timed-out', 'voicemailed', 84, 48.2, 'voicemail'),
+    ('NO_INFORMATION', 'customer-busy', 'missed', 77, None, None),
+    ('NO_INFORMATION', 'silence-timed-out', 'picked_up', 70, 26.6, 'greeting'),
+    ('HUNG_UP_EARLY', 'silence-timed-out', 'answered', 69, 29.0, 'greeting'),
+    ('NO_INFORMATION', 'customer-did-not-answer', 'missed', 63, None, None),
+    ('NO_INFORMATION', 'silence-timed-out', 'answered', 62, 35.2, 'greeting'),
+    ('NO_ANSWER', 'customer-ended-call', 'picked_up', 55, 8.7, 'greeting'),
+    ('NO_INFORMATION', 'silence-timed-out', 'voicemailed', 36, 30.9, 'greeting'),
+    ('NO_INFORMATION', 'customer-ended-call', 'picked_up', 30, 9.1, 'greeting'),
+    ('NO_INFORMATION', 'customer-ended-call', 'answered', 23, 38.6, 'conversation'),
+    ('HUNG_UP_EARLY', 'silence-timed-out', 'voicemailed', 21, 30.8, 'greeting'),
+    ('HUNG_UP_EARLY', 'customer-ended-call', 'answered', 10, 34.2, 'conversation'),
+    ('NO_INFORMATION', 'twilio-failed-to-connect-call', 'missed', 7, None, None),
+    ('WRONG_PERSON', 'silence-timed-out', 'answered', 5, 38.0, 'conversation'),
+    ('VOICEMAIL', 'silence-timed-out', 'answered', 4, 28.5, 'greeting'),
+    ('DO_NOT_CALL', 'customer-ended-call', 'answered', 2, 64.5, 'conversation'),
+    ('PROMISE_TO_PAY', 'customer-ended-call', 'answered', 3, 123.4, 'promise'),
+    ('QUESTIONS_FOR_AGENT', 'assistant-forwarded-call', 'answered', 2, 122.3, 'forward'),
+    ('WANTS_CALL_BACK', 'customer-ended-call', 'answered', 1, 48.3, 'conversation'),
+    ('UNABLE_TO_PAY', 'customer-ended-call', 'answered', 1, 91.3, 'conversation'),
+    ('WILLING_TO_PAY', 'customer-ended-call', 'answered', 1, 84.2, 'promise'),
+    ('PARTIAL_PAYMENT_ACCEPTED', 'customer-ended-call', 'answered', 1, 153.7, 'promise'),
+]
+
+# Outcomes after which a loan is not called again (the default event rules' value events)
+VALUE_CATEGORIES = {'PROMISE_TO_PAY', 'WILLING_TO_PAY', 'PARTIAL_PAYMENT_ACCEPTED', 'QUESTIONS_FOR_AGENT'}
+
+# Share of loans whose remaining attempts are moved to the next report
+CARRY_SHARE = 0.2
+
+# Calls are placed between 10:00 and 17:00
+CALL_HOURS = (10, 17)
+
+STATES = [
+    'Alabama', 'Alaska', 'Arizona', 'Arkansas', 'California', 'Colorado', 'Connecticut', 'Delaware', 'Florida',
+    'Georgia', 'Hawaii', 'Idaho', 'Illinois', 'Indiana', 'Iowa', 'Kansas', 'Kentucky', 'Louisiana', 'Maine',
+    'Maryland', 'Massachusetts', 'Michigan', 'Minnesota', 'Mississippi', 'Missouri', 'Montana', 'Nebraska',
+    'Nevada', 'New Hampshire', 'New Jersey', 'New Mexico', 'New York', 'North Carolina', 'North Dakota', 'Ohio',
+    'Oklahoma', 'Oregon', 'Pennsylvania', 'Rhode Island', 'South Carolina', 'South Dakota', 'Tennessee', 'Texas',
+    'Utah', 'Vermont', 'Virginia', 'Washington', 'West Virginia', 'Wisconsin', 'Wyoming'
+]
+
+RECORDING_URL_PREFIX = ("https://domu-call-recordings.s3.amazonaws.com/CLT18e506655afadf227fde1891280b5bb0/"
+                        "CMP7cd673d92d54b83d38d755a2dc2769a6/")
+
+FIRST_NAMES = ['Naomi', 'Diego', 'Elizabeth', 'Marcus', 'Aisha', 'Tom', 'Priya', 'Carlos', 'Grace', 'Wei']
+LAST_NAMES = ['Lopez', 'Romanin', 'Aguilar', 'Givens', 'Carter', 'Nguyen', 'Patel', 'Brooks', 'Kim', 'Moreno']
+
+GREETING = "AI: Hi. I'm Sarah, a virtual agent calling on a monitored or recorded line. May I speak to {name}?"
+
+# Transcript lines and summary per kind; exports store newlines as a literal \n
+TRANSCRIPTS = {
+    'greeting': ([GREETING], "The AI virtual agent called on a recorded line to reach {name} and asked to confirm "
+                             "their identity. No customer response or payment discussion occurred."),
+    'voicemail': ([GREETING, "AI: Hi {first}, this is Sarah from Domu Acceptance. Please call us back at "
+                             "1-800-555-0134 about your account. Thank you."],
+                  "The AI reached voicemail for {name} and left a callback message with a return phone number. "
+                  "No conversation with the customer occurred."),
+    'conversation': ([GREETING, "User: Who is calling?", "AI: This is Sarah from Domu Acceptance, calling about "
+                                "your account ending in {digits}.", "User: I can't talk right now.",
+                      "AI: I understand. We will try you again another time. Goodbye."],
+                     "The AI reached {name}, who said they could not talk. No payment or reason for nonpayment "
+                     "was discussed."),
+    'promise': ([GREETING, "User: Yes, this is {first}.", "AI: I'm calling about your past due payment of "
+                                                           "${amount}. Are you able to make a payment today?",
+                 "User: I can pay ${amount} on Friday.", "AI: Thank you, {first}. I've noted your promise to pay "
+                                                          "${amount} on Friday. Is there anything else?",
+                 "User: No, that's all."],
+                "{name} confirmed their identity and promised to pay ${amount} on Friday."),
+    'forward': ([GREETING, "User: Yes. I have a question about my balance.",
+                 "AI: Let me transfer you to an agent who can help with that. Please hold."],
+                "{name} had a question about their balance and the AI forwarded the call to a human agent."),
+}
+
+# Distinct transcript/summary texts generated per kind
+TEXT_VARIANTS = 64
+
+
+def parse_rows(text):
+    """Row count from '50000', '10K' or '50M'."""
+    text = str(text).strip().upper().replace('_', '')
+    scale = {'K': 1_000, 'M': 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip('KM')) * scale)
+
+
+def _hex_ids(rng, n, prefix):
+    """n ids of prefix + 32 random hex digits, built as one byte array."""
+    digits = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)[rng.integers(0, 16, size=(n, 32), dtype=np.uint8)]
+    head = np.broadcast_to(np.frombuffer(prefix.encode(), dtype=np.uint8), (n, len(prefix)))
+    raw = np.ascontiguousarray(np.concatenate([head, digits], axis=1))
+    return raw.view(f"S{raw.shape[1]}").ravel().astype(str)
+
+
+def _text_pools(rng):
+    """(transcripts, summaries) object arrays per kind, TEXT_VARIANTS texts each."""
+    pools = {}
+    for kind, (lines, summary) in TRANSCRIPTS.items():
+        transcripts, summaries = [], []
+        for _ in range(TEXT_VARIANTS):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            values = {'first': first, 'name': f"{first} {last}", 'digits': f"{rng.integers(1000, 10000)}",
+                      'amount': f"{rng.integers(50, 800)}.00"}
+            transcripts.append("\\n".join(line.format(**values) for line in lines) + "\\n")
+            summaries.append(summary.format(**values))
+        pools[kind] = (np.array(transcripts, dtype=object), np.array(summaries, dtype=object))
+    return pools
+
+
+class ReportGenerator:
+    """Vectorized generator of report rows in the export schema."""
+
+    def __init__(self, seed=0, transcripts=False):
+        self.rng = np.random.default_rng(seed)
+        self.transcripts = transcripts
+        self._pools = _text_pools(np.random.default_rng(seed)) if transcripts else None
+        weights = np.array([outcome[3] for outcome in OUTCOMES], dtype=float)
+        self._outcome_p = weights / weights.sum()
+        self._attempt_p = ATTEMPT_WEIGHTS / ATTEMPT_WEIGHTS.sum()
+        self._value = np.array([outcome[0] in VALUE_CATEGORIES for outcome in OUTCOMES])
+        self._duration = np.array([np.nan if outcome[4] is None else outcome[4] for outcome in OUTCOMES])
+        # (report_date, calls) held back from a report for the reports after it
+        self._carried = []
+
+    def _loan_calls(self, n_loans):
+        """Attempt sequences for n_loans loans, cut after each loan's first value outcome."""
+        rng = self.rng
+        attempts = rng.choice(np.arange(1, len(ATTEMPT_WEIGHTS) + 1), size=n_loans, p=self._attempt_p)
+        loan = np.repeat(np.arange(n_loans), attempts)
+        starts = np.cumsum(attempts) - attempts
+        attempt = np.arange(len(loan)) - starts[loan] + 1
+        outcome = rng.choice(len(OUTCOMES), size=len(loan), p=self._outcome_p)
+
+        # Value outcomes earlier in the same loan; a loan is not called after one
+        value = self._value[outcome].astype(np.int64)
+        values_before = np.cumsum(value) - value
+        keep = values_before == values_before[starts][loan]
+        return loan[keep], attempt[keep], outcome[keep]
+
+    def calls(self, rows, report_date, window_days=7, carry_share=0.0):
+        """A frame of rows calls in the export schema, for the report exported on report_date.
+
+        Each loan's last attempt falls within window_days before report_date.
+        With carry_share, that share of the loans keeps its later attempts
+        back for the next report date; the calls carried from an earlier
+        report are prepended to the frame, in addition to rows.
+        """
+        report_date = pd.Timestamp(report_date).normalize()
+        carried = self._take_carried(report_date)
+        df = self._new_calls(rows, report_date, window_days)
+        if carry_share > 0:
+            df = self._carry(df, carry_share, report_date)
+        return pd.concat([carried, df], ignore_index=True) if len(carried) else df
+
+    def _take_carried(self, report_date):
+        """Calls carried from reports before report_date, moved forward by the days between them."""
+        carried = [(date, df) for date, df in self._carried if date < report_date]
+        self._carried = [(date, df) for date, df in self._carried if date >= report_date]
+        frames = [df.assign(created_at=df['created_at'] + (report_date - date),
+                            started_at=df['started_at'] + (report_date - date)) for date, df in carried]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=REPORT_COLUMNS)
+
+    def _carry(self, df, carry_share, report_date):
+        """Hold back the later attempts of carry_share of the loans with two or more calls in df."""
+        rng = self.rng
+        codes, loans = pd.factorize(df['loan_number'])
+        counts = np.bincount(codes, minlength=len(loans))
+        # Calls kept in this report per loan: all of them, or 1..n-1 for carried loans
+        kept = np.where(rng.random(len(loans)) < carry_share, rng.integers(1, np.maximum(counts, 2)), counts)
+        first = np.searchsorted(codes, np.arange(len(loans)))
+        later = np.arange(len(df)) - first[codes] >= kept[codes]
+        if later.any():
+            self._carried.append((report_date, df[later].reset_index(drop=True)))
+        return df[~later].reset_index(drop=True)
+
+    def _new_calls(self, rows, report_date, window_days):
+        """rows calls of new loans, each loan's last attempt within window_days before report_date."""
+        rng = self.rng
+        # Enough loans for rows calls (with a margin for cut sequences); the last loan may be cut short
+        mean_attempts = (np.arange(1, len(ATTEMPT_WEIGHTS) + 1) * self._attempt_p).sum()
+        loan, attempt, outcome = self._loan_calls(int(rows / mean_attempts * 1.1) + 1)
+        while len(loan) < rows:
+            more = self._loan_calls(int((rows - len(loan)) / mean_attempts * 1.1) + 1)
+            loan = np.concatenate([loan, more[0] + loan[-1] + 1])
+            attempt = np.concatenate([attempt, more[1]])
+            outcome = np.concatenate([outcome, more[2]])
+        loan, attempt, outcome = loan[:rows], attempt[:rows], outcome[:rows]
+        n_loans = loan[-1] + 1 if rows else 0
+
+        # One attempt a day (sometimes two days apart), ending within the window before the report date
+        day = np.cumsum(rng.choice([1, 1, 1, 2], size=rows)) - 1
+        first = np.searchsorted(loan, np.arange(n_loans))
+        day = day - day[first][loan]
+        last_day = np.zeros(n_loans, dtype=np.int64)
+        np.maximum.at(last_day, loan, day)
+        start_day = -last_day - rng.integers(0, window_days, size=n_loans)
+        seconds = (start_day[loan] + day) * 86_400 + rng.integers(CALL_HOURS[0] * 3600, CALL_HOURS[1] * 3600, size=rows)
+        started_at = pd.Timestamp(report_date).normalize() + pd.to_timedelta(seconds, unit='s')
+        created_at = started_at - pd.to_timedelta(rng.integers(1, 53, size=rows), unit='s')
+
+        mean_duration = self._duration[outcome]
+        connected = ~np.isnan(mean_duration)
+        duration = np.round(mean_duration * rng.lognormal(0.0, 0.35, size=rows), 3)
+
+        loan_numbers = _hex_ids(rng, n_loans, "CLL")[loan]
+        df = pd.DataFrame({
+            'loan_number': loan_numbers,
+            'created_at': created_at,
+            'started_at': started_at.where(connected),
+            'target_id': _hex_ids(rng, n_loans, "TGT")[loan],
+            'external_id': rng.integers(1_000_000, 10_000_000, size=rows),
+            'phone_number': rng.integers(10_000_000, 200_000_000, size=n_loans)[loan],
+            'category': pd.Categorical.from_codes(*self._labels(outcome, 0)),
+            'end_reason': pd.Categorical.from_codes(*self._labels(outcome, 1)),
+            'status': pd.Categorical.from_codes(*self._labels(outcome, 2)),
+            'duration': duration,
+            'attempt': attempt,
+            'state': pd.Categorical.from_codes(rng.integers(0, len(STATES), size=n_loans)[loan], STATES),
+            'recording_url': (RECORDING_URL_PREFIX + pd.Series(loan_numbers, dtype=object)).where(connected),
+        })
+        df['transcript'], df['summary'] = self._texts(outcome, connected)
+        return df[REPORT_COLUMNS]
+
+    @staticmethod
+    def _labels(outcome, field):
+        """(codes, categories) of an OUTCOMES field for each call; None is missing."""
+        labels = [o[field] for o in OUTCOMES]
+        categories = sorted({label for label in labels if label is not None})
+        lookup = np.array([-1 if label is None else categories.index(label) for label in labels])
+        return lookup[outcome], categories
+
+    def _texts(self, outcome, connected):
+        rows = len(outcome)
+        transcript = np.full(rows, None, dtype=object)
+        summary = np.full(rows, None, dtype=object)
+        if not self.transcripts:
+            return transcript, summary
+        kinds = np.array([o[5] for o in OUTCOMES], dtype=object)[outcome]
+        for kind, (transcripts, summaries) in self._pools.items():
+            rows_of_kind = np.flatnonzero((kinds == kind) & connected)
+            pick = self.rng.integers(0, TEXT_VARIANTS, size=len(rows_of_kind))
+            transcript[rows_of_kind] = transcripts[pick]
+            summary[rows_of_kind] = summaries[pick]
+        return transcript, summary
+
+    def chunks(self, rows, report_date, chunk_rows=CHUNK_ROWS, carry_share=0.0):
+        """Yield rows calls for one report as frames of chunk_rows rows, plus the calls carried into it (see calls)."""
+        for offset in range(0, rows, chunk_rows):
+            yield self.calls(min(chunk_rows, rows - offset), report_date, carry_share=carry_share)
+
+
+def report_file_name(report_date):
+    return f"domubank_report_{pd.Timestamp(report_date):%m%d%Y}.csv"
+
+
+def write_reports(out_dir, rows, days=1, end_date="2025-11-27", seed=0, transcripts=False, chunk_rows=CHUNK_ROWS,
+                  carry_share=CARRY_SHARE):
+    """Write rows calls split over one report file per day, ending at end_date. Returns the paths.
+
+    carry_share of the loans in each report but the last continue in the next one.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    generator = ReportGenerator(seed, transcripts)
+    dates = pd.date_range(end=pd.Timestamp(end_date), periods=days, freq='D')
+    paths = []
+    for i, report_date in enumerate(dates):
+        file_rows = rows // days + (1 if i < rows % days else 0)
+        path = out_dir / report_file_name(report_date)
+        with open(path, 'wb') as f:
+            share = carry_share if i < len(dates) - 1 else 0.0
+            write_export(generator.chunks(file_rows, report_date, chunk_rows, share), f, 'csv')
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic Domubank report CSVs.")
+    parser.add_argument('--rows', type=parse_rows, default=parse_rows('10K'), help="total calls, e.g. 10K or 50M")
+    parser.add_argument('--days', type=int, default=1, help="number of daily report files")
+    parser.add_argument('--end-date', default="2025-11-27", help="date of the last report file")
+    parser.add_argument('--transcripts', action='store_true', help="fill transcript and summary")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-rows', type=parse_rows, default=CHUNK_ROWS, help="rows generated at a time")
+    parser.add_argument('--carry-share', type=float, default=CARRY_SHARE,
+                        help="share of loans continued in the next day's report")
+    parser.add_argument('-o', '--output', default=str(OUTPUT_DIR), help="directory to write the reports to")
+    args = parser.parse_args(argv)
+
+    paths = write_reports(args.output, args.rows, args.days, args.end_date, args.seed, args.transcripts,
+                          args.chunk_rows, args.carry_share)
+    for path in paths:
+        print(f"Created {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Persisted, incremental call aggregates across report files.
+
+AggregateState keeps one CallAggregates cube per source report file,
+together with the fingerprint of the file it was built from. Bringing the
+state up to date only aggregates files that are new or changed, so a daily
+delta costs O(rows in the delta); the totals are the merge of the per-file
+cubes, which are small (one row per distinct day x attempt x category x
+end_reason x state).
+
+States built separately (e.g. on different machines or from different
+folders) merge source by source. rebuild() recomputes every cube from the
+files so a persisted state can be checked against a from-scratch run.
+
+The state is stored as one Arrow IPC file of cube rows; the source
+fingerprints, the fingerprints of the files the cubes depend on (the event
+rules) and each source's hourly table (a few dozen rows per report day) are
+kept in its schema metadata. A state whose dependencies changed is discarded
+on load.
+"""
+
+import json
+
+import pandas as pd
+
+from aggregates import COUNT_MEASURES, DIMENSIONS, MEASURES, CallAggregates
+from report_io import CATEGORICAL_COLUMNS, file_fingerprint, pa, read_table_metadata, write_table_atomic
+
+STATE_VERSION = 2
+STATE_METADATA_KEY = b"domu.aggregate_state"
+
+
+def _hourly_json(hourly):
+    """An hourly table as JSON-ready columns (hours as ISO text)."""
+    columns = {'hour': hourly['hour'].astype(str).tolist()}
+    columns.update({name: hourly[name].tolist() for name in MEASURES})
+    return columns
+
+
+def _hourly_frame(columns):
+    hourly = pd.DataFrame(columns)
+    hourly['hour'] = pd.to_datetime(hourly['hour'])
+    return hourly.astype({name: 'int64' if name in COUNT_MEASURES else 'float64' for name in MEASURES})
+
+
+class AggregateState:
+    """Per-source call aggregates, updated incrementally as reports arrive."""
+
+    def __init__(self, depends_on=()):
+        self.depends_on = [list(file_fingerprint(p)) for p in depends_on]
+        self._sources = {}  # resolved path -> (fingerprint, CallAggregates)
+        self._total = None
+
+    @property
+    def sources(self):
+        """Resolved source paths in the state."""
+        return list(self._sources)
+
+    def is_current(self, path):
+        """Whether path is in the state with its current fingerprint."""
+        fingerprint = file_fingerprint(path)
+        entry = self._sources.get(fingerprint[0])
+        return entry is not None and entry[0] == fingerprint
+
+    def append(self, path, builder):
+        """Aggregate path with builder(path) unless the state already has it.
+
+        A source whose file changed is replaced, not added twice. Returns
+        whether the state changed.
+        """
+        if self.is_current(path):
+            return False
+        fingerprint = file_fingerprint(path)
+        self._sources[fingerprint[0]] = (fingerprint, builder(path))
+        self._total = None
+        return True
+
+    def sync(self, paths, builder):
+        """Make the state cover exactly paths: append new/changed ones, drop the rest."""
+        keep = {file_fingerprint(p)[0] for p in paths}
+        changed = False
+        for source in [s for s in self._sources if s not in keep]:
+            del self._sources[source]
+            changed = True
+        for path in paths:
+            changed = self.append(path, builder) or changed
+        if changed:
+            self._total = None
+        return changed
+
+    def merge(self, other):
+        """Return a state holding the sources of both.
+
+        The same source must have been built from the same file version and
+        both states from the same event rules; otherwise ValueError is raised.
+        """
+        if self.depends_on != other.depends_on:
+            raise ValueError("Cannot merge aggregate states built from different event rules")
+        merged = AggregateState()
+        merged.depends_on = self.depends_on
+        merged._sources = dict(self._sources)
+        for source, (fingerprint, aggs) in other._sources.items():
+            if source in merged._sources and merged._sources[source][0] != fingerprint:
+                raise ValueError(f"Aggregate states hold different versions of {source}")
+            merged._sources.setdefault(source, (fingerprint, aggs))
+        return merged
+
+    def aggregates(self, paths=None):
+        """CallAggregates over every source, or over just the given report files."""
+        if paths is not None:
+            selected = {file_fingerprint(p)[0] for p in paths}
+            total = CallAggregates()
+            for source, (_, aggs) in self._sources.items():
+                if source in selected:
+                    total = total.merge(aggs)
+            return total
+        if self._total is None:
+            total = CallAggregates()
+            for _, aggs in self._sources.values():
+                total = total.merge(aggs)
+            self._total = total
+        return self._total
+
+    def rebuild(self, builder):
+        """A new state with every source re-aggregated from its file."""
+        rebuilt = AggregateState()
+        rebuilt.depends_on = self.depends_on
+        for source in self._sources:
+            rebuilt.append(source, builder)
+        return rebuilt
+
+    def verify(self, builder):
+        """Sources whose stored cube differs from a from-scratch rebuild (empty when consistent)."""
+        rebuilt = self.rebuild(builder)
+        return [
+            source for source, (_, aggs) in self._sources.items()
+            if source not in rebuilt._sources or not aggs.equals(rebuilt._sources[source][1])
+        ]
+
+    @property
+    def nbytes(self):
+        return sum(aggs.nbytes for _, aggs in self._sources.values())
+
+    def save(self, path):
+        """Write the state to path atomically (needs pyarrow)."""
+        if pa is None:
+            raise RuntimeError("pyarrow is required to persist aggregate state")
+        frames = [aggs.cube.assign(source=source) for source, (_, aggs) in self._sources.items()]
+        cube = pd.concat(frames, ignore_index=True) if frames else CallAggregates().cube.assign(source='')
+        # Mixed-category columns become plain strings; categoricals are restored on load
+        for col in cube.columns:
+            if isinstance(cube[col].dtype, pd.CategoricalDtype) or cube[col].dtype == object:
+                cube[col] = cube[col].astype(object).where(cube[col].notna(), None)
+        table = pa.Table.from_pandas(cube, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[STATE_METADATA_KEY] = json.dumps({
+            'version': STATE_VERSION,
+            'depends_on': self.depends_on,
+            'sources': {source: list(fingerprint) for source, (fingerprint, _) in self._sources.items()},
+            'hourly': {source: _hourly_json(aggs.hourly) for source, (_, aggs) in self._sources.items()}
+        }).encode()
+        return write_table_atomic(table.replace_schema_metadata(metadata), path)
+
+    @classmethod
+    def load(cls, path, depends_on=()):
+        """Read a saved state; an empty state when missing, unreadable or built from other rules."""
+        state = cls(depends_on)
+        table, stored = read_table_metadata(path, STATE_METADATA_KEY)
+        if table is None or stored.get('version') != STATE_VERSION or stored.get('depends_on') != state.depends_on:
+            return state
+
+        cube = table.to_pandas()
+        for source, fingerprint in stored['sources'].items():
+            rows = cube.loc[cube['source'] == source].drop(columns='source').reset_index(drop=True)
+            for col in [dim for dim in DIMENSIONS if dim in CATEGORICAL_COLUMNS]:
+                rows[col] = rows[col].astype('category')
+            hourly = _hourly_frame(stored['hourly'][source])
+            state._sources[source] = (tuple(fingerprint), CallAggregates(rows, hourly))
+        return state
@@ -0,0 +1,250 @@
+"""
+Mergeable call-level aggregates.
+
+CallAggregates is an aggregate cube over the natural dimensions of a call
+(day x attempt x category x end_reason x state) holding call counts, event
+counts and duration sums. It is built from a frame with event flags (see
+define_events) in a single groupby, and every call-level metric and chart
+input is a roll-up of the cube, so their cost scales with the number of
+distinct dimension values rather than the number of calls.
+
+Next to the cube sits an hourly table: the same measures per clock hour,
+without the other dimensions. It is what the time series (see timeseries.py)
+resample to hours, days, weeks and months, at one row per hour with calls.
+
+Two cubes over disjoint sets of calls merge by adding their cells, so a
+report can be folded chunk by chunk with bounded memory and the result is the
+same as aggregating the whole frame at once.
+"""
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrumented
+from timeseries import TimeSeries
+
+DIMENSIONS = ['date', 'attempt', 'category', 'end_reason', 'state']
+
+# Measure -> (event flag, or None for every call; summed column, or None to count calls)
+MEASURES = {
+    'calls': (None, None),
+    'promise_calls': ('promise_category', None),
+    'forward_calls': ('forward_event', None),
+    'value_calls': ('value_event', None),
+    'waste_calls': ('waste_event', None),
+    'seconds': (None, 'duration'),
+    'waste_seconds': ('waste_event', 'duration'),
+    'forward_seconds': ('forward_event', 'duration')
+}
+COUNT_MEASURES = [name for name, (_, column) in MEASURES.items() if column is None]
+
+# Frame columns from_frame reads
+INPUT_COLUMNS = ['started_at'] + DIMENSIONS[1:] + ['duration'] + sorted(
+    {flag for flag, _ in MEASURES.values() if flag is not None}
+)
+
+
+def _empty_cube():
+    cube = pd.DataFrame(columns=DIMENSIONS + list(MEASURES))
+    return cube.astype({name: 'int64' if name in COUNT_MEASURES else 'float64' for name in MEASURES})
+
+
+def _empty_hourly():
+    hourly = pd.DataFrame(columns=['hour'] + list(MEASURES))
+    return hourly.astype({'hour': 'datetime64[us]',
+                          **{name: 'int64' if name in COUNT_MEASURES else 'float64' for name in MEASURES}})
+
+
+def _roll_up(cube, dimensions):
+    """Sum the measures over every dimension not listed (missing keys kept)."""
+    return cube.groupby(dimensions, dropna=False, observed=True, sort=True)[list(MEASURES)].sum()
+
+
+def _cell_key(key):
+    return str(tuple(None if pd.isna(value) else value for value in key))
+
+
+def _top(counts, n=None):
+    """Positive counts in descending order, optionally limited to the top n."""
+    counts = counts[counts > 0].astype('int64').sort_values(ascending=False, kind='stable')
+    return counts if n is None else counts.head(n)
+
+
+class CallAggregates:
+    """Aggregate cube of calls; metrics and chart inputs are roll-ups of it."""
+
+    def __init__(self, cube=None, hourly=None):
+        self.cube = _empty_cube() if cube is None else cube
+        self.hourly = _empty_hourly() if hourly is None else hourly
+
+    @classmethod
+    @instrumented('CallAggregates.from_frame')
+    def from_frame(cls, df):
+        """Aggregate a frame of calls with event flags in one pass."""
+        if len(df) == 0:
+            return cls()
+
+        frame = {}
+        # Calendar day as datetime64 (midnight); NaT for calls without started_at
+        if 'started_at' in df.columns:
+            frame['date'] = df['started_at'].dt.normalize()
+        for dim in DIMENSIONS[1:]:
+            if dim in df.columns:
+                frame[dim] = df[dim]
+        for name, (flag, column) in MEASURES.items():
+            values = df[column] if column else pd.Series(1, index=df.index)
+            frame[name] = values.where(df[flag], 0) if flag else values
+
+        frame = pd.DataFrame(frame, index=df.index)
+        for dim in DIMENSIONS:
+            if dim not in frame.columns:
+                frame[dim] = pd.NA
+
+        cube = _roll_up(frame, DIMENSIONS).reset_index()
+        hourly = None
+        if 'started_at' in df.columns:
+            # Calls without started_at are left out of the hourly table (their group key is NaT)
+            hourly = frame[list(MEASURES)].groupby(df['started_at'].dt.floor('h').rename('hour'), sort=True).sum()
+            hourly = hourly.reset_index().astype({name: 'int64' for name in COUNT_MEASURES})
+        return cls(cube.astype({name: 'int64' for name in COUNT_MEASURES}), hourly)
+
+    def merge(self, other):
+        """Return the cube of both sets of calls."""
+        if len(self.cube) == 0:
+            return CallAggregates(other.cube, other.hourly)
+        if len(other.cube) == 0:
+            return CallAggregates(self.cube, self.hourly)
+        combined = pd.concat([self.cube, other.cube], ignore_index=True)
+        hourly = pd.concat([self.hourly, other.hourly], ignore_index=True)
+        return CallAggregates(_roll_up(combined, DIMENSIONS).reset_index(), _roll_up(hourly, ['hour']).reset_index())
+
+    def equals(self, other):
+        """Whether both cubes and hourly tables hold the same cells (durations compared to float tolerance)."""
+        left = _roll_up(self.cube, DIMENSIONS)
+        right = _roll_up(other.cube, DIMENSIONS)
+        # Cells are matched by the text of their keys, so missing keys (NaN/NaT) compare equal
+        left.index = pd.Index([_cell_key(key) for key in left.index])
+        right.index = pd.Index([_cell_key(key) for key in right.index])
+        if len(left) != len(right) or not left.index.isin(right.index).all():
+            return False
+        right = right.loc[left.index]
+        left_hours = _roll_up(self.hourly, ['hour'])
+        right_hours = _roll_up(other.hourly, ['hour'])
+        if not left_hours.index.equals(right_hours.index):
+            return False
+        sums = [name for name in MEASURES if name not in COUNT_MEASURES]
+        return all(
+            (mine[COUNT_MEASURES].to_numpy() == theirs[COUNT_MEASURES].to_numpy()).all() and
+            np.allclose(mine[sums].to_numpy(dtype=float), theirs[sums].to_numpy(dtype=float))
+            for mine, theirs in ((left, right), (left_hours, right_hours))
+        )
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the cube and the hourly table."""
+        return int(self.cube.memory_usage(deep=True).sum() + self.hourly.memory_usage(deep=True).sum())
+
+    # Headline totals
+
+    @property
+    def total_calls(self):
+        return int(self.cube['calls'].sum())
+
+    @property
+    def promise_calls(self):
+        return int(self.cube['promise_calls'].sum())
+
+    @property
+    def forward_calls(self):
+        return int(self.cube['forward_calls'].sum())
+
+    @property
+    def waste_calls(self):
+        return int(self.cube['waste_calls'].sum())
+
+    @property
+    def total_seconds(self):
+        return float(self.cube['seconds'].sum())
+
+    @property
+    def waste_seconds(self):
+        return float(self.cube['waste_seconds'].sum())
+
+    @property
+    def forward_seconds(self):
+        return float(self.cube['forward_seconds'].sum())
+
+    @property
+    def forward_attempt_sum(self):
+        return int((self.cube['attempt'] * self.cube['forward_calls']).sum())
+
+    @property
+    def dated_calls(self):
+        """Calls with a started_at timestamp."""
+        return int(self.cube.loc[self.cube['date'].notna(), 'calls'].sum())
+
+    def call_metrics(self):
+        """Same dict as compute_call_level_metrics."""
+        total_calls = self.total_calls
+        if total_calls == 0:
+            return {
+                'promise_rate': 0.0,
+                'qualified_handoff_rate': 0.0,
+                'waste_rate': 0.0,
+                'total_calls': 0,
+                'cost_saved_pct': 0.0,
+                'cost_saved_minutes': 0.0
+            }
+
+        total_minutes = self.total_seconds / 60.0
+        waste_minutes = self.waste_seconds / 60.0
+        return {
+            'promise_rate': self.promise_calls / total_calls * 100,
+            'qualified_handoff_rate': self.forward_calls / total_calls * 100,
+            'waste_rate': self.waste_calls / total_calls * 100,
+            'total_calls': total_calls,
+            'cost_saved_pct': ((total_minutes - waste_minutes) / total_minutes * 100) if total_minutes > 0 else 0.0,
+            'cost_saved_minutes': total_minutes - waste_minutes,
+            'total_minutes': total_minutes,
+            'waste_minutes': waste_minutes
+        }
+
+    # Chart inputs
+
+    def attempt_stats(self):
+        """Per-attempt totals and value-event rate (columns: attempt, total, value_count, value_rate)."""
+        by_attempt = _roll_up(self.cube, ['attempt'])
+        stats = pd.DataFrame({
+            'attempt': by_attempt.index.astype('int64'),
+            'total': by_attempt['calls'].to_numpy(),
+            'value_count': by_attempt['value_calls'].to_numpy()
+        })
+        stats['value_rate'] = stats['value_count'] / stats['total'] * 100
+        return stats
+
+    def time_series(self):
+        """Counts and rates over time at every granularity, from the hourly table."""
+        return TimeSeries(self.hourly)
+
+    def forward_by_attempt(self):
+        """Forwarded calls per attempt (columns: attempt, count)."""
+        forwards = _roll_up(self.cube, ['attempt'])['forward_calls']
+        forwards = forwards[forwards > 0]
+        return pd.DataFrame({'attempt': forwards.index.astype('int64'), 'count': forwards.to_numpy()})
+
+    def _counts_by(self, dimension, measure):
+        counts = _roll_up(self.cube[self.cube[dimension].notna()], [dimension])[measure]
+        counts.index = pd.Index(counts.index.astype(object), name=dimension)
+        return counts
+
+    def promise_category_counts(self):
+        """Promise calls per category, most frequent first."""
+        return _top(self._counts_by('category', 'promise_calls'))
+
+    def end_reason_counts(self, n=None):
+        """Calls per end_reason, most frequent first."""
+        return _top(self._counts_by('end_reason', 'calls'), n)
+
+    def non_value_end_reason_counts(self, n=None):
+        """Non-value calls per end_reason, most frequent first."""
+        return _top(self._counts_by('end_reason', 'waste_calls'), n)
@@ -1,331 +1,410 @@
 """
 Domu Bank Call Metrics Dashboard
 Streamlit app for analyzing call data from domubank_report_11272025
+
+The loading and metric computations live in metrics.py, which imports
+neither streamlit nor plotly, and the chart figures in charts.py; this
+script adds the widgets and lays out the page.
 """
 
+import cProfile
+import os
+import tempfile
+from functools import partial
+
 import pandas as pd
 import numpy as np
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
-from pathlib import Path
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from datetime import datetime
 
+from aggregates import INPUT_COLUMNS as AGGREGATE_COLUMNS, CallAggregates
+from charts import (
+    HEATMAP_LABELS, MINUTES_BINS, plot_activity_heatmap, plot_attempts_to_value_distribution,
+    plot_forwarded_by_attempt, plot_metrics_over_time, plot_minutes_to_value_distribution, plot_non_value_reasons,
+    plot_promise_breakdown, plot_time_distribution, plot_value_event_by_attempt
+)
+from event_rules import load_event_rules
+from filters import FilterIndex
+from instrumentation import StageLedger, profile_bytes, profile_report
+from loan_state import EMPTY_LOAN_STATS, LOAN_COLUMNS
+from metrics import (
+    DATA_SOURCE, EVENT_RULES_FILE, SNAPSHOT_FILE, STREAM_CHUNK_ROWS, DatasetCache, apply_filters, compute_loan_level_metrics,
+    load_aggregate_state, load_loan_state, load_sqlite_report, load_text_columns, load_text_rows,
+    loan_metrics_bytes, should_stream
+)
+from report_dataset import dataset_fingerprint, partition_date, prune_partitions, report_paths
+from report_io import EXPORT_FORMATS, HEAVY_TEXT_COLUMNS, export_formats, file_fingerprint, write_export
+from snapshot import ReportSnapshot, chart_series
+from timeseries import GRANULARITIES, ROLLING_DAYS
+from watcher import DataWatcher
+
 # Page config
 st.set_page_config(page_title="Domu Bank Call Metrics", layout="wide")
 
 # Constants
-DATA_FILE = Path("data/domubank_report_11272025 - Domubankreport.csv")
-
+# Memory cap for cleaned, event-flagged reports kept across reruns (MB)
+DATASET_CACHE_MAX_MB = int(os.environ.get("DOMU_DATASET_CACHE_MAX_MB", "2048"))
 
-def load_data(path):
-    """Load and clean the CSV data."""
-    df = pd.read_csv(path)
-    
-    # Parse datetimes
-    df['created_at'] = pd.to_datetime(df['created_at'], errors='coerce')
-    df['started_at'] = pd.to_datetime(df['started_at'], errors='coerce')
-    
-    # Clean duration: numeric seconds, fill NaN with 0
-    df['duration'] = pd.to_numeric(df['duration'], errors='coerce').fillna(0)
-    
-    # Clean attempt: numeric, fill NaN with 1, cast to int
-    df['attempt'] = pd.to_numeric(df['attempt'], errors='coerce').fillna(1).astype(int)
-    
-    # Lowercase string columns for case-insensitive comparisons
-    if 'category' in df.columns:
-        df['category_lower'] = df['category'].astype(str).str.lower()
-    if 'end_reason' in df.columns:
-        df['end_reason_lower'] = df['end_reason'].astype(str).str.lower()
-    if 'status' in df.columns:
-        df['status_lower'] = df['status'].astype(str).str.lower()
-    
-    return df
-
-
-def define_events(df):
-    """Define event flags based on category and end_reason."""
-    # Promise category - includes all three promise types
-    promise_categories = ['partial_payment_accepted', 'willing_to_pay', 'promise_to_pay']
-    df['promise_category'] = df['category_lower'].isin(promise_categories)
-    
-    # Forward event (check for both variations)
-    df['forward_event'] = df['end_reason_lower'].str.contains('assistant-forward', case=False, na=False)
-    
-    # Value event
-    df['value_event'] = df['promise_category'] | df['forward_event']
-    
-    # Waste event
-    df['waste_event'] = (df['end_reason_lower'] == 'silence-timed-out') | (~df['value_event'])
-    
-    return df
-
-
-def apply_filters(df):
-    """Apply filters to the dataframe (no sidebar - filters applied at bottom)."""
-    # For now, return unfiltered data - filters will be applied at bottom of page
-    return df.copy()
-
-
-def compute_call_level_metrics(df):
-    """Compute call-level metrics."""
-    if len(df) == 0:
-        return {
-            'promise_rate': 0.0,
-            'qualified_handoff_rate': 0.0,
-            'waste_rate': 0.0,
-            'total_calls': 0,
-            'cost_saved_pct': 0.0,
-            'cost_saved_minutes': 0.0
-        }
-    
-    total_calls = len(df)
-    
-    promise_rate = (df['promise_category'].sum() / total_calls * 100) if total_calls > 0 else 0.0
-    qualified_handoff_rate = (df['forward_event'].sum() / total_calls * 100) if total_calls > 0 else 0.0
-    waste_rate = (df['waste_event'].sum() / total_calls * 100) if total_calls > 0 else 0.0
-    
-    # Cost saved: percentage of time NOT spent on waste calls
-    # Formula: (total_minutes - waste_minutes) / total_minutes * 100
-    total_minutes = df['duration'].sum() / 60.0  # Convert seconds to minutes
-    waste_minutes = df[df['waste_event']]['duration'].sum() / 60.0
-    cost_saved_pct = ((total_minutes - waste_minutes) / total_minutes * 100) if total_minutes > 0 else 0.0
-    cost_saved_minutes = total_minutes - waste_minutes
-    
-    return {
-        'promise_rate': promise_rate,
-        'qualified_handoff_rate': qualified_handoff_rate,
-        'waste_rate': waste_rate,
-        'total_calls': total_calls,
-        'cost_saved_pct': cost_saved_pct,
-        'cost_saved_minutes': cost_saved_minutes,
-        'total_minutes': total_minutes,
-        'waste_minutes': waste_minutes
-    }
-
-
-def compute_loan_level_metrics(df):
-    """Compute loan-level metrics (attempts-to-value and minutes-to-value)."""
-    if len(df) == 0 or 'loan_number' not in df.columns:
-        return pd.DataFrame(), {
-            'median_attempts_to_value': 0,
-            'mean_attempts_to_value': 0.0,
-            'p90_attempts_to_value': 0,
-            'median_minutes_to_value': 0.0,
-            'mean_minutes_to_value': 0.0,
-            'p90_minutes_to_value': 0.0
-        }
-    
-    loan_metrics = []
-    
-    for loan_num, loan_df in df.groupby('loan_number'):
-        # Sort by attempt asc, then started_at asc
-        loan_df_sorted = loan_df.sort_values(['attempt', 'started_at'], na_position='last').reset_index(drop=True)
-        
-        # Find first value_event
-        value_mask = loan_df_sorted['value_event']
-        if value_mask.sum() == 0:
-            continue  # Skip loans without value events
-        
-        # Get the index of the first True value
-        first_value_idx = value_mask.idxmax()
-        first_value_row = loan_df_sorted.iloc[first_value_idx]
-        
-        # Attempts to value
-        attempts_to_value = first_value_row['attempt']
-        
-        # Minutes to value: sum duration from first call up to and including first value event
-        rows_up_to_value = loan_df_sorted.iloc[:first_value_idx + 1]
-        seconds_to_value = rows_up_to_value['duration'].sum()
-        minutes_to_value = seconds_to_value / 60.0
-        
-        loan_metrics.append({
-            'loan_number': loan_num,
-            'attempts_to_value': attempts_to_value,
-            'minutes_to_value': minutes_to_value
-        })
-    
-    if len(loan_metrics) == 0:
-        return pd.DataFrame(), {
-            'median_attempts_to_value': 0,
-            'mean_attempts_to_value': 0.0,
-            'p90_attempts_to_value': 0,
-            'median_minutes_to_value': 0.0,
-            'mean_minutes_to_value': 0.0,
-            'p90_minutes_to_value': 0.0
-        }
-    
-    loan_metrics_df = pd.DataFrame(loan_metrics)
-    
-    stats = {
-        'median_attempts_to_value': int(loan_metrics_df['attempts_to_value'].median()),
-        'mean_attempts_to_value': loan_metrics_df['attempts_to_value'].mean(),
-        'p90_attempts_to_value': int(loan_metrics_df['attempts_to_value'].quantile(0.9)),
-        'median_minutes_to_value': loan_metrics_df['minutes_to_value'].median(),
-        'mean_minutes_to_value': loan_metrics_df['minutes_to_value'].mean(),
-        'p90_minutes_to_value': loan_metrics_df['minutes_to_value'].quantile(0.9)
-    }
-    
-    return loan_metrics_df, stats
-
-
-def plot_value_event_by_attempt(df):
-    """Interactive bar chart: value_event rate by attempt number."""
-    if len(df) == 0 or 'attempt' not in df.columns:
-        return None
-    
-    attempt_stats = df.groupby('attempt').agg(
-        total=('value_event', 'count'),
-        value_count=('value_event', 'sum')
-    ).reset_index()
-    
-    attempt_stats['value_rate'] = (attempt_stats['value_count'] / attempt_stats['total'] * 100)
-    
-    fig = px.bar(
-        attempt_stats,
-        x='attempt',
-        y='value_rate',
-        title='Value Event Rate by Attempt Number',
-        labels={'attempt': 'Attempt Number', 'value_rate': 'Value Event Rate (%)'},
-        text='value_rate',
-        text_auto='.1f'
-    )
-    fig.update_traces(textposition='outside')
-    fig.update_layout(
-        xaxis=dict(tickmode='linear', tick0=1, dtick=1),
-        height=400,
-        showlegend=False
-    )
-    return fig
+# Query backend: "memory" (pandas over the cached frame) or "sqlite" (indexed
+# database next to the report; filters, aggregates and paging run as SQL)
+BACKEND = os.environ.get("DOMU_BACKEND", "memory")
 
+# Watch the data source on a background thread and swap in new snapshots (see watcher.py)
+WATCH_DATA = os.environ.get("DOMU_WATCH_DATA", "1") == "1"
 
-def plot_minutes_to_value_distribution(loan_metrics_df):
-    """Interactive histogram: minutes_to_value distribution."""
-    if len(loan_metrics_df) == 0 or 'minutes_to_value' not in loan_metrics_df.columns:
-        return None
+# Memory budget per dashboard session (MB), excluding the shared dataset cache.
+# DOMU_TRACE_MEMORY=1 also measures allocations per stage (slower).
+SESSION_MEMORY_BUDGET_MB = int(os.environ.get("DOMU_SESSION_MEMORY_BUDGET_MB", "1024"))
+TRACE_MEMORY = os.environ.get("DOMU_TRACE_MEMORY", "") == "1"
+
+# Data Explorer page sizes (rows shipped to the browser per interaction)
+EXPLORER_PAGE_SIZES = [25, 50, 100, 250, 1000]
+
+# Rows serialized at a time when building a download
+EXPORT_CHUNK_ROWS = 100_000
+
+# Figures and derived tables kept across reruns and sessions (see cached_view)
+VIEW_CACHE_ENTRIES = int(os.environ.get("DOMU_VIEW_CACHE_ENTRIES", "256"))
+
+# Indexed filter columns and their labels
+FILTER_LABELS = {
+    'category': 'Category',
+    'end_reason': 'End Reason',
+    'status': 'Status',
+    'state': 'State',
+    'attempt': 'Attempt'
+}
+
+
+@st.cache_resource
+def get_dataset_cache():
+    """Process-wide dataset cache that survives script reruns."""
+    return DatasetCache(DATASET_CACHE_MAX_MB * 1024 * 1024)
+
+
+@st.cache_resource(max_entries=2)
+def cached_snapshot(fingerprint):
+    """The snapshot file with this fingerprint, read once per process."""
+    return ReportSnapshot.load(fingerprint[0])
+
+
+@st.cache_resource(max_entries=VIEW_CACHE_ENTRIES, show_spinner=False)
+def cached_view(view_key, name, options=(), _build=None):
+    """A figure or derived table, built once per process for each data, filter state and options.
     
-    fig = px.histogram(
-        loan_metrics_df,
-        x='minutes_to_value',
-        nbins=30,
-        title='Distribution of Minutes to Value (Loan-level)',
-        labels={'minutes_to_value': 'Minutes to Value', 'count': 'Frequency'},
-        height=400
-    )
-    fig.update_layout(showlegend=False)
-    return fig
+    view_key identifies the report files, event rules and filters; _build
+    (not hashed) is only called on a miss. Results are shared between
+    sessions, so callers must not modify them.
+    """
+    return _build()
 
 
-def plot_promise_breakdown(df):
-    """Interactive pie chart showing promise category breakdown."""
-    if len(df) == 0 or 'promise_category' not in df.columns:
-        return None
+@st.cache_resource
+def get_data_watcher():
+    """Process-wide watcher that ingests new reports off the request path."""
+    return DataWatcher(DATA_SOURCE, SNAPSHOT_FILE, [EVENT_RULES_FILE]).start()
+
+
+def open_snapshot(paths, watcher=None):
+    """The snapshot for the report files, or None when missing or stale.
     
-    promise_calls = df[df['promise_category'] == True]
-    if len(promise_calls) == 0:
+    For the files the watcher covers, its last good snapshot is used as is,
+    even while a newer one is being built.
+    """
+    if watcher is not None:
+        watched_paths, snapshot = watcher.current()
+        if snapshot is not None and tuple(paths) == watched_paths:
+            return snapshot
+    if not SNAPSHOT_FILE.exists():
         return None
-    
-    category_counts = promise_calls['category'].value_counts()
-    
-    fig = px.pie(
-        values=category_counts.values,
-        names=category_counts.index,
-        title='Promise Category Breakdown',
-        height=400
-    )
-    return fig
+    snapshot = cached_snapshot(file_fingerprint(SNAPSHOT_FILE))
+    return snapshot if snapshot is not None and snapshot.is_current(paths, [EVENT_RULES_FILE]) else None
+
+
+def load_filter_index(paths):
+    """Build the filter index over the cached, event-flagged report."""
+    return FilterIndex(get_dataset_cache().get(paths, depends_on=[EVENT_RULES_FILE]))
+
+
+def render_report_dates(paths):
+    """Report-date picker; returns the files whose file-name date is in the picked range.
+    
+    Partitions are pruned by file name, so files outside the range are never
+    read. Shown only when there is more than one dated report.
+    """
+    dates = sorted({d for d in map(partition_date, paths) if d is not None})
+    if len(dates) < 2:
+        return tuple(paths)
+    first_day, last_day = dates[0].date(), dates[-1].date()
+    picked = st.date_input("Report dates", value=(first_day, last_day), min_value=first_day, max_value=last_day)
+    if not (isinstance(picked, tuple) and len(picked) == 2):
+        return tuple(paths)
+    return prune_partitions(paths, pd.Timestamp(picked[0]), pd.Timestamp(picked[1]))
+
+
+def render_filters(filter_index):
+    """Filter widgets; returns criteria for FilterIndex.select (empty = no filters)."""
+    criteria = {}
+    with st.expander("🔎 Filters", expanded=False):
+        bounds = filter_index.date_bounds()
+        if bounds is not None:
+            first_day, last_day = bounds[0].date(), bounds[1].date()
+            picked = st.date_input("Started between", value=(first_day, last_day),
+                                   min_value=first_day, max_value=last_day)
+            # Only a narrowed range filters, so calls without started_at stay in by default
+            if isinstance(picked, tuple) and len(picked) == 2 and picked != (first_day, last_day):
+                criteria['date_range'] = (pd.Timestamp(picked[0]), pd.Timestamp(picked[1]) + pd.Timedelta(days=1))
+        
+        filter_cols = st.columns(len(FILTER_LABELS))
+        for col, (column, label) in zip(filter_cols, FILTER_LABELS.items()):
+            with col:
+                selected = st.multiselect(label, filter_index.options(column))
+            if selected:
+                criteria[column] = selected
+    return criteria
+
+
+def describe_filters(criteria):
+    """One line per active filter, for display."""
+    lines = []
+    if 'date_range' in criteria:
+        start, end = criteria['date_range']
+        lines.append(f"Started between {start.date()} and {(end - pd.Timedelta(days=1)).date()}")
+    for column, label in FILTER_LABELS.items():
+        if criteria.get(column):
+            lines.append(f"{label}: {', '.join(str(v) for v in criteria[column])}")
+    return lines
+
+
+def end_reason_table(end_reason_counts, total_calls):
+    """Top End Reasons table: count and % share of all calls per end_reason."""
+    end_reason_stats = end_reason_counts.reset_index()
+    end_reason_stats.columns = ['End Reason', 'Count']
+    end_reason_stats['Share %'] = (end_reason_stats['Count'] / total_calls * 100).round(2)
+    return end_reason_stats
 
 
-def plot_attempts_to_value_distribution(loan_metrics_df):
-    """Interactive histogram: attempts_to_value distribution."""
-    if len(loan_metrics_df) == 0 or 'attempts_to_value' not in loan_metrics_df.columns:
-        return None
+def explorer_order(view, sort_by, descending):
+    """Row positions within the view in display order (file order when sort_by is None)."""
+    if sort_by is None:
+        return np.arange(len(view))
+    values = view.column(sort_by).reset_index(drop=True)
+    return values.sort_values(ascending=not descending, na_position='last', kind='stable').index.to_numpy()
+
+
+def cached_explorer_order(view, dataset_key, sort_by, descending):
+    """explorer_order, reused across reruns while data and sort are unchanged."""
+    key = (dataset_key, len(view), sort_by, descending)
+    cached = st.session_state.get('explorer_order')
+    if cached is None or cached[0] != key:
+        cached = (key, explorer_order(view, sort_by, descending))
+        st.session_state['explorer_order'] = cached
+    return cached[1]
+
+
+def explorer_page(view, order, page, page_size, columns):
+    """Take one page of rows (1-based page) in display order."""
+    return view.take(order[(page - 1) * page_size:page * page_size], columns)
+
+
+def locate_loan(view, order, loan):
+    """Position of a loan_number's first row in display order, or None."""
+    matches = np.flatnonzero(view.column('loan_number').to_numpy()[order] == loan)
+    return int(matches[0]) if len(matches) else None
+
+
+def jump_to_loan(locate, page_size):
+    """on_change callback: move the explorer to the page holding a loan_number.
     
-    fig = px.histogram(
-        loan_metrics_df,
-        x='attempts_to_value',
-        nbins=20,
-        title='Distribution of Attempts to Value (Loan-level)',
-        labels={'attempts_to_value': 'Attempts to Value', 'count': 'Frequency'},
-        height=400
-    )
-    fig.update_layout(
-        xaxis=dict(tickmode='linear', tick0=1, dtick=1),
-        showlegend=False
-    )
-    return fig
+    locate(loan) returns the loan's first position in display order, or None.
+    """
+    st.session_state.pop('explorer_jump_missing', None)
+    loan = st.session_state.get('explorer_jump', '').strip()
+    if not loan:
+        return
+    position = locate(loan)
+    if position is None:
+        st.session_state['explorer_jump_missing'] = loan
+        return
+    st.session_state['explorer_page'] = int(position // page_size) + 1
 
 
-def plot_metrics_over_time(df):
-    """Line chart showing promise rate and value event rate over time."""
-    if len(df) == 0 or 'started_at' not in df.columns:
-        return None
+def build_export(chunks, columns, fmt, text_loader=None):
+    """Write the export to a temporary file chunk by chunk and return it, rewound.
     
-    df_time = df[df['started_at'].notna()].copy()
-    if len(df_time) == 0:
-        return None
+    Runs only when the download button is clicked. chunks(chunk_rows, columns)
+    yields the rows to export. With a text_loader, free-text columns are
+    joined per chunk, so they are never materialized whole.
+    """
+    text_columns = [col for col in columns if col in HEAVY_TEXT_COLUMNS] if text_loader else []
+    text = text_loader() if text_columns else None
     
-    df_time['date'] = df_time['started_at'].dt.date
-    daily_stats = df_time.groupby('date').agg(
-        total=('value_event', 'count'),
-        promise_count=('promise_category', 'sum'),
-        value_count=('value_event', 'sum')
-    ).reset_index()
-    
-    daily_stats['promise_rate'] = (daily_stats['promise_count'] / daily_stats['total'] * 100)
-    daily_stats['value_rate'] = (daily_stats['value_count'] / daily_stats['total'] * 100)
-    
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=daily_stats['date'],
-        y=daily_stats['promise_rate'],
-        mode='lines+markers',
-        name='Promise Rate (%)',
-        line=dict(width=2)
-    ))
-    fig.add_trace(go.Scatter(
-        x=daily_stats['date'],
-        y=daily_stats['value_rate'],
-        mode='lines+markers',
-        name='Value Event Rate (%)',
-        line=dict(width=2)
-    ))
-    fig.update_layout(
-        title='Promise Rate and Value Event Rate Over Time',
-        xaxis_title='Date',
-        yaxis_title='Rate (%)',
-        height=400,
-        hovermode='x unified'
-    )
-    return fig
+    def export_chunks():
+        for chunk in chunks(EXPORT_CHUNK_ROWS, [col for col in columns if col not in text_columns]):
+            if text is not None:
+                chunk = chunk.join(text.loc[chunk.index, text_columns])
+            yield chunk[[col for col in columns if col in chunk.columns]]
+    
+    out = tempfile.TemporaryFile()
+    write_export(export_chunks(), out, fmt)
+    out.seek(0)
+    return out
 
 
 # Main app
 st.title("Domu Bank Call Metrics")
 
+# Stage timings for this rerun, shown in the Performance panel; functions of the
+# metrics core called below record themselves as nested stages
+ledger = StageLedger(SESSION_MEMORY_BUDGET_MB * 1024 * 1024, trace=TRACE_MEMORY).activate()
+profiler = None
+if st.session_state.get('perf_profile', False):
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # One profiler per process: another session is being profiled right now
+        profiler = None
+
 # Load data
-if not DATA_FILE.exists():
-    st.error(f"Data file not found: {DATA_FILE}")
+# With the watcher, sessions see the report files of its last good snapshot, so new
+# files appear only once they have been ingested and validated
+with ledger.stage("report files"):
+    watcher = get_data_watcher() if WATCH_DATA else None
+    watched_paths, watched_snapshot = watcher.current() if watcher is not None else ((), None)
+    data_paths = watched_paths if watched_snapshot is not None else report_paths(DATA_SOURCE)
+if not data_paths:
+    st.error(f"No report files found: {DATA_SOURCE}")
+    st.stop()
+selected_paths = render_report_dates(data_paths)
+if not selected_paths:
+    st.warning("No report files in the selected date range.")
     st.stop()
 
+dataset_cache = get_dataset_cache()
+run_ctx = get_script_run_ctx()
+dataset_cache.check_in(run_ctx.session_id if run_ctx is not None else "local")
+sql_report = None
+streaming = BACKEND != "sqlite" and should_stream(selected_paths)
+
+# A current snapshot answers the filter widgets and the whole unfiltered view; report
+# rows are only read when a filter is applied or the Data Explorer is opened
+with ledger.stage("snapshot"):
+    snapshot = open_snapshot(selected_paths, watcher)
+filter_criteria = render_filters(snapshot) if snapshot is not None and not streaming else None
+use_snapshot = snapshot is not None and not filter_criteria
+load_rows = not use_snapshot or (not streaming and st.session_state.get('explorer_load_rows', False))
+if use_snapshot:
+    ledger.retain("snapshot", snapshot, shared=True)
+data_as_of = snapshot.data_as_of if use_snapshot else \
+    datetime.fromtimestamp(max(p.stat().st_mtime for p in selected_paths)).isoformat(timespec='seconds')
+st.caption(f"Data as of {data_as_of.replace('T', ' ')}"
+           + (f" · snapshot built {snapshot.built_at.replace('T', ' ')}" if use_snapshot else "")
+           + (" · newer reports are being ingested" if watcher is not None and watcher.pending else ""))
+if watcher is not None and watcher.last_error:
+    st.warning(f"The latest reports were not loaded ({watcher.last_error}); showing the last good data.")
 try:
-    df = load_data(DATA_FILE)
-    df = define_events(df)
+    if not load_rows:
+        df = None
+    elif BACKEND == "sqlite":
+        # Rows stay on disk; every query below runs against the database
+        df = None
+        with ledger.stage("load"):
+            sql_report = dataset_cache.get(selected_paths, loader=load_sqlite_report, depends_on=[EVENT_RULES_FILE])
+        ledger.retain("load", sql_report, shared=True)
+    elif streaming:
+        # Too large to hold in memory: only the aggregates are kept
+        df = None
+        with ledger.stage("load"):
+            # The state holds one cube per report file; the selected ones are merged
+            aggregate_state = dataset_cache.get(data_paths, loader=load_aggregate_state, depends_on=[EVENT_RULES_FILE])
+            call_aggs = aggregate_state.aggregates(selected_paths)
+        ledger.retain("load", aggregate_state, shared=True)
+    else:
+        with ledger.stage("load"):
+            df = dataset_cache.get(selected_paths, depends_on=[EVENT_RULES_FILE])
+        ledger.rows("load", rows_out=len(df))
+        # The cached frame holds the loaded columns plus one flag column per event
+        event_bytes = sum(int(df[event['name']].memory_usage(index=False))
+                          for event in load_event_rules(EVENT_RULES_FILE) if event['name'] in df.columns)
+        ledger.retain("load", nbytes=dataset_cache.entry_bytes(selected_paths, depends_on=[EVENT_RULES_FILE]) - event_bytes,
+                      shared=True)
+        ledger.retain("events", nbytes=event_bytes, shared=True)
 except Exception as e:
     st.error(f"Error loading data: {e}")
     st.stop()
 
-# No sidebar - use all data
-df_filtered = apply_filters(df)
+df_filtered = None
+if streaming:
+    filter_criteria = {}
+    st.info(f"Large report: streamed in chunks of {STREAM_CHUNK_ROWS:,} rows. "
+            "Filters and row-level views are not available in this mode.")
+elif not load_rows:
+    pass
+elif sql_report is not None:
+    # The database answers the filter widgets, and the cube is one GROUP BY over the filtered rows
+    if filter_criteria is None:
+        filter_criteria = render_filters(sql_report)
+    if not use_snapshot:
+        with ledger.stage("aggregates"):
+            call_aggs = ledger.retain("aggregates", sql_report.aggregates(filter_criteria))
+else:
+    # Filters resolve through the cached index into a view of row positions over the
+    # shared frame (never a copy); each consumer projects only the columns it reads
+    with ledger.stage("filter index"):
+        filter_index = dataset_cache.get(selected_paths, loader=load_filter_index, depends_on=[EVENT_RULES_FILE])
+    ledger.retain("filter index", nbytes=filter_index.nbytes, shared=True)
+    if filter_criteria is None:
+        filter_criteria = render_filters(filter_index)
+    with ledger.stage("filters"):
+        df_filtered = ledger.retain("filters", apply_filters(df, filter_index, filter_criteria))
+    ledger.rows("filters", len(df), len(df_filtered))
+    with ledger.stage("aggregates"):
+        if df_filtered.is_filtered:
+            call_aggs = ledger.retain("aggregates", CallAggregates.from_frame(df_filtered.frame(AGGREGATE_COLUMNS)))
+        elif not use_snapshot:
+            # Unfiltered totals come from the persisted state, not a pass over the rows
+            aggregate_state = dataset_cache.get(data_paths, loader=load_aggregate_state, depends_on=[EVENT_RULES_FILE])
+            call_aggs = ledger.retain("aggregates", aggregate_state.aggregates(selected_paths), shared=True)
+if use_snapshot:
+    call_aggs = snapshot.call_aggs
+dataset_key = (dataset_fingerprint(selected_paths), repr(sorted(filter_criteria.items())))
+view_key = (dataset_key, dataset_fingerprint([EVENT_RULES_FILE]))
 
 # Check if data is empty
-if len(df_filtered) == 0:
-    st.warning("No data available.")
+if call_aggs.total_calls == 0:
+    st.warning("No data matches the current filters." if filter_criteria else "No data available.")
     st.stop()
 
 # Compute metrics
-call_metrics = compute_call_level_metrics(df_filtered)
-loan_metrics_df, loan_stats = compute_loan_level_metrics(df_filtered)
+call_metrics = snapshot.call_metrics if use_snapshot else call_aggs.call_metrics()
+series = snapshot.series if use_snapshot else cached_view(view_key, 'series', _build=partial(chart_series, call_aggs))
+# Unfiltered loan metrics come from the snapshot or the persisted per-loan store. Filtered
+# ones sort a projection of the filtered rows, skipped when that would exceed the session budget.
+loan_metrics_skipped = False
+if use_snapshot:
+    loan_metrics_df, loan_stats = snapshot.loan_metrics_df, snapshot.loan_stats
+elif not filter_criteria:
+    with ledger.stage("loan metrics"):
+        # One summary per report file, like the aggregate state; the selected ones are combined
+        loan_state = dataset_cache.get(data_paths, loader=load_loan_state, depends_on=[EVENT_RULES_FILE])
+        loan_metrics_df, loan_stats = loan_state.loan_metrics(selected_paths)
+    ledger.retain("loan metrics", loan_state, shared=True)
+elif sql_report is not None:
+    with ledger.stage("loan metrics"):
+        loan_metrics_df, loan_stats = compute_loan_level_metrics(sql_report.frame(filter_criteria, LOAN_COLUMNS))
+    ledger.retain("loan metrics", loan_metrics_df)
+elif ledger.allows(loan_metrics_bytes(df_filtered)):
+    with ledger.stage("loan metrics"):
+        loan_metrics_df, loan_stats = compute_loan_level_metrics(df_filtered.frame(LOAN_COLUMNS))
+    ledger.retain("loan metrics", loan_metrics_df)
+    ledger.rows("loan metrics", len(df_filtered), len(loan_metrics_df))
+else:
+    loan_metrics_skipped = True
+    loan_metrics_df, loan_stats = pd.DataFrame(), dict(EMPTY_LOAN_STATS)
+    st.warning(f"Loan-level metrics skipped: they would exceed the session memory budget of "
+               f"{SESSION_MEMORY_BUDGET_MB:,} MB. Narrow the filters to see them.")
 
 # Metric Definitions Section
 with st.expander("📖 Metric Definitions & Calculations", expanded=False):
@@ -416,185 +495,183 @@ st.header("📊 All Metrics")
 # Row 1: First 3 metrics
 col1, col2, col3 = st.columns(3)
 
-with col1:
+with col1, ledger.stage("Promise Rate details"):
     st.metric("Promise Rate", f"{call_metrics['promise_rate']:.2f}%")
-    with st.expander("📖 Details & Explanation"):
-        st.info("""
-        **Definition**: Percentage of calls where the customer made a payment promise.
-        
-        **Calculation**: Promise Rate = (Calls with promise categories) / Total calls × 100%
-        
-        **Promise Categories**: 
-        - `PARTIAL_PAYMENT_ACCEPTED`: Customer agreed to make a partial payment
-        - `WILLING_TO_PAY`: Customer expressed willingness to pay
-        - `PROMISE_TO_PAY`: Customer made a promise to pay
-        
-        **Significance**: Higher rates indicate better customer engagement and higher payment collection likelihood.
-        """)
-        promise_calls = df_filtered[df_filtered['promise_category'] == True]
-        total_calls = len(df_filtered)
-        st.write(f"**Promise Calls:** {len(promise_calls):,} / {total_calls:,}")
-        if len(promise_calls) > 0:
-            st.write("\n**Breakdown by Category:**")
-            category_breakdown = promise_calls['category'].value_counts()
-            for cat, count in category_breakdown.items():
-                pct = (count / len(promise_calls) * 100)
-                st.write(f"- {cat}: {count} ({pct:.1f}%)")
-            fig_promise = plot_promise_breakdown(df_filtered)
-            if fig_promise:
-                st.plotly_chart(fig_promise, use_container_width=True)
-
-with col2:
+    details = st.expander("📖 Details & Explanation", key="details_promise_rate", on_change="rerun")
+    # Contents (and their figures) are computed only while the expander is open
+    with details:
+        if details.open:
+            st.info("""
+            **Definition**: Percentage of calls where the customer made a payment promise.
+            
+            **Calculation**: Promise Rate = (Calls with promise categories) / Total calls × 100%
+            
+            **Promise Categories**: 
+            - `PARTIAL_PAYMENT_ACCEPTED`: Customer agreed to make a partial payment
+            - `WILLING_TO_PAY`: Customer expressed willingness to pay
+            - `PROMISE_TO_PAY`: Customer made a promise to pay
+            
+            **Significance**: Higher rates indicate better customer engagement and higher payment collection likelihood.
+            """)
+            promise_count = call_aggs.promise_calls
+            total_calls = call_aggs.total_calls
+            st.write(f"**Promise Calls:** {promise_count:,} / {total_calls:,}")
+            if promise_count > 0:
+                st.write("\n**Breakdown by Category:**")
+                category_breakdown = series['promise_category_counts']
+                for cat, count in category_breakdown.items():
+                    pct = (count / promise_count * 100)
+                    st.write(f"- {cat}: {count} ({pct:.1f}%)")
+                fig_promise = cached_view(view_key, 'promise_breakdown',
+                                          _build=partial(plot_promise_breakdown, category_breakdown))
+                if fig_promise:
+                    st.plotly_chart(fig_promise, use_container_width=True)
+
+with col2, ledger.stage("Qualified Handoff Rate details"):
     st.metric("Qualified Handoff Rate", f"{call_metrics['qualified_handoff_rate']:.2f}%")
-    with st.expander("📖 Details & Explanation"):
-        st.info("""
-        **Definition**: Percentage of calls forwarded to a human agent.
-        
-        **Calculation**: Qualified Handoff Rate = (Forwarded calls) / Total calls × 100%
-        
-        **Forward Event**: end_reason == "assistant-forwarded-call"
-        
-        **Significance**: These represent high-intent customers needing human assistance. This is a GOOD outcome, indicating successful qualification.
-        """)
-        forward_calls = df_filtered[df_filtered['forward_event'] == True]
-        total_calls = len(df_filtered)
-        st.write(f"**Forwarded Calls:** {len(forward_calls):,} / {total_calls:,}")
-        if len(forward_calls) > 0:
-            st.write(f"\n**Average Duration:** {forward_calls['duration'].mean() / 60:.2f} minutes")
-            st.write(f"**Average Attempt:** {forward_calls['attempt'].mean():.2f}")
-            forward_by_attempt = forward_calls.groupby('attempt').size().reset_index(name='count')
-            fig = px.bar(
-                forward_by_attempt,
-                x='attempt',
-                y='count',
-                title='Forwarded Calls by Attempt Number',
-                labels={'attempt': 'Attempt Number', 'count': 'Number of Calls'},
-                height=300
-            )
-            fig.update_layout(xaxis=dict(tickmode='linear', tick0=1, dtick=1))
-            st.plotly_chart(fig, use_container_width=True)
-
-with col3:
+    details = st.expander("📖 Details & Explanation", key="details_handoff_rate", on_change="rerun")
+    with details:
+        if details.open:
+            st.info("""
+            **Definition**: Percentage of calls forwarded to a human agent.
+            
+            **Calculation**: Qualified Handoff Rate = (Forwarded calls) / Total calls × 100%
+            
+            **Forward Event**: end_reason == "assistant-forwarded-call"
+            
+            **Significance**: These represent high-intent customers needing human assistance. This is a GOOD outcome, indicating successful qualification.
+            """)
+            forward_count = call_aggs.forward_calls
+            total_calls = call_aggs.total_calls
+            st.write(f"**Forwarded Calls:** {forward_count:,} / {total_calls:,}")
+            if forward_count > 0:
+                st.write(f"\n**Average Duration:** {call_aggs.forward_seconds / forward_count / 60:.2f} minutes")
+                st.write(f"**Average Attempt:** {call_aggs.forward_attempt_sum / forward_count:.2f}")
+                fig = cached_view(view_key, 'forwarded_by_attempt',
+                                  _build=partial(plot_forwarded_by_attempt, series['forward_by_attempt']))
+                if fig:
+                    st.plotly_chart(fig, use_container_width=True)
+
+with col3, ledger.stage("Non-Value Rate details"):
     st.metric("Non-Value Rate", f"{call_metrics['waste_rate']:.2f}%")
-    with st.expander("📖 Details & Explanation"):
-        st.warning("""
-        **Definition**: Percentage of calls that resulted in no value outcome.
-        
-        **Calculation**: Non-Value Rate = (Number of non-value events) / Total calls × 100%
-        
-        **Non-Value Events Include**:
-        - Calls ending with `silence-timed-out` (no customer response)
-        - Calls that are NOT value events (no promise made, no forward to agent)
-        
-        **Significance**: Lower non-value rates indicate more efficient use of call resources and better customer engagement.
-        """)
-        non_value_calls = df_filtered[df_filtered['waste_event'] == True]
-        total_calls = len(df_filtered)
-        st.write(f"**Non-Value Calls:** {len(non_value_calls):,} / {total_calls:,}")
-        if len(non_value_calls) > 0:
-            st.write(f"\n**Total Non-Value Time:** {call_metrics['waste_minutes']:.1f} minutes")
-            st.write(f"**Average Non-Value Call Duration:** {non_value_calls['duration'].mean() / 60:.2f} minutes")
-            st.write("\n**Top Non-Value Reasons:**")
-            non_value_reasons = non_value_calls['end_reason'].value_counts().head(5)
-            for reason, count in non_value_reasons.items():
-                pct = (count / len(non_value_calls) * 100)
-                st.write(f"- {reason}: {count} ({pct:.1f}%)")
-            non_value_reasons_chart = non_value_calls['end_reason'].value_counts().head(10)
-            fig = px.bar(
-                x=non_value_reasons_chart.values,
-                y=non_value_reasons_chart.index,
-                orientation='h',
-                title='Top Non-Value Reasons',
-                labels={'x': 'Count', 'y': 'End Reason'},
-                height=300
-            )
-            st.plotly_chart(fig, use_container_width=True)
+    details = st.expander("📖 Details & Explanation", key="details_non_value_rate", on_change="rerun")
+    with details:
+        if details.open:
+            st.warning("""
+            **Definition**: Percentage of calls that resulted in no value outcome.
+            
+            **Calculation**: Non-Value Rate = (Number of non-value events) / Total calls × 100%
+            
+            **Non-Value Events Include**:
+            - Calls ending with `silence-timed-out` (no customer response)
+            - Calls that are NOT value events (no promise made, no forward to agent)
+            
+            **Significance**: Lower non-value rates indicate more efficient use of call resources and better customer engagement.
+            """)
+            non_value_count = call_aggs.waste_calls
+            total_calls = call_aggs.total_calls
+            st.write(f"**Non-Value Calls:** {non_value_count:,} / {total_calls:,}")
+            if non_value_count > 0:
+                st.write(f"\n**Total Non-Value Time:** {call_metrics['waste_minutes']:.1f} minutes")
+                st.write(f"**Average Non-Value Call Duration:** {call_aggs.waste_seconds / non_value_count / 60:.2f} minutes")
+                st.write("\n**Top Non-Value Reasons:**")
+                non_value_reasons = series['non_value_end_reason_counts'].head(5)
+                for reason, count in non_value_reasons.items():
+                    pct = (count / non_value_count * 100)
+                    st.write(f"- {reason}: {count} ({pct:.1f}%)")
+                fig = cached_view(view_key, 'non_value_reasons',
+                                  _build=partial(plot_non_value_reasons, series['non_value_end_reason_counts']))
+                if fig:
+                    st.plotly_chart(fig, use_container_width=True)
 
 # Row 2: Next 3 metrics
 col4, col5, col6 = st.columns(3)
 
-with col4:
+with col4, ledger.stage("Cost Saved details"):
     st.metric("Cost Saved", f"{call_metrics['cost_saved_pct']:.2f}%")
-    with st.expander("📖 Details & Explanation"):
-        st.success("""
-        **Definition**: Percentage of call time that was spent on productive calls (value events).
-        
-        **Calculation**: 
-        - Cost Saved % = (Total minutes - Non-Value minutes) / Total minutes × 100%
-        - Cost Saved (minutes) = Total minutes - Non-Value minutes
-        
-        **What it means**: This represents the time spent on productive calls (value events) vs. non-value calls.
-        
-        **Significance**: Higher cost saved means more time invested in calls that result in promises or qualified handoffs, leading to better ROI.
-        """)
-        st.write(f"**Cost Saved (Minutes):** {call_metrics['cost_saved_minutes']:.1f}")
-        st.write(f"**Total Call Time:** {call_metrics['total_minutes']:.1f} minutes")
-        st.write(f"**Non-Value Time:** {call_metrics['waste_minutes']:.1f} minutes")
-        st.write(f"**Productive Time:** {call_metrics['cost_saved_minutes']:.1f} minutes")
-        if call_metrics['total_minutes'] > 0:
-            productive_pct = (call_metrics['cost_saved_minutes'] / call_metrics['total_minutes'] * 100)
-            st.write(f"\n**Productive Time %:** {productive_pct:.1f}%")
-            time_data = {
-                'Category': ['Productive Time', 'Non-Value Time'],
-                'Minutes': [call_metrics['cost_saved_minutes'], call_metrics['waste_minutes']]
-            }
-            time_df = pd.DataFrame(time_data)
-            fig = px.pie(
-                time_df,
-                values='Minutes',
-                names='Category',
-                title='Time Distribution: Productive vs Non-Value',
-                height=300
-            )
-            st.plotly_chart(fig, use_container_width=True)
-
-with col5:
-    st.metric("Median Attempts-to-Value", loan_stats['median_attempts_to_value'])
-    with st.expander("📖 Details & Explanation"):
-        st.info("""
-        **Definition**: Number of call attempts required before achieving a value event (calculated at the loan level).
-        
-        **Calculation**:
-        1. For each loan, sort calls by attempt number (ascending), then by started_at (ascending)
-        2. Find the first call with a value event (promise or forward)
-        3. Record the attempt number of that call
-        4. Report median, mean, and 90th percentile across all loans
-        
-        **Significance**: Lower attempts-to-value means customers are engaging sooner, indicating better targeting, messaging, and customer readiness.
-        """)
-        st.write(f"**Mean:** {loan_stats['mean_attempts_to_value']:.2f}")
-        st.write(f"**90th Percentile:** {loan_stats['p90_attempts_to_value']}")
-        if len(loan_metrics_df) > 0:
-            st.write(f"\n**Loans with Value Events:** {len(loan_metrics_df):,}")
-            st.write(f"**Range:** {loan_metrics_df['attempts_to_value'].min()} - {loan_metrics_df['attempts_to_value'].max()}")
-            fig_attempts = plot_attempts_to_value_distribution(loan_metrics_df)
-            if fig_attempts:
-                st.plotly_chart(fig_attempts, use_container_width=True)
-
-with col6:
-    st.metric("Median Minutes-to-Value", f"{loan_stats['median_minutes_to_value']:.2f}")
-    with st.expander("📖 Details & Explanation"):
-        st.info("""
-        **Definition**: Total call duration (in minutes) from the first call attempt until achieving a value event (calculated at the loan level).
-        
-        **Calculation**:
-        1. For each loan, sort calls by attempt number (ascending), then by started_at (ascending)
-        2. Find the first call with a value event (promise or forward)
-        3. Sum the duration (in seconds) of all calls from attempt 1 up to and including the first value event
-        4. Convert to minutes: seconds_to_value / 60
-        5. Report median, mean, and 90th percentile across all loans
-        
-        **Significance**: Lower minutes-to-value means faster resolution and lower operational costs per successful outcome. This directly impacts cost efficiency.
-        """)
-        st.write(f"**Mean:** {loan_stats['mean_minutes_to_value']:.2f} minutes")
-        st.write(f"**90th Percentile:** {loan_stats['p90_minutes_to_value']:.2f} minutes")
-        if len(loan_metrics_df) > 0:
-            total_hours = loan_metrics_df['minutes_to_value'].sum() / 60
-            st.write(f"\n**Total Time to Value:** {total_hours:.1f} hours")
-            st.write(f"**Range:** {loan_metrics_df['minutes_to_value'].min():.2f} - {loan_metrics_df['minutes_to_value'].max():.2f} minutes")
-            fig_minutes = plot_minutes_to_value_distribution(loan_metrics_df)
-            if fig_minutes:
-                st.plotly_chart(fig_minutes, use_container_width=True)
+    details = st.expander("📖 Details & Explanation", key="details_cost_saved", on_change="rerun")
+    with details:
+        if details.open:
+            st.success("""
+            **Definition**: Percentage of call time that was spent on productive calls (value events).
+            
+            **Calculation**: 
+            - Cost Saved % = (Total minutes - Non-Value minutes) / Total minutes × 100%
+            - Cost Saved (minutes) = Total minutes - Non-Value minutes
+            
+            **What it means**: This represents the time spent on productive calls (value events) vs. non-value calls.
+            
+            **Significance**: Higher cost saved means more time invested in calls that result in promises or qualified handoffs, leading to better ROI.
+            """)
+            st.write(f"**Cost Saved (Minutes):** {call_metrics['cost_saved_minutes']:.1f}")
+            st.write(f"**Total Call Time:** {call_metrics['total_minutes']:.1f} minutes")
+            st.write(f"**Non-Value Time:** {call_metrics['waste_minutes']:.1f} minutes")
+            st.write(f"**Productive Time:** {call_metrics['cost_saved_minutes']:.1f} minutes")
+            if call_metrics['total_minutes'] > 0:
+                productive_pct = (call_metrics['cost_saved_minutes'] / call_metrics['total_minutes'] * 100)
+                st.write(f"\n**Productive Time %:** {productive_pct:.1f}%")
+                fig = cached_view(view_key, 'time_distribution', _build=partial(plot_time_distribution, call_metrics))
+                if fig:
+                    st.plotly_chart(fig, use_container_width=True)
+
+with col5, ledger.stage("Attempts-to-Value details"):
+    st.metric("Median Attempts-to-Value", "n/a" if loan_metrics_skipped else loan_stats['median_attempts_to_value'])
+    details = st.expander("📖 Details & Explanation", key="details_attempts_to_value", on_change="rerun")
+    with details:
+        if details.open:
+            st.info("""
+            **Definition**: Number of call attempts required before achieving a value event (calculated at the loan level).
+            
+            **Calculation**:
+            1. For each loan, sort calls by attempt number (ascending), then by started_at (ascending)
+            2. Find the first call with a value event (promise or forward)
+            3. Record the attempt number of that call
+            4. Report median, mean, and 90th percentile across all loans
+            
+            **Significance**: Lower attempts-to-value means customers are engaging sooner, indicating better targeting, messaging, and customer readiness.
+            """)
+            st.write(f"**Mean:** {loan_stats['mean_attempts_to_value']:.2f}")
+            st.write(f"**90th Percentile:** {loan_stats['p90_attempts_to_value']}")
+            if len(loan_metrics_df) > 0:
+                st.write(f"\n**Loans with Value Events:** {len(loan_metrics_df):,}")
+                st.write(f"**Range:** {loan_metrics_df['attempts_to_value'].min()} - {loan_metrics_df['attempts_to_value'].max()}")
+                attempts_log = st.checkbox("Log scale", key="attempts_log", help="Loan counts on a log axis")
+                fig_attempts = cached_view(view_key, 'attempts_to_value', (attempts_log,), _build=partial(
+                    plot_attempts_to_value_distribution, loan_metrics_df, log_scale=attempts_log))
+                if fig_attempts:
+                    st.plotly_chart(fig_attempts, use_container_width=True)
+
+with col6, ledger.stage("Minutes-to-Value details"):
+    st.metric("Median Minutes-to-Value", "n/a" if loan_metrics_skipped else f"{loan_stats['median_minutes_to_value']:.2f}")
+    details = st.expander("📖 Details & Explanation", key="details_minutes_to_value", on_change="rerun")
+    with details:
+        if details.open:
+            st.info("""
+            **Definition**: Total call duration (in minutes) from the first call attempt until achieving a value event (calculated at the loan level).
+            
+            **Calculation**:
+            1. For each loan, sort calls by attempt number (ascending), then by started_at (ascending)
+            2. Find the first call with a value event (promise or forward)
+            3. Sum the duration (in seconds) of all calls from attempt 1 up to and including the first value event
+            4. Convert to minutes: seconds_to_value / 60
+            5. Report median, mean, and 90th percentile across all loans
+            
+            **Significance**: Lower minutes-to-value means faster resolution and lower operational costs per successful outcome. This directly impacts cost efficiency.
+            """)
+            st.write(f"**Mean:** {loan_stats['mean_minutes_to_value']:.2f} minutes")
+            st.write(f"**90th Percentile:** {loan_stats['p90_minutes_to_value']:.2f} minutes")
+            if len(loan_metrics_df) > 0:
+                total_hours = loan_metrics_df['minutes_to_value'].sum() / 60
+                st.write(f"\n**Total Time to Value:** {total_hours:.1f} hours")
+                st.write(f"**Range:** {loan_metrics_df['minutes_to_value'].min():.2f} - {loan_metrics_df['minutes_to_value'].max():.2f} minutes")
+                minutes_bins = st.number_input("Bins", min_value=5, max_value=200, value=MINUTES_BINS, step=5,
+                                               key="minutes_bins")
+                minutes_log = st.checkbox("Log scale", key="minutes_log",
+                                          help="Geometrically spaced bins, for the long tail")
+                fig_minutes = cached_view(view_key, 'minutes_to_value', (minutes_bins, minutes_log), _build=partial(
+                    plot_minutes_to_value_distribution, loan_metrics_df, minutes_bins, minutes_log))
+                if fig_minutes:
+                    st.plotly_chart(fig_minutes, use_container_width=True)
 
 
 # Interactive Charts Section
@@ -602,63 +679,227 @@ st.header("📈 Interactive Charts")
 
 col1, col2 = st.columns(2)
 
-with col1:
+with col1, ledger.stage("Value Event Rate chart"):
     st.subheader("Value Event Rate by Attempt")
-    fig1 = plot_value_event_by_attempt(df_filtered)
+    fig1 = cached_view(view_key, 'value_event_by_attempt',
+                       _build=partial(plot_value_event_by_attempt, series['attempt_stats']))
     if fig1:
         st.plotly_chart(fig1, use_container_width=True)
 
-with col2:
+# Every granularity is resampled once from the hourly table; the widgets below only pick a frame
+with ledger.stage("time series"):
+    time_series = cached_view(view_key, 'time_series', _build=call_aggs.time_series)
+
+with col2, ledger.stage("Metrics Over Time chart"):
     st.subheader("Metrics Over Time")
-    fig_time = plot_metrics_over_time(df_filtered)
+    granularity_col, window_col = st.columns(2)
+    with granularity_col:
+        granularity = st.selectbox("Granularity", list(GRANULARITIES), index=1, key="time_granularity")
+    with window_col:
+        window = st.selectbox("Rolling rate", ["None"] + [f"{days}-day" for days in ROLLING_DAYS],
+                              key="time_window")
+    window_days = None if window == "None" else int(window.split("-")[0])
+    fig_time = cached_view(view_key, 'metrics_over_time', (granularity, window_days), _build=partial(
+        plot_metrics_over_time, time_series.stats(granularity), granularity, window_days))
     if fig_time:
         st.plotly_chart(fig_time, use_container_width=True)
 
+with ledger.stage("Activity heatmap"):
+    st.subheader("Activity by Hour and Day of Week")
+    heatmap_measure = st.selectbox("Show", list(HEATMAP_LABELS), format_func=HEATMAP_LABELS.get,
+                                   key="heatmap_measure")
+    fig_heatmap = cached_view(view_key, 'activity_heatmap', (heatmap_measure,), _build=partial(
+        plot_activity_heatmap, time_series.heatmap(heatmap_measure), heatmap_measure))
+    if fig_heatmap:
+        st.plotly_chart(fig_heatmap, use_container_width=True)
+    else:
+        st.info("No calls with a start time to place by hour and weekday.")
+
 # Table: Top end_reason by count and % share
 st.header("Top End Reasons")
-if 'end_reason' in df_filtered.columns:
-    end_reason_stats = df_filtered['end_reason'].value_counts().reset_index()
-    end_reason_stats.columns = ['End Reason', 'Count']
-    end_reason_stats['Share %'] = (end_reason_stats['Count'] / len(df_filtered) * 100).round(2)
+end_reason_stats = cached_view(view_key, 'end_reason_table',
+                               _build=partial(end_reason_table, series['end_reason_counts'], call_aggs.total_calls))
+if len(end_reason_stats) > 0:
     st.dataframe(end_reason_stats, use_container_width=True)
 
-# Data Explorer
-st.header("Data Explorer")
-st.dataframe(df_filtered, use_container_width=True)
-
-# Download button
-csv = df_filtered.to_csv(index=False)
-st.download_button(
-    label="Download Filtered Data as CSV",
-    data=csv,
-    file_name=f"filtered_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-    mime="text/csv"
-)
+# Data Explorer and download need raw rows
+if not streaming:
+    st.header("Data Explorer")
+    if use_snapshot:
+        st.toggle("Load report rows", key="explorer_load_rows",
+                  help="The view above comes from the prebuilt snapshot; browsing rows reads the report.")
+if load_rows and not streaming:
+    # Data Explorer: server-side paging, only the visible page is sent to the browser
+    if sql_report is not None:
+        row_columns = [col for col in sql_report.columns if col not in HEAVY_TEXT_COLUMNS]
+        explorer_options = list(sql_report.columns)
+    else:
+        row_columns = list(df_filtered.columns)
+        explorer_options = row_columns + HEAVY_TEXT_COLUMNS
+    explorer_columns = st.multiselect("Columns", explorer_options, default=row_columns)
+    
+    sort_col, dir_col, size_col, jump_col = st.columns(4)
+    with sort_col:
+        sort_by = st.selectbox("Sort by", ["(file order)"] + row_columns)
+        sort_by = None if sort_by == "(file order)" else sort_by
+    with dir_col:
+        descending = st.checkbox("Descending", value=False)
+    with size_col:
+        page_size = st.selectbox("Rows per page", EXPLORER_PAGE_SIZES, index=1)
+    
+    if sql_report is not None:
+        # Pages come from ORDER BY ... LIMIT/OFFSET; no order is held in memory
+        order = None
+        row_count = call_aggs.total_calls
+        locate = partial(sql_report.position_of, filter_criteria, sort_by, descending, 'loan_number')
+    else:
+        with ledger.stage("explorer order"):
+            order = cached_explorer_order(df_filtered, dataset_key, sort_by, descending)
+        row_count = len(order)
+        locate = partial(locate_loan, df_filtered, order)
+    page_count = max(1, -(-row_count // page_size))
+    with jump_col:
+        st.text_input("Jump to loan_number", key="explorer_jump",
+                      on_change=jump_to_loan, args=(locate, page_size))
+    if 'explorer_jump_missing' in st.session_state:
+        st.warning(f"loan_number {st.session_state['explorer_jump_missing']} not found.")
+    
+    if st.session_state.get('explorer_page', 1) > page_count:
+        st.session_state['explorer_page'] = page_count
+    page = st.number_input(f"Page (of {page_count:,})", min_value=1, max_value=page_count, step=1, key="explorer_page")
+    
+    with ledger.stage("explorer page"):
+        if sql_report is not None:
+            df_page = sql_report.page(filter_criteria, sort_by, descending, (page - 1) * page_size, page_size,
+                                      explorer_columns)
+            text_columns = []
+        else:
+            df_page = explorer_page(df_filtered, order, page, page_size, explorer_columns)
+            text_columns = [col for col in explorer_columns if col in HEAVY_TEXT_COLUMNS]
+        if text_columns:
+            # Free-text columns are only read when selected, and only for this page's rows
+            df_page = df_page.join(load_text_rows(selected_paths, df_page.index, text_columns))
+    ledger.retain("explorer page", [df_page, order])
+    ledger.rows("explorer page", row_count, len(df_page))
+    with ledger.stage("explorer table"):
+        st.dataframe(df_page[[col for col in explorer_columns if col in df_page.columns]], use_container_width=True)
+    first_row = (page - 1) * page_size
+    st.caption(f"Rows {min(first_row + 1, row_count):,}-{min(first_row + page_size, row_count):,} of {row_count:,}")
+
+    # Download: the file is generated in chunks only when the button is clicked
+    export_col, format_col = st.columns([3, 1])
+    with export_col:
+        export_columns = st.multiselect("Columns to export", explorer_options, default=row_columns)
+    with format_col:
+        export_format = st.selectbox("Format", export_formats())
+    extension, mime = EXPORT_FORMATS[export_format]
+    st.download_button(
+        label="Download Filtered Data",
+        data=(partial(build_export, partial(sql_report.chunks, filter_criteria), export_columns, export_format)
+              if sql_report is not None else
+              partial(build_export, df_filtered.chunks, export_columns, export_format,
+                      partial(dataset_cache.get, selected_paths, loader=load_text_columns))),
+        file_name=f"filtered_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}",
+        mime=mime
+    )
 
 # Filter Information at the bottom
 st.divider()
 st.header("ℹ️ Data Information & Quality")
 
-with st.expander("Data Overview & Quality Notes", expanded=False):
-    st.write(f"**File:** {DATA_FILE.name}")
-    st.write(f"**Total Rows Loaded:** {len(df):,}")
-    st.write(f"**Rows After Filters:** {len(df_filtered):,}")
-    
-    st.write("\n**Data Quality Notes:**")
-    if 'started_at' in df.columns:
-        valid_dates = df['started_at'].notna().sum()
-        missing_dates = df['started_at'].isna().sum()
-        st.write(f"- **Rows with `started_at` dates:** {valid_dates:,} ({valid_dates/len(df)*100:.1f}%)")
-        st.write(f"- **Rows with missing `started_at`:** {missing_dates:,} ({missing_dates/len(df)*100:.1f}%)")
-    
-    if 'duration' in df.columns:
-        missing_duration = df['duration'].isna().sum()
-        if missing_duration > 0:
-            st.write(f"- **Rows with missing `duration`:** {missing_duration:,} (filled with 0)")
-    
-    if 'category' in df.columns:
-        missing_category = df['category'].isna().sum()
-        if missing_category > 0:
-            st.write(f"- **Rows with missing `category`:** {missing_category:,}")
-    
-    st.write("\n**Note:** Currently showing all data. No filters are applied.")
+overview = st.expander("Data Overview & Quality Notes", key="panel_overview", on_change="rerun")
+with overview:
+    if overview.open:
+        st.write(f"**{'Files' if len(selected_paths) > 1 else 'File'}:** {', '.join(p.name for p in selected_paths)}")
+        quality = snapshot.quality if use_snapshot else sql_report.quality_counts() if sql_report is not None else None
+        st.write(f"**Total Rows Loaded:** {quality['rows'] if quality else call_aggs.total_calls if streaming else len(df):,}")
+        st.write(f"**Rows After Filters:** {call_aggs.total_calls:,}")
+        
+        st.write("\n**Data Quality Notes:**")
+        if quality:
+            st.write(f"- **Rows with `started_at` dates:** {quality['dated']:,} ({quality['dated']/quality['rows']*100:.1f}%)")
+            missing_dates = quality['rows'] - quality['dated']
+            st.write(f"- **Rows with missing `started_at`:** {missing_dates:,} ({missing_dates/quality['rows']*100:.1f}%)")
+            if quality['missing_category'] > 0:
+                st.write(f"- **Rows with missing `category`:** {quality['missing_category']:,}")
+        elif streaming:
+            valid_dates = call_aggs.dated_calls
+            st.write(f"- **Rows with `started_at` dates:** {valid_dates:,} ({valid_dates/call_aggs.total_calls*100:.1f}%)")
+            st.write(f"- Streamed in chunks of {STREAM_CHUNK_ROWS:,} rows; other row-level quality checks are skipped.")
+        elif 'started_at' in df.columns:
+            valid_dates = df['started_at'].notna().sum()
+            missing_dates = df['started_at'].isna().sum()
+            st.write(f"- **Rows with `started_at` dates:** {valid_dates:,} ({valid_dates/len(df)*100:.1f}%)")
+            st.write(f"- **Rows with missing `started_at`:** {missing_dates:,} ({missing_dates/len(df)*100:.1f}%)")
+        
+        if df is not None and 'duration' in df.columns:
+            missing_duration = df['duration'].isna().sum()
+            if missing_duration > 0:
+                st.write(f"- **Rows with missing `duration`:** {missing_duration:,} (filled with 0)")
+        
+        if df is not None and 'category' in df.columns:
+            missing_category = df['category'].isna().sum()
+            if missing_category > 0:
+                st.write(f"- **Rows with missing `category`:** {missing_category:,}")
+        
+        active_filters = describe_filters(filter_criteria)
+        if active_filters:
+            st.write("\n**Active Filters:**")
+            for line in active_filters:
+                st.write(f"- {line}")
+        else:
+            st.write("\n**Note:** Currently showing all data. No filters are applied.")
+        
+        cache_stats = dataset_cache.stats()
+        st.write("\n**Dataset Cache:**")
+        st.write(f"- **Hits / Misses:** {cache_stats['hits']:,} / {cache_stats['misses']:,} "
+                 f"({cache_stats['waits']:,} shared in-flight loads)")
+        st.write(f"- **Cached Reports:** {cache_stats['entries']} "
+                 f"({cache_stats['bytes'] / 1024**2:.1f} / {cache_stats['max_bytes'] / 1024**2:.0f} MB, "
+                 f"{cache_stats['evictions']} evicted)")
+        st.write(f"- **Active Sessions:** {cache_stats['sessions']:,}, sharing one copy "
+                 f"({cache_stats['bytes'] / max(cache_stats['sessions'], 1) / 1024**2:.1f} MB per session)")
+
+memory_panel = st.expander("Memory by Stage", key="panel_memory", on_change="rerun")
+with memory_panel:
+    if memory_panel.open:
+        session_mb = ledger.session_bytes() / 1024**2
+        st.write(f"**Session Memory:** {session_mb:.1f} / {SESSION_MEMORY_BUDGET_MB:,} MB budget "
+                 "(shared stages are held once per process and not counted)")
+        if ledger.over_budget():
+            st.warning("This session is over its memory budget.")
+        memory_report = ledger.report()
+        memory_report['retained_mb'] = (memory_report['retained_bytes'] / 1024**2).round(2)
+        memory_report['allocated_mb'] = (memory_report['allocated_bytes'].astype(float) / 1024**2).round(2)
+        st.dataframe(memory_report[['stage', 'retained_mb', 'allocated_mb', 'shared']], use_container_width=True)
+        if not TRACE_MEMORY:
+            st.caption("Set DOMU_TRACE_MEMORY=1 to measure allocations per stage.")
+
+performance_panel = st.expander("⏱️ Performance", key="panel_performance", on_change="rerun")
+with performance_panel:
+    if performance_panel.open:
+        st.write(f"**Rerun:** {ledger.elapsed() * 1000:,.0f} ms to this panel")
+        performance = ledger.report()
+        performance['allocated_mb'] = (performance['allocated_bytes'].astype(float) / 1024**2).round(2)
+        st.dataframe(performance.fillna({'within': ''})[['stage', 'within', 'calls', 'wall_ms', 'cpu_ms', 'rows_in', 'rows_out', 'allocated_mb']]
+                     .round({'wall_ms': 1, 'cpu_ms': 1}), use_container_width=True)
+        st.caption("Stages with a *within* stage ran inside it, so their time is part of that stage's time. "
+                   "CPU time is this session's thread only.")
+        json_col, trace_col = st.columns(2)
+        with json_col:
+            st.download_button("Download JSON", ledger.to_json(), file_name="stage_timings.json", mime="application/json")
+        with trace_col:
+            st.download_button("Download trace events", ledger.trace_events(), file_name="stage_trace.json",
+                               mime="application/json", help="Open in chrome://tracing or ui.perfetto.dev.")
+        
+        st.toggle("Profile reruns with cProfile", key="perf_profile",
+                  help="Captures a cProfile of every rerun while on; reruns are slower.")
+        if profiler is not None:
+            profiler.disable()
+            st.dataframe(profile_report(profiler).round({'own_ms': 1, 'cumulative_ms': 1}), use_container_width=True)
+            st.download_button("Download profile (.prof)", profile_bytes(profiler), file_name="rerun.prof",
+                               mime="application/octet-stream", help="Load with pstats or snakeviz.")
+        elif st.session_state.get('perf_profile', False):
+            st.caption("Another session is being profiled; try again in a moment.")
+if profiler is not None:
+    profiler.disable()
@@ -0,0 +1,295 @@
+"""
+Plotly figure builders for the dashboard charts.
+
+Each builder takes the pre-aggregated series (or loan_metrics_df) the
+dashboard already has and returns a figure, or None when there is nothing to
+draw. They import neither streamlit nor the metrics core, so benchmark.py
+can time them on their own.
+
+The loan-level histograms are binned here with NumPy and drawn as bars of
+bin counts, so a figure holds one value per bin, not one per loan, and its
+size does not grow with the number of loans.
+"""
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from instrumentation import instrumented
+
+# Default bin count for the minutes-to-value histogram
+MINUTES_BINS = 30
+
+# Line charts stop drawing markers above this many points
+MARKER_POINTS = 120
+
+# Heatmap measure -> axis label
+HEATMAP_LABELS = {'calls': 'Calls', 'promise_rate': 'Promise Rate (%)', 'value_rate': 'Value Event Rate (%)'}
+
+
+def histogram_bins(values, bins=30, log_scale=False):
+    """Counts per bin as a frame of (left, right, count), computed with NumPy.
+    
+    bins is a bin count or a sequence of increasing edges. With log_scale a
+    bin count gives geometrically spaced edges, and values <= 0 are left
+    out. Missing values are always left out.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    if log_scale:
+        values = values[values > 0]
+    if len(values) == 0:
+        return pd.DataFrame({'left': [], 'right': [], 'count': []})
+    if np.ndim(bins) == 0:
+        low, high = values.min(), values.max()
+        if log_scale:
+            if high <= low:
+                low, high = low / 2, low * 2
+            edges = np.geomspace(low, high, int(bins) + 1)
+        else:
+            edges = np.histogram_bin_edges(values, int(bins))
+    else:
+        edges = np.asarray(bins, dtype=float)
+    counts, edges = np.histogram(values, edges)
+    return pd.DataFrame({'left': edges[:-1], 'right': edges[1:], 'count': counts})
+
+
+def _histogram_figure(binned, title, label, categorical=False):
+    """Bars of precomputed bin counts: one value per bin reaches the browser, whatever the loan count.
+    
+    categorical draws equal-width bars labelled with their ranges (for
+    geometric bins); otherwise bars span their bins on a linear axis.
+    """
+    ranges = [f"{left:.3g}-{right:.3g}" for left, right in zip(binned['left'], binned['right'])]
+    if categorical:
+        bar = go.Bar(x=ranges, y=binned['count'], hovertemplate=f"{label}: %{{x}}<br>Loans: %{{y:,}}<extra></extra>")
+    else:
+        bar = go.Bar(
+            x=(binned['left'] + binned['right']) / 2,
+            y=binned['count'],
+            width=binned['right'] - binned['left'],
+            customdata=ranges,
+            hovertemplate=f"{label}: %{{customdata}}<br>Loans: %{{y:,}}<extra></extra>"
+        )
+    fig = go.Figure(bar)
+    fig.update_layout(
+        title=title,
+        xaxis_title=label,
+        yaxis_title='Frequency',
+        bargap=0,
+        height=400,
+        showlegend=False
+    )
+    return fig
+
+
+@instrumented()
+def plot_value_event_by_attempt(attempt_stats):
+    """Interactive bar chart: value_event rate by attempt number."""
+    if len(attempt_stats) == 0:
+        return None
+    
+    fig = px.bar(
+        attempt_stats,
+        x='attempt',
+        y='value_rate',
+        title='Value Event Rate by Attempt Number',
+        labels={'attempt': 'Attempt Number', 'value_rate': 'Value Event Rate (%)'},
+        text='value_rate',
+        text_auto='.1f'
+    )
+    fig.update_traces(textposition='outside')
+    fig.update_layout(
+        xaxis=dict(tickmode='linear', tick0=1, dtick=1),
+        height=400,
+        showlegend=False
+    )
+    return fig
+
+
+@instrumented()
+def plot_minutes_to_value_distribution(loan_metrics_df, bins=MINUTES_BINS, log_scale=False):
+    """Histogram of minutes_to_value, binned server-side.
+    
+    bins is a bin count or a sequence of edges; log_scale spaces a bin count
+    geometrically (minutes to value are long-tailed) and labels each bar
+    with its range.
+    """
+    if len(loan_metrics_df) == 0 or 'minutes_to_value' not in loan_metrics_df.columns:
+        return None
+    
+    binned = histogram_bins(loan_metrics_df['minutes_to_value'], bins, log_scale)
+    if len(binned) == 0:
+        return None
+    return _histogram_figure(binned, 'Distribution of Minutes to Value (Loan-level)', 'Minutes to Value',
+                             categorical=log_scale)
+
+
+@instrumented()
+def plot_promise_breakdown(category_counts):
+    """Interactive pie chart showing promise category breakdown."""
+    if len(category_counts) == 0:
+        return None
+    
+    fig = px.pie(
+        values=category_counts.values,
+        names=category_counts.index,
+        title='Promise Category Breakdown',
+        height=400
+    )
+    return fig
+
+
+@instrumented()
+def plot_forwarded_by_attempt(forward_by_attempt):
+    """Bar chart of forwarded calls by attempt number."""
+    if len(forward_by_attempt) == 0:
+        return None
+    
+    fig = px.bar(
+        forward_by_attempt,
+        x='attempt',
+        y='count',
+        title='Forwarded Calls by Attempt Number',
+        labels={'attempt': 'Attempt Number', 'count': 'Number of Calls'},
+        height=300
+    )
+    fig.update_layout(xaxis=dict(tickmode='linear', tick0=1, dtick=1))
+    return fig
+
+
+@instrumented()
+def plot_non_value_reasons(reason_counts):
+    """Horizontal bar chart of the most common non-value end reasons."""
+    if len(reason_counts) == 0:
+        return None
+    
+    fig = px.bar(
+        x=reason_counts.values,
+        y=reason_counts.index,
+        orientation='h',
+        title='Top Non-Value Reasons',
+        labels={'x': 'Count', 'y': 'End Reason'},
+        height=300
+    )
+    return fig
+
+
+@instrumented()
+def plot_time_distribution(call_metrics):
+    """Pie chart of productive vs non-value call minutes."""
+    if call_metrics['total_minutes'] <= 0:
+        return None
+    
+    time_df = pd.DataFrame({
+        'Category': ['Productive Time', 'Non-Value Time'],
+        'Minutes': [call_metrics['cost_saved_minutes'], call_metrics['waste_minutes']]
+    })
+    fig = px.pie(
+        time_df,
+        values='Minutes',
+        names='Category',
+        title='Time Distribution: Productive vs Non-Value',
+        height=300
+    )
+    return fig
+
+
+@instrumented()
+def plot_attempts_to_value_distribution(loan_metrics_df, bins=None, log_scale=False):
+    """Histogram of attempts_to_value, binned server-side.
+    
+    By default each attempt number gets its own bar; bins (a count or a
+    sequence of edges) overrides that. log_scale puts the loan counts on a
+    log axis.
+    """
+    if len(loan_metrics_df) == 0 or 'attempts_to_value' not in loan_metrics_df.columns:
+        return None
+    
+    attempts = loan_metrics_df['attempts_to_value']
+    if bins is None:
+        bins = np.arange(attempts.min() - 0.5, attempts.max() + 1.5)
+    binned = histogram_bins(attempts, bins)
+    fig = _histogram_figure(binned, 'Distribution of Attempts to Value (Loan-level)', 'Attempts to Value')
+    fig.update_layout(xaxis=dict(tickmode='linear', tick0=1, dtick=1))
+    if log_scale:
+        fig.update_yaxes(type='log')
+    return fig
+
+
+@instrumented()
+def plot_metrics_over_time(stats, granularity='day', window_days=None):
+    """Line chart of promise rate and value event rate per period (see TimeSeries.stats).
+
+    With window_days the lines are the trailing window_days rates and the
+    per-period rates are drawn faintly behind them.
+    """
+    if len(stats) == 0 or stats['calls'].sum() == 0:
+        return None
+    
+    # Markers only while the points are few enough to tell apart
+    mode = 'lines+markers' if len(stats) <= MARKER_POINTS else 'lines'
+    fig = go.Figure()
+    for rate, label in (('promise_rate', 'Promise Rate (%)'), ('value_rate', 'Value Event Rate (%)')):
+        if window_days:
+            fig.add_trace(go.Scatter(
+                x=stats['period'],
+                y=stats[rate],
+                mode=mode,
+                name=f'{label}, per {granularity}',
+                line=dict(width=1, dash='dot'),
+                opacity=0.4
+            ))
+            fig.add_trace(go.Scatter(
+                x=stats['period'],
+                y=stats[f'{rate}_{window_days}d'],
+                mode='lines',
+                name=f'{label}, {window_days}-day',
+                line=dict(width=2)
+            ))
+        else:
+            fig.add_trace(go.Scatter(
+                x=stats['period'],
+                y=stats[rate],
+                mode=mode,
+                name=label,
+                line=dict(width=2)
+            ))
+    fig.update_layout(
+        title='Promise Rate and Value Event Rate Over Time',
+        xaxis_title=granularity.capitalize(),
+        yaxis_title='Rate (%)',
+        height=400,
+        hovermode='x unified'
+    )
+    return fig
+
+
+@instrumented()
+def plot_activity_heatmap(grid, measure='calls'):
+    """Heatmap of a measure by day of week and hour of day (see TimeSeries.heatmap).
+    
+    None when no call has a start time: rates are then all missing, counts all zero.
+    """
+    if grid.size == 0 or grid.isna().all().all():
+        return None
+    if not measure.endswith('_rate') and grid.to_numpy().sum() == 0:
+        return None
+    
+    label = HEATMAP_LABELS.get(measure, measure)
+    fig = go.Figure(go.Heatmap(
+        z=grid.to_numpy(),
+        x=list(grid.columns),
+        y=list(grid.index),
+        colorscale='Blues',
+        colorbar=dict(title=label),
+        hovertemplate=f'%{{y}} %{{x}}:00<br>{label}: %{{z:,.4g}}<extra></extra>'
+    ))
+    fig.update_layout(
+        title=f'{label} by Hour and Day of Week',
+        xaxis=dict(title='Hour of Day', tickmode='linear', tick0=0, dtick=2),
+        yaxis=dict(title='', autorange='reversed'),
+        height=400
+    )
+    return fig
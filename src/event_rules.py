@@ -0,0 +1,116 @@
+"""
+Declarative event rules for classifying calls.
+
+Events (promise, forward, value, waste, or any client-specific ones) are
+defined in a JSON file as an ordered list. Each event is true when ANY of its
+conditions holds. A condition either tests a column value, case-insensitively:
+
+    {"column": "category", "in": ["promise_to_pay", "willing_to_pay"]}
+    {"column": "end_reason", "equals": "silence-timed-out"}
+    {"column": "end_reason", "contains": "assistant-forward"}
+
+or refers to an event defined earlier in the list:
+
+    {"event": "promise_category"}
+
+Any condition can be inverted with "negate": true. A column condition on a
+column the report does not have is an error rather than a silent no-match,
+since a negated one would otherwise flag every call.
+
+Column conditions are evaluated once per distinct value of the column (its
+categorical dictionary) and broadcast to rows through the integer codes, so
+the cost depends on the number of distinct values rather than rows.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+COLUMN_OPERATORS = ('in', 'equals', 'contains')
+
+
+def _validate_condition(condition, known_events, event_name):
+    if 'event' in condition:
+        if condition['event'] not in known_events:
+            raise ValueError(
+                f"Event rule '{event_name}' refers to '{condition['event']}', "
+                "which is not defined before it"
+            )
+        return
+    if 'column' not in condition:
+        raise ValueError(f"Event rule '{event_name}' has a condition without 'column' or 'event'")
+    operators = [op for op in COLUMN_OPERATORS if op in condition]
+    if len(operators) != 1:
+        raise ValueError(
+            f"Event rule '{event_name}' condition on '{condition['column']}' needs exactly one of "
+            f"{', '.join(COLUMN_OPERATORS)}"
+        )
+
+
+def parse_event_rules(config):
+    """Validate a rules config (as loaded from JSON) and return its event list."""
+    events = config.get('events')
+    if not isinstance(events, list) or not events:
+        raise ValueError("Event rules need a non-empty 'events' list")
+
+    known_events = set()
+    for event in events:
+        name = event.get('name')
+        if not name:
+            raise ValueError("Every event rule needs a 'name'")
+        conditions = event.get('any')
+        if not isinstance(conditions, list) or not conditions:
+            raise ValueError(f"Event rule '{name}' needs a non-empty 'any' list")
+        for condition in conditions:
+            _validate_condition(condition, known_events, name)
+        known_events.add(name)
+    return events
+
+
+def load_event_rules(path):
+    """Load and validate event rules from a JSON file."""
+    with open(Path(path)) as f:
+        return parse_event_rules(json.load(f))
+
+
+def _match_dictionary(categories, condition):
+    """Evaluate a column condition against lowercased dictionary values."""
+    if 'in' in condition:
+        return categories.isin([str(v).lower() for v in condition['in']])
+    if 'equals' in condition:
+        return categories == str(condition['equals']).lower()
+    return categories.str.contains(str(condition['contains']).lower(), regex=False)
+
+
+def column_condition_mask(values, condition):
+    """Boolean row mask for a column condition, evaluated per distinct value."""
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype('category')
+    categories = values.cat.categories.astype(str).str.lower()
+    hits = np.asarray(_match_dictionary(categories, condition), dtype=bool)
+    # Trailing False so missing values (code -1) never match
+    lookup = np.append(hits, False)
+    return pd.Series(lookup[values.cat.codes.to_numpy()], index=values.index)
+
+
+def apply_event_rules(df, events):
+    """Add one boolean column per event to df (in place) and return it."""
+    for event in events:
+        mask = pd.Series(False, index=df.index)
+        for condition in event['any']:
+            if 'event' in condition:
+                matched = df[condition['event']]
+            elif condition['column'] in df.columns:
+                matched = column_condition_mask(df[condition['column']], condition)
+            else:
+                raise ValueError(
+                    f"Event rule '{event['name']}' has a condition on column '{condition['column']}', "
+                    "which the report does not have"
+                )
+            if condition.get('negate', False):
+                matched = ~matched
+            mask = mask | matched
+        df[event['name']] = mask
+    return df
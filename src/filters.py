@@ -0,0 +1,180 @@
+"""
+Indexed row filters for report frames.
+
+FilterIndex is built once per loaded report. For each indexed column it keeps
+the row positions grouped by value (a posting list per distinct value), and
+for started_at the row positions sorted by time. A filter on a column turns
+the posting lists of the selected values into a row bitmap; filters on several
+columns are combined by intersecting bitmaps, and a date range is two binary
+searches into the sorted time index. No filter rescans the column values.
+
+The result of a filter is a RowView: the shared frame plus the selected row
+positions. Consumers project the columns they need, or take a window of rows,
+instead of receiving a materialized copy of the whole filtered frame.
+"""
+
+import numpy as np
+import pandas as pd
+
+INDEXED_COLUMNS = ['category', 'end_reason', 'status', 'state', 'attempt']
+TIME_COLUMN = 'started_at'
+
+
+class ValueIndex:
+    """Row positions grouped by distinct column value."""
+
+    def __init__(self, values):
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = values.cat.codes.to_numpy()
+            self.values = list(values.cat.categories)
+        else:
+            codes, uniques = pd.factorize(values, sort=True)
+            self.values = list(uniques)
+        # Positions sorted by value code; missing values (code -1) sort first and are skipped
+        order = np.argsort(codes, kind='stable')
+        missing = int((codes < 0).sum())
+        self.positions = order[missing:]
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.values))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._code_of = {value: code for code, value in enumerate(self.values)}
+
+    def present_values(self):
+        """Values that occur in at least one row."""
+        counts = np.diff(self.offsets)
+        return [value for value, count in zip(self.values, counts) if count > 0]
+
+    def bitmap(self, selected, n_rows):
+        """Boolean row mask for rows whose value is in selected."""
+        mask = np.zeros(n_rows, dtype=bool)
+        for value in selected:
+            code = self._code_of.get(value)
+            if code is not None:
+                mask[self.positions[self.offsets[code]:self.offsets[code + 1]]] = True
+        return mask
+
+    @property
+    def nbytes(self):
+        return self.positions.nbytes + self.offsets.nbytes
+
+
+class TimeIndex:
+    """Row positions sorted by timestamp, for range queries."""
+
+    def __init__(self, values):
+        valid = values.notna().to_numpy()
+        stamps = values.to_numpy()
+        order = np.argsort(stamps, kind='stable')
+        order = order[valid[order]]
+        self.positions = order
+        self.sorted_values = stamps[order]
+
+    def bounds(self):
+        """(earliest, latest) timestamp, or None when the column is all missing."""
+        if len(self.sorted_values) == 0:
+            return None
+        return pd.Timestamp(self.sorted_values[0]), pd.Timestamp(self.sorted_values[-1])
+
+    def bitmap(self, start, end, n_rows):
+        """Boolean row mask for start <= value < end (either bound may be None)."""
+        lo = 0 if start is None else np.searchsorted(self.sorted_values, np.datetime64(start), side='left')
+        hi = len(self.sorted_values) if end is None else np.searchsorted(self.sorted_values, np.datetime64(end), side='left')
+        mask = np.zeros(n_rows, dtype=bool)
+        mask[self.positions[lo:hi]] = True
+        return mask
+
+    @property
+    def nbytes(self):
+        return self.positions.nbytes + self.sorted_values.nbytes
+
+
+class FilterIndex:
+    """Value and time indexes over a report frame, resolved by bitmap intersection."""
+
+    def __init__(self, df, columns=INDEXED_COLUMNS, time_column=TIME_COLUMN):
+        self.n_rows = len(df)
+        self.columns = {col: ValueIndex(df[col]) for col in columns if col in df.columns}
+        self.time = TimeIndex(df[time_column]) if time_column in df.columns else None
+
+    def options(self, column):
+        """Selectable values for an indexed column."""
+        return self.columns[column].present_values() if column in self.columns else []
+
+    def date_bounds(self):
+        return self.time.bounds() if self.time is not None else None
+
+    def select(self, criteria):
+        """Sorted row positions matching every criterion, or None for all rows.
+
+        criteria maps an indexed column to the values to keep, and may hold
+        'date_range': (start, end) with end exclusive. Empty criteria are
+        ignored.
+        """
+        mask = None
+        for column, selected in criteria.items():
+            if column == 'date_range':
+                if self.time is None:
+                    continue
+                column_mask = self.time.bitmap(selected[0], selected[1], self.n_rows)
+            elif column in self.columns and selected:
+                column_mask = self.columns[column].bitmap(selected, self.n_rows)
+            else:
+                continue
+            mask = column_mask if mask is None else (mask & column_mask)
+        return None if mask is None else np.flatnonzero(mask)
+
+    @property
+    def nbytes(self):
+        indexes = list(self.columns.values()) + ([self.time] if self.time is not None else [])
+        return int(sum(index.nbytes for index in indexes))
+
+
+class RowView:
+    """Rows of a frame selected by position, without copying the frame.
+
+    positions=None means every row. The frame is shared and must be treated
+    as read-only.
+    """
+
+    def __init__(self, df, positions=None):
+        self.df = df
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.df) if self.positions is None else len(self.positions)
+
+    @property
+    def columns(self):
+        return self.df.columns
+
+    @property
+    def is_filtered(self):
+        return self.positions is not None
+
+    def frame(self, columns=None):
+        """The selected rows as a frame, projected to columns.
+
+        Unfiltered views are returned without copying rows.
+        """
+        df = self.df if columns is None else self.df[[col for col in columns if col in self.df.columns]]
+        return df if self.positions is None else df.iloc[self.positions]
+
+    def column(self, name):
+        """One column over the selected rows."""
+        values = self.df[name]
+        return values if self.positions is None else values.iloc[self.positions]
+
+    def take(self, rows, columns=None):
+        """Rows at the given positions (or slice) within the view, e.g. one page."""
+        positions = rows if self.positions is None else self.positions[rows]
+        df = self.df if columns is None else self.df[[col for col in columns if col in self.df.columns]]
+        return df.iloc[positions]
+
+    def chunks(self, chunk_rows, columns=None):
+        """Yield consecutive row windows of the view (at least one, even when empty)."""
+        for start in range(0, max(len(self), 1), chunk_rows):
+            yield self.take(slice(start, start + chunk_rows), columns)
+
+    @property
+    def nbytes(self):
+        """Memory owned by the view itself (the frame is shared)."""
+        return 0 if self.positions is None else int(self.positions.nbytes)
@@ -0,0 +1,238 @@
+"""
+Per-stage timing and memory accounting for a dashboard session.
+
+Every rerun records, per stage (load, events, filters, aggregates, each
+metric expander, ...), the wall and CPU time it took, the rows it read and
+produced, the bytes the stage's result keeps alive and, when tracing is on,
+the bytes allocated while it ran (tracemalloc peak above the level at stage
+start). Results that live in the process-wide dataset cache are marked
+shared: they are paid once per process, not per session, and do not count
+towards the session budget.
+
+Hot functions in the metrics core (parsing, define_events, the loan metrics,
+the chart builders) are wrapped with @instrumented. While a ledger is active
+on the calling thread they record themselves as stages nested in the
+dashboard stage that called them; otherwise (batch jobs, the watcher) the
+wrapper costs one context variable lookup.
+
+Tracing costs time on every allocation, so it is opt-in
+(DOMU_TRACE_MEMORY=1); times and retained bytes are always recorded. A
+ledger exports as JSON or as Chrome trace events (chrome://tracing,
+Perfetto), and profile_report summarizes a cProfile capture of a rerun.
+"""
+
+import contextvars
+import functools
+import json
+import marshal
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Ledger of the rerun running on this thread (each Streamlit rerun has its own thread)
+_active_ledger = contextvars.ContextVar('active_ledger', default=None)
+
+REPORT_COLUMNS = ['stage', 'within', 'calls', 'wall_ms', 'cpu_ms', 'rows_in', 'rows_out', 'retained_bytes',
+                  'allocated_bytes', 'shared']
+
+
+def nbytes_of(value):
+    """Approximate memory held by a frame, series, array or container of them."""
+    if value is None:
+        return 0
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, (list, tuple)):
+        return sum(nbytes_of(item) for item in value)
+    if isinstance(value, dict):
+        return sum(nbytes_of(item) for item in value.values())
+    return int(getattr(value, 'nbytes', 0))
+
+
+def row_count(value):
+    """Rows in a frame or series (or the first item of a tuple result), else None."""
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    return None
+
+
+def instrumented(name=None):
+    """Record each call of the decorated function as a stage of the active ledger.
+
+    rows_in is the length of the first frame argument and rows_out that of
+    the result. Without an active ledger the function is called as is.
+    """
+    def decorate(fn):
+        stage_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            ledger = _active_ledger.get()
+            if ledger is None:
+                return fn(*args, **kwargs)
+            with ledger.stage(stage_name):
+                result = fn(*args, **kwargs)
+            frames = [arg for arg in args if isinstance(arg, (pd.DataFrame, pd.Series))]
+            ledger.rows(stage_name, row_count(frames[0]) if frames else None, row_count(result))
+            return result
+        return wrapper
+    return decorate
+
+
+class StageLedger:
+    """Time and memory used by each stage of one rerun, checked against a session budget."""
+
+    def __init__(self, budget_bytes=None, trace=False):
+        self.budget_bytes = budget_bytes
+        self.trace = trace
+        self._stages = {}  # name -> record, in first-seen order
+        self._spans = []  # one entry per stage run, in completion order
+        self._open = []  # stages being measured, outermost first
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def activate(self):
+        """Make this the ledger @instrumented functions record into on this thread."""
+        _active_ledger.set(self)
+        return self
+
+    def _record(self, name):
+        if name not in self._stages:
+            self._stages[name] = {
+                'stage': name, 'within': None, 'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                'rows_in': None, 'rows_out': None, 'retained_bytes': 0, 'allocated_bytes': None, 'shared': False
+            }
+        return self._stages[name]
+
+    @contextmanager
+    def stage(self, name):
+        """Time the block and (when tracing) measure its allocations; stages may nest.
+
+        A stage run several times accumulates its times and keeps its largest
+        allocation.
+        """
+        record = self._record(name)
+        if self._open and record['within'] is None:
+            record['within'] = self._open[-1]['name']
+        frame = {'name': name, 'peak': 0}
+        if self.trace:
+            # tracemalloc has one peak; fold it into the enclosing stage before resetting it
+            if self._open:
+                self._open[-1]['peak'] = max(self._open[-1]['peak'], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            frame['base'] = tracemalloc.get_traced_memory()[0]
+        self._open.append(frame)
+        start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        finally:
+            wall, cpu = time.perf_counter() - start, time.thread_time() - cpu_start
+            self._open.pop()
+            record['calls'] += 1
+            record['wall_seconds'] += wall
+            record['cpu_seconds'] += cpu
+            span = {'stage': name, 'start_seconds': start - self._origin, 'wall_seconds': wall,
+                    'cpu_seconds': cpu, 'thread': threading.get_native_id()}
+            if self.trace:
+                peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+                allocated = max(0, peak - frame['base'])
+                record['allocated_bytes'] = max(record['allocated_bytes'] or 0, allocated)
+                span['allocated_bytes'] = allocated
+                if self._open:
+                    self._open[-1]['peak'] = max(self._open[-1]['peak'], peak)
+                tracemalloc.reset_peak()
+            self._spans.append(span)
+
+    def rows(self, name, rows_in=None, rows_out=None):
+        """Add to the rows a stage read and produced."""
+        record = self._record(name)
+        if rows_in is not None:
+            record['rows_in'] = (record['rows_in'] or 0) + int(rows_in)
+        if rows_out is not None:
+            record['rows_out'] = (record['rows_out'] or 0) + int(rows_out)
+
+    def retain(self, name, value=None, nbytes=None, shared=False):
+        """Record what a stage keeps alive: value's size, or nbytes when given."""
+        record = self._record(name)
+        record['retained_bytes'] = int(nbytes if nbytes is not None else nbytes_of(value))
+        record['shared'] = shared
+        return value
+
+    def elapsed(self):
+        """Seconds since the ledger was created (the rerun so far)."""
+        return time.perf_counter() - self._origin
+
+    def session_bytes(self):
+        """Estimated session peak: retained session bytes plus the largest transient allocation."""
+        owned = [record for record in self._stages.values() if not record['shared']]
+        retained = sum(record['retained_bytes'] for record in owned)
+        transient = max(
+            (record['allocated_bytes'] - record['retained_bytes']
+             for record in owned if record['allocated_bytes'] is not None),
+            default=0
+        )
+        return retained + max(transient, 0)
+
+    def allows(self, nbytes):
+        """Whether allocating nbytes more keeps the session within budget."""
+        return self.budget_bytes is None or self.session_bytes() + nbytes <= self.budget_bytes
+
+    def over_budget(self):
+        return not self.allows(0)
+
+    def report(self):
+        """One row per stage (REPORT_COLUMNS); within names the enclosing stage of nested ones."""
+        rows = [dict(record, wall_ms=record['wall_seconds'] * 1000, cpu_ms=record['cpu_seconds'] * 1000)
+                for record in self._stages.values()]
+        report = pd.DataFrame(rows, columns=REPORT_COLUMNS)
+        return report.astype({'rows_in': 'Int64', 'rows_out': 'Int64', 'allocated_bytes': 'Int64'})
+
+    def to_json(self):
+        """The per-stage totals and every stage run, as JSON text."""
+        stages = [{key: record[key] for key in record} for record in self._stages.values()]
+        return json.dumps({'elapsed_seconds': self.elapsed(), 'stages': stages, 'spans': self._spans}, indent=2)
+
+    def trace_events(self):
+        """Stage runs in Chrome trace-event format (JSON text), nested by time."""
+        events = []
+        for span in self._spans:
+            args = {'cpu_ms': round(span['cpu_seconds'] * 1000, 3)}
+            record = self._stages[span['stage']]
+            for key in ('rows_in', 'rows_out'):
+                if record[key] is not None:
+                    args[key] = record[key]
+            if 'allocated_bytes' in span:
+                args['allocated_bytes'] = span['allocated_bytes']
+            events.append({
+                'name': span['stage'], 'cat': 'stage', 'ph': 'X', 'pid': self._pid, 'tid': span['thread'],
+                'ts': round(span['start_seconds'] * 1e6, 1), 'dur': round(span['wall_seconds'] * 1e6, 1),
+                'args': args
+            })
+        return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'})
+
+
+def profile_report(profiler, limit=30):
+    """The limit functions with the most cumulative time in a cProfile capture."""
+    rows = [
+        {'function': f"{func} ({os.path.basename(filename)}:{line})", 'calls': calls,
+         'own_ms': own * 1000, 'cumulative_ms': cumulative * 1000}
+        for (filename, line, func), (_, calls, own, cumulative, _) in pstats.Stats(profiler).stats.items()
+    ]
+    report = pd.DataFrame(rows, columns=['function', 'calls', 'own_ms', 'cumulative_ms'])
+    return report.nlargest(limit, 'cumulative_ms').reset_index(drop=True)
+
+
+def profile_bytes(profiler):
+    """A cProfile capture as a .prof file (what pstats.Stats.dump_stats writes)."""
+    return marshal.dumps(pstats.Stats(profiler).stats)
@@ -0,0 +1,310 @@
+"""
+Persistent per-loan state for attempts-to-value and minutes-to-value.
+
+A loan's metrics depend only on its calls up to and including its first
+value event, in call order (attempt, then started_at with missing times
+last, then arrival order): its prefix. A LoanSummary keeps exactly those
+calls, as compact numeric rows (the loan's position in the summary's loan
+index, attempt, started_at, arrival sequence, duration and value flag), and
+drops every call that sorts after a loan's first value event. A prefix is
+bounded per loan: it ends at the first value event, or holds the calls of a
+loan that has none yet.
+
+Ingesting a batch merges its calls into the prefixes of only the loans it
+touches and trims them again, so an earlier attempt that shows up in a later
+file or chunk lands in its place without going back to the reports.
+Summaries of separate sets of calls combine the same way. Memory grows with
+the number of loans and the calls in their prefixes, not with the calls made
+after a loan's first value event.
+
+LoanStateStore keeps one LoanSummary per source report file, like
+AggregateState does for the call cubes, so new reports are ingested on their
+own and a report that changed or went away is just replaced or dropped. The
+summary of a selection of reports combines theirs.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from instrumentation import instrumented
+from report_io import file_fingerprint, pa, read_table_metadata, write_table_atomic
+
+STORE_VERSION = 4
+STORE_METADATA_KEY = b"domu.loan_state"
+
+# Columns read from each batch of calls (with event flags)
+LOAN_COLUMNS = ['loan_number', 'attempt', 'started_at', 'duration', 'value_event']
+
+# Prefix call rows; loan is the position in the summary's loan index, seq the arrival order across batches
+PREFIX_TYPES = {
+    'loan': 'int32',
+    'attempt': 'int64',
+    'started_at': 'datetime64[us]',
+    'seq': 'int64',
+    'duration': 'float64',
+    'value_event': 'bool'
+}
+
+# Selections whose combined summary a LoanStateStore keeps
+MERGED_SELECTIONS = 2
+
+EMPTY_LOAN_STATS = {
+    'median_attempts_to_value': 0,
+    'mean_attempts_to_value': 0.0,
+    'p90_attempts_to_value': 0,
+    'median_minutes_to_value': 0.0,
+    'mean_minutes_to_value': 0.0,
+    'p90_minutes_to_value': 0.0
+}
+
+
+def summarize_loans(loan_metrics_df):
+    """Median/mean/p90 of attempts_to_value and minutes_to_value."""
+    if len(loan_metrics_df) == 0:
+        return dict(EMPTY_LOAN_STATS)
+    return {
+        'median_attempts_to_value': int(loan_metrics_df['attempts_to_value'].median()),
+        'mean_attempts_to_value': loan_metrics_df['attempts_to_value'].mean(),
+        'p90_attempts_to_value': int(loan_metrics_df['attempts_to_value'].quantile(0.9)),
+        'median_minutes_to_value': loan_metrics_df['minutes_to_value'].median(),
+        'mean_minutes_to_value': loan_metrics_df['minutes_to_value'].mean(),
+        'p90_minutes_to_value': loan_metrics_df['minutes_to_value'].quantile(0.9)
+    }
+
+
+def _empty_prefix():
+    return pd.DataFrame({col: np.array([], dtype=dtype) for col, dtype in PREFIX_TYPES.items()})
+
+
+def _prefix_rows(calls, positions, seq):
+    """Prefix rows for calls (LOAN_COLUMNS) of the loans at positions, numbered from seq."""
+    return pd.DataFrame({
+        'loan': positions.astype('int32'),
+        'attempt': calls['attempt'].to_numpy(dtype='int64'),
+        'started_at': calls['started_at'].to_numpy('datetime64[us]'),
+        'seq': np.arange(seq, seq + len(calls), dtype='int64'),
+        'duration': calls['duration'].to_numpy(dtype=float),
+        'value_event': calls['value_event'].to_numpy(dtype=bool)
+    })
+
+
+def _trim(rows):
+    """rows in loan and call order, without the calls after each loan's first value event.
+
+    Rows are ordered with NumPy on the integer loan positions, several times
+    faster than grouping on the loan_number strings.
+    """
+    if len(rows) == 0:
+        return rows
+    # Missing start times sort last within an attempt
+    started = rows['started_at'].to_numpy('datetime64[us]').view('int64')
+    started = np.where(started == np.iinfo('int64').min, np.iinfo('int64').max, started)
+    loan = rows['loan'].to_numpy()
+    order = np.lexsort((rows['seq'].to_numpy(), started, rows['attempt'].to_numpy(), loan))
+    loan = loan[order]
+    value = rows['value_event'].to_numpy(dtype=bool)[order]
+    first = np.flatnonzero(np.r_[True, loan[1:] != loan[:-1]])
+
+    # Keep a call while no value event came before it (the first value event itself is kept)
+    values_before = np.cumsum(value) - value
+    values_before -= np.repeat(values_before[first], np.diff(np.r_[first, len(loan)]))
+    return rows.take(order[values_before == 0]).reset_index(drop=True)
+
+
+class LoanSummary:
+    """The calls of each loan up to its first value event, updated one batch of calls at a time."""
+
+    def __init__(self, loans=None, prefix=None, next_seq=0):
+        self.loans = pd.Index([], name='loan_number') if loans is None else loans
+        self.prefix = _empty_prefix() if prefix is None else prefix
+        self.next_seq = next_seq
+
+    @classmethod
+    def combine(cls, parts):
+        """The summary of the calls of every part, in order."""
+        parts = [part for part in parts if part.loan_count > 0]
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return cls()
+        # Later parts' calls sort after earlier ones' among calls with equal attempt and started_at
+        offsets = np.cumsum([0] + [part.next_seq for part in parts])
+        starts = np.cumsum([0] + [part.loan_count for part in parts])
+        codes, loans = pd.factorize(np.concatenate([part.loans.to_numpy() for part in parts]))
+        rows = pd.concat([
+            part.prefix.assign(loan=codes[start + part.prefix['loan'].to_numpy()].astype('int32'),
+                               seq=part.prefix['seq'] + offset)
+            for part, start, offset in zip(parts, starts, offsets)
+        ], ignore_index=True)
+        return cls(pd.Index(loans, name='loan_number'), _trim(rows), int(offsets[-1]))
+
+    def _positions(self, loans):
+        """Positions of loans in the loan index, appending the ones not seen before."""
+        positions = self.loans.get_indexer(loans)
+        new = positions < 0
+        if new.any():
+            positions[new] = np.arange(len(self.loans), len(self.loans) + new.sum())
+            added = loans[new].rename('loan_number')
+            self.loans = added if len(self.loans) == 0 else self.loans.append(added)
+        return positions
+
+    @instrumented('LoanStateStore.ingest')
+    def ingest(self, df):
+        """Merge a batch of calls (a frame with LOAN_COLUMNS) into the prefixes of the loans in it."""
+        if len(df) == 0 or 'loan_number' not in df.columns:
+            return self
+        batch = df.loc[df['loan_number'].notna(), LOAN_COLUMNS]
+        seq = self.next_seq
+        self.next_seq += len(batch)
+        if len(batch) == 0:
+            return self
+
+        codes, loans = pd.factorize(batch['loan_number'])
+        positions = self._positions(pd.Index(loans))
+        touched = np.zeros(len(self.loans), dtype=bool)
+        touched[positions] = True
+        held = touched[self.prefix['loan'].to_numpy()]
+        rows = pd.concat([self.prefix[held], _prefix_rows(batch, positions[codes], seq)], ignore_index=True)
+        self.prefix = pd.concat([self.prefix[~held], _trim(rows)], ignore_index=True)
+        return self
+
+    def loan_metrics(self):
+        """(loan_metrics_df, stats), as compute_loan_level_metrics returns them."""
+        # A loan's only value event left in its prefix is its first one, which ends the prefix
+        loan = self.prefix['loan'].to_numpy()
+        reached = self.prefix['value_event'].to_numpy()
+        if not reached.any():
+            return pd.DataFrame(), dict(EMPTY_LOAN_STATS)
+        seconds = np.bincount(loan, weights=self.prefix['duration'].to_numpy(), minlength=len(self.loans))
+        loan_metrics_df = pd.DataFrame({
+            'loan_number': self.loans.take(loan[reached]).to_numpy(),
+            'attempts_to_value': self.prefix['attempt'].to_numpy()[reached],
+            'minutes_to_value': seconds[loan[reached]] / 60.0
+        }).sort_values('loan_number', ignore_index=True)
+        return loan_metrics_df, summarize_loans(loan_metrics_df)
+
+    @property
+    def loan_count(self):
+        return len(self.loans)
+
+    @property
+    def nbytes(self):
+        return int(self.prefix.memory_usage(deep=True).sum() + self.loans.memory_usage(deep=True))
+
+
+class LoanStateStore:
+    """Per-source loan summaries for a set of report files, combined for any selection of them."""
+
+    def __init__(self, depends_on=()):
+        self.depends_on = [list(file_fingerprint(p)) for p in depends_on]
+        self._sources = {}  # resolved path -> (fingerprint, LoanSummary), in report order
+        self._merged = OrderedDict()  # selected sources -> LoanSummary, most recent last
+        self._lock = threading.Lock()
+
+    @property
+    def sources(self):
+        """Resolved source paths in the store."""
+        return list(self._sources)
+
+    def sync(self, paths, builder):
+        """Make the store cover exactly paths; returns whether it changed.
+
+        builder(path) returns the LoanSummary of a report. Only new or changed
+        reports are built; reports that went away are dropped.
+        """
+        current = {}
+        changed = False
+        for path in paths:
+            fingerprint = file_fingerprint(path)
+            entry = self._sources.get(fingerprint[0])
+            if entry is None or tuple(entry[0]) != fingerprint:
+                entry = (fingerprint, builder(path))
+                changed = True
+            current[fingerprint[0]] = entry
+        changed = changed or list(current) != list(self._sources)
+        if changed:
+            with self._lock:
+                self._sources = current
+                self._merged.clear()
+        return changed
+
+    def summary(self, paths=None):
+        """LoanSummary over every source, or over just the given report files."""
+        if paths is None:
+            selected = tuple(self._sources)
+        else:
+            wanted = {file_fingerprint(p)[0] for p in paths}
+            selected = tuple(source for source in self._sources if source in wanted)
+        with self._lock:
+            if selected in self._merged:
+                self._merged.move_to_end(selected)
+                return self._merged[selected]
+            parts = [self._sources[source][1] for source in selected]
+        merged = LoanSummary.combine(parts)
+        with self._lock:
+            self._merged[selected] = merged
+            while len(self._merged) > MERGED_SELECTIONS:
+                self._merged.popitem(last=False)
+        return merged
+
+    def loan_metrics(self, paths=None):
+        """(loan_metrics_df, stats) over every source, or over just the given report files."""
+        return self.summary(paths).loan_metrics()
+
+    @property
+    def loan_count(self):
+        return self.summary().loan_count
+
+    @property
+    def nbytes(self):
+        parts = {id(summary): summary for _, summary in self._sources.values()}
+        parts.update((id(summary), summary) for summary in self._merged.values())
+        return sum(summary.nbytes for summary in parts.values())
+
+    def save(self, path):
+        """Write the store to path atomically (needs pyarrow)."""
+        if pa is None:
+            raise RuntimeError("pyarrow is required to persist the loan state store")
+        summaries = [(source, summary) for source, (_, summary) in self._sources.items() if summary.loan_count > 0]
+        if summaries:
+            rows = pd.concat([summary.prefix.assign(source=source) for source, summary in summaries],
+                             ignore_index=True)
+            # Loan numbers as one dictionary-encoded column; the loan positions are rebuilt on load
+            rows['loan'] = union_categoricals([pd.Categorical.from_codes(summary.prefix['loan'], summary.loans)
+                                               for _, summary in summaries])
+        else:
+            rows = _empty_prefix().assign(source='')
+            rows['loan'] = pd.Categorical([])
+        rows = rows.rename(columns={'loan': 'loan_number'}).astype({'source': 'category'})
+        table = pa.Table.from_pandas(rows, preserve_index=False)
+        metadata = dict(table.schema.metadata or {})
+        metadata[STORE_METADATA_KEY] = json.dumps({
+            'version': STORE_VERSION,
+            'depends_on': self.depends_on,
+            'sources': {source: list(fingerprint) for source, (fingerprint, _) in self._sources.items()},
+            'next_seq': {source: summary.next_seq for source, (_, summary) in self._sources.items()}
+        }).encode()
+        return write_table_atomic(table.replace_schema_metadata(metadata), path)
+
+    @classmethod
+    def load(cls, path, depends_on=()):
+        """Read a saved store; an empty store when missing, unreadable or built from other rules."""
+        store = cls(depends_on)
+        table, stored = read_table_metadata(path, STORE_METADATA_KEY)
+        if table is None or stored.get('version') != STORE_VERSION or stored.get('depends_on') != store.depends_on:
+            return store
+        rows = table.to_pandas()
+        for source, fingerprint in stored['sources'].items():
+            part = rows.loc[rows['source'] == source]
+            loan_numbers = part['loan_number'].cat.remove_unused_categories()
+            prefix = part.drop(columns=['source', 'loan_number']).assign(loan=loan_numbers.cat.codes.to_numpy())
+            summary = LoanSummary(pd.Index(loan_numbers.cat.categories, name='loan_number'),
+                                  prefix[list(PREFIX_TYPES)].astype(PREFIX_TYPES).reset_index(drop=True),
+                                  stored['next_seq'][source])
+            store._sources[source] = (tuple(fingerprint), summary)
+        return store
@@ -0,0 +1,424 @@
+"""
+Headless metrics core for the Domu Bank call reports.
+
+Loading, cleaning, event flagging and the call- and loan-level metrics, with
+no Streamlit or plotly imports, so batch jobs can use them directly. The
+dashboard (app.py) builds on the same functions.
+
+Run as a script to compute the metrics for one or more report files:
+
+    python src/metrics.py data/domubank_report_*.csv
+    python src/metrics.py data/ --each --format parquet -o metrics.parquet
+
+Reports are streamed in chunks: memory grows with the distinct aggregate
+cells and with each loan's calls up to its first value event, not with every
+call.
+The event rules come from DOMU_EVENT_RULES, as in the dashboard.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+
+import pandas as pd
+
+from aggregate_state import AggregateState
+from aggregates import CallAggregates
+from event_rules import apply_event_rules, load_event_rules
+from filters import RowView
+from instrumentation import instrumented
+from loan_state import EMPTY_LOAN_STATS, LOAN_COLUMNS, LoanStateStore, LoanSummary, summarize_loans
+from report_dataset import (
+    dataset_columns, dataset_fingerprint, iter_dataset_chunks, read_dataset, read_dataset_rows, report_paths
+)
+from report_io import HEAVY_TEXT_COLUMNS, pa
+from sqlite_store import SqliteReport, build_sqlite
+
+# Default data and config locations are relative to the repository, not the working directory
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# A report file, a directory of domubank_report_MMDDYYYY files, or a glob pattern
+DATA_SOURCE = os.environ.get("DOMU_DATA", str(REPO_DIR / "data"))
+
+# Processes parsing report files in parallel (default: one per core)
+LOAD_WORKERS = int(os.environ.get("DOMU_LOAD_WORKERS", "0")) or None
+
+# Event definitions (promise/forward/value/waste); override per client
+EVENT_RULES_FILE = Path(os.environ.get("DOMU_EVENT_RULES", REPO_DIR / "config" / "event_rules.json"))
+
+# Reports at least this large (MB) are streamed in chunks instead of loaded whole
+STREAMING_MIN_MB = int(os.environ.get("DOMU_STREAMING_MIN_MB", "4096"))
+STREAM_CHUNK_ROWS = int(os.environ.get("DOMU_STREAM_CHUNK_ROWS", "250000"))
+
+# Persisted per-report aggregates; a report is only aggregated again when it changes
+AGGREGATE_STATE_FILE = Path(os.environ.get("DOMU_AGGREGATE_STATE", REPO_DIR / "data" / "call_aggregates.arrow"))
+
+# Persisted per-loan first-value state (see loan_state.py)
+LOAN_STATE_FILE = Path(os.environ.get("DOMU_LOAN_STATE", REPO_DIR / "data" / "loan_state.arrow"))
+
+# Sessions idle this long (minutes) are no longer counted as sharing the dataset registry
+SESSION_IDLE_MINUTES = int(os.environ.get("DOMU_SESSION_IDLE_MINUTES", "30"))
+
+# Prebuilt dashboard snapshot (see snapshot.py)
+SNAPSHOT_FILE = Path(os.environ.get("DOMU_SNAPSHOT", REPO_DIR / "data" / "report_snapshot.arrow"))
+
+# Seconds between checks of the data source for new or changed reports (see watcher.py)
+WATCH_INTERVAL_SECONDS = float(os.environ.get("DOMU_WATCH_INTERVAL_SECONDS", "5"))
+
+
+@instrumented()
+def load_data(paths):
+    """Load and clean the report files, parsed in parallel (typed columns come from report_io).
+    
+    The free-text columns are left out; see load_text_columns.
+    """
+    return clean_report(read_dataset(paths, metric_columns(paths), workers=LOAD_WORKERS))
+
+
+def metric_columns(paths):
+    """Every report column except the free-text ones."""
+    return [col for col in dataset_columns(paths) if col not in HEAVY_TEXT_COLUMNS]
+
+
+def clean_report(df):
+    """Apply missing-value defaults to typed report columns, in place."""
+    # Clean duration: numeric seconds, fill NaN with 0
+    df['duration'] = df['duration'].fillna(0)
+    
+    # Clean attempt: numeric, fill NaN with 1, cast to int
+    df['attempt'] = df['attempt'].fillna(1).astype(int)
+    
+    return df
+
+
+@instrumented()
+def define_events(df, rules_path=None):
+    """Define event flags from the declarative rules in EVENT_RULES_FILE.
+    
+    The default rules flag promise_category, forward_event, value_event and
+    waste_event; a per-client rules file can add or redefine events.
+    """
+    events = load_event_rules(rules_path or EVENT_RULES_FILE)
+    return apply_event_rules(df, events)
+
+
+def load_report(paths):
+    """Load report files and flag their events."""
+    return define_events(load_data(paths))
+
+
+def load_text_columns(paths):
+    """Load transcript/summary/recording_url, row-aligned with load_data."""
+    return read_dataset(paths, HEAVY_TEXT_COLUMNS, workers=LOAD_WORKERS)
+
+
+def load_text_rows(paths, positions, columns=None):
+    """Load free-text columns for the rows at positions only (row labels as in load_data)."""
+    columns = [col for col in (columns or HEAVY_TEXT_COLUMNS) if col in HEAVY_TEXT_COLUMNS]
+    return read_dataset_rows(paths, positions, STREAM_CHUNK_ROWS, columns)
+
+
+def iter_event_chunks(paths, columns=None, chunk_rows=None):
+    """Yield report files in chunks, cleaned and with event flags (metric columns by default)."""
+    events = load_event_rules(EVENT_RULES_FILE)
+    for chunk in iter_dataset_chunks(paths, chunk_rows or STREAM_CHUNK_ROWS, columns or metric_columns(paths)):
+        yield apply_event_rules(clean_report(chunk), events)
+
+
+def stream_call_aggregates(paths, chunk_rows=None):
+    """Fold report files into CallAggregates chunk by chunk, with bounded memory."""
+    call_aggs = CallAggregates()
+    for chunk in iter_event_chunks(paths, chunk_rows=chunk_rows):
+        call_aggs = call_aggs.merge(CallAggregates.from_frame(chunk))
+    return call_aggs
+
+
+def load_aggregate_state(paths):
+    """Bring the persisted aggregate state up to date with the report files.
+    
+    Only new or changed reports are aggregated, one cube per file; otherwise
+    the saved cubes are used as they are.
+    """
+    state = AggregateState.load(AGGREGATE_STATE_FILE, depends_on=[EVENT_RULES_FILE])
+    if state.sync(paths, lambda path: stream_call_aggregates([path])):
+        try:
+            state.save(AGGREGATE_STATE_FILE)
+        except (RuntimeError, OSError):
+            pass  # No pyarrow or unwritable data dir: keep the state in memory only
+    return state
+
+
+def iter_loan_calls(paths):
+    """Yield report calls in chunks, with event flags, projected to LOAN_COLUMNS."""
+    for chunk in iter_event_chunks(paths):
+        yield chunk[LOAN_COLUMNS]
+
+
+def summarize_loan_calls(paths):
+    """LoanSummary of report files, ingested chunk by chunk."""
+    summary = LoanSummary()
+    for chunk in iter_loan_calls(paths):
+        summary.ingest(chunk)
+    return summary
+
+
+def load_loan_state(paths):
+    """Bring the persisted loan state store up to date with the report files."""
+    store = LoanStateStore.load(LOAN_STATE_FILE, depends_on=[EVENT_RULES_FILE])
+    if store.sync(paths, lambda path: summarize_loan_calls([path])):
+        try:
+            store.save(LOAN_STATE_FILE)
+        except (RuntimeError, OSError):
+            pass  # No pyarrow or unwritable data dir: keep the store in memory only
+    return store
+
+
+def load_sqlite_report(paths):
+    """Open the SQLite database for the report files, building it first when missing or stale.
+    
+    The database holds every column, free text included, so pages and
+    exports read them from disk like the rest.
+    """
+    report = SqliteReport.open(paths, depends_on=[EVENT_RULES_FILE])
+    if report is None:
+        build_sqlite(paths, iter_event_chunks(paths, dataset_columns(paths)), depends_on=[EVENT_RULES_FILE])
+        report = SqliteReport.open(paths, depends_on=[EVENT_RULES_FILE])
+    return report
+
+
+def should_stream(paths):
+    """Whether the report files are too large to load whole."""
+    return sum(Path(p).stat().st_size for p in paths) >= STREAMING_MIN_MB * 1024 * 1024
+
+
+class DatasetCache:
+    """Process-wide registry of loaded reports, shared by every session.
+    
+    An LRU cache keyed on file fingerprints and bounded by memory. Each report
+    is loaded once per process: concurrent requests for an entry that is
+    still loading wait for that load instead of starting their own. Frames
+    are handed out as read-only views (shallow copies; with copy-on-write a
+    session's edits never reach the shared data). Sessions check in on every
+    rerun so the registry can report how many share it.
+    """
+    
+    def __init__(self, max_bytes, session_idle_seconds=SESSION_IDLE_MINUTES * 60):
+        self.max_bytes = max_bytes
+        self.session_idle_seconds = session_idle_seconds
+        self._entries = OrderedDict()  # (loader, fingerprints, dep fingerprints) -> (value, nbytes)
+        self._loading = {}  # key -> Future of a load in progress
+        self._sessions = {}  # session id -> last check-in (monotonic seconds)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+    
+    def get(self, paths, loader=load_report, depends_on=()):
+        """Return the cached frame (or aggregates) for the report files, loading them on a miss.
+        
+        Entries are keyed per loader as well as per set of files, plus the
+        fingerprints of any depends_on files (e.g. the event rules). A changed
+        file gets a new fingerprint, so stale entries are never served; they
+        simply age out of the LRU order.
+        """
+        key = self._key(paths, loader, depends_on)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _read_only(self._entries[key][0])
+            pending = self._loading.get(key)
+            if pending is None:
+                pending = self._loading[key] = Future()
+                self.misses += 1
+                loading = True
+            else:
+                self.waits += 1
+                loading = False
+        if not loading:
+            # Another session is loading this entry; share its result (or its error)
+            return _read_only(pending.result())
+        
+        try:
+            value = loader(paths)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            pending.set_exception(e)
+            raise
+        if isinstance(value, pd.DataFrame):
+            nbytes = int(value.memory_usage(deep=True).sum())
+        else:
+            nbytes = value.nbytes
+        
+        with self._lock:
+            self._entries[key] = (value, nbytes)
+            self._entries.move_to_end(key)
+            del self._loading[key]
+            # Evict least recently used entries, but always keep the newest one
+            while len(self._entries) > 1 and self.total_bytes() > self.max_bytes:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        pending.set_result(value)
+        return _read_only(value)
+    
+    def check_in(self, session_id):
+        """Record that a session is active (call once per rerun)."""
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[session_id] = now
+            for idle in [sid for sid, seen in self._sessions.items() if now - seen > self.session_idle_seconds]:
+                del self._sessions[idle]
+    
+    def _key(self, paths, loader, depends_on):
+        return (loader.__name__, dataset_fingerprint(paths), dataset_fingerprint(depends_on))
+    
+    def entry_bytes(self, paths, loader=load_report, depends_on=()):
+        """Bytes held by the cached entry for the report files (0 when not cached)."""
+        with self._lock:
+            entry = self._entries.get(self._key(paths, loader, depends_on))
+        return entry[1] if entry is not None else 0
+    
+    def total_bytes(self):
+        return sum(nbytes for _, nbytes in self._entries.values())
+    
+    def stats(self):
+        """Counters for display."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'loading': len(self._loading),
+                'sessions': len(self._sessions),
+                'bytes': self.total_bytes(),
+                'max_bytes': self.max_bytes
+            }
+
+
+def _read_only(value):
+    """A frame view that shares the cached data; copy-on-write keeps the original intact."""
+    return value.copy(deep=False) if isinstance(value, pd.DataFrame) else value
+
+
+@instrumented()
+def apply_filters(df, filter_index=None, criteria=None):
+    """Apply filters through the filter index; returns a RowView, not a copy."""
+    positions = filter_index.select(criteria) if filter_index is not None and criteria else None
+    return RowView(df, positions)
+
+
+def loan_metrics_bytes(view):
+    """Rough upper bound of what compute_loan_level_metrics allocates for a view.
+    
+    The projection, its sorted copy and the running sums each hold about one
+    copy of the loan columns.
+    """
+    columns = [col for col in LOAN_COLUMNS if col in view.columns]
+    if len(view.df) == 0 or not columns:
+        return 0
+    per_row = view.df[columns].memory_usage(index=False).sum() / len(view.df)
+    return int(3 * per_row * len(view))
+
+
+@instrumented()
+def compute_call_level_metrics(df):
+    """Compute call-level metrics."""
+    return CallAggregates.from_frame(df).call_metrics()
+
+
+@instrumented()
+def compute_loan_level_metrics(df):
+    """Compute loan-level metrics (attempts-to-value and minutes-to-value)."""
+    if len(df) == 0 or 'loan_number' not in df.columns:
+        return pd.DataFrame(), dict(EMPTY_LOAN_STATS)
+    
+    # Sort once globally: loan, then attempt asc, then started_at asc (NaT last).
+    # Multi-key sorts are stable, so ties keep their original row order.
+    calls = df.loc[df['loan_number'].notna(), ['loan_number', 'attempt', 'started_at', 'duration', 'value_event']]
+    calls = calls.sort_values(['loan_number', 'attempt', 'started_at'], na_position='last')
+    
+    # Running value-event count and running seconds within each loan
+    by_loan = calls.groupby('loan_number', sort=False)
+    values_so_far = by_loan['value_event'].cumsum()
+    seconds_so_far = by_loan['duration'].cumsum()
+    
+    # The first value event of a loan is the row where the running count hits 1;
+    # loans without value events never get there and are skipped
+    first_value = calls['value_event'].astype(bool) & (values_so_far == 1)
+    if not first_value.any():
+        return pd.DataFrame(), dict(EMPTY_LOAN_STATS)
+    
+    loan_metrics_df = pd.DataFrame({
+        'loan_number': calls.loc[first_value, 'loan_number'].to_numpy(),
+        'attempts_to_value': calls.loc[first_value, 'attempt'].to_numpy(),
+        'minutes_to_value': seconds_so_far[first_value].to_numpy() / 60.0
+    })
+    
+    return loan_metrics_df, summarize_loans(loan_metrics_df)
+
+
+def compute_report_metrics(paths):
+    """Call and loan metrics for report files, streamed in chunks.
+    
+    Returns one flat dict: the files, the compute_call_level_metrics values
+    and the compute_loan_level_metrics stats (plus loans_with_value).
+    """
+    call_metrics = stream_call_aggregates(paths).call_metrics()
+    store = LoanStateStore(depends_on=[EVENT_RULES_FILE])
+    store.sync(paths, lambda path: summarize_loan_calls([path]))
+    loan_metrics_df, loan_stats = store.loan_metrics()
+    return {
+        'files': [str(p) for p in paths],
+        **call_metrics,
+        **loan_stats,
+        'loans_with_value': len(loan_metrics_df)
+    }
+
+
+def write_metrics(rows, out, fmt):
+    """Write metric rows (dicts) to a path or binary file as JSON or Parquet."""
+    if fmt == 'parquet':
+        if pa is None:
+            raise RuntimeError("pyarrow is required for Parquet output")
+        import pyarrow.parquet as pq
+        pq.write_table(pa.Table.from_pandas(pd.DataFrame(rows), preserve_index=False), out)
+        return
+    # Metrics are numpy scalars; tolist() gives plain Python numbers
+    text = json.dumps(rows, indent=2, default=lambda value: value.tolist())
+    if hasattr(out, 'write'):
+        out.write(text.encode() + b"\n")
+    else:
+        Path(out).write_text(text + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute call and loan metrics for Domu Bank report files.")
+    parser.add_argument('sources', nargs='+',
+                        help="report files, directories of domubank_report_* files, or glob patterns")
+    parser.add_argument('--each', action='store_true', help="one result per report file instead of one overall")
+    parser.add_argument('--format', choices=['json', 'parquet'], default='json')
+    parser.add_argument('-o', '--output', help="output file (default: stdout, JSON only)")
+    args = parser.parse_args(argv)
+
+    paths = [path for source in args.sources for path in report_paths(source)]
+    if not paths:
+        parser.error("no report files found")
+    if args.format == 'parquet' and not args.output:
+        parser.error("--format parquet needs --output")
+
+    rows = [compute_report_metrics([path]) for path in paths] if args.each else [compute_report_metrics(paths)]
+    write_metrics(rows, args.output or sys.stdout.buffer, args.format)
+
+
+if __name__ == "__main__":
+    main()
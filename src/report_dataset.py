@@ -0,0 +1,158 @@
+"""
+Report datasets made of several report files.
+
+Exports land as one file per day, named like domubank_report_MMDDYYYY. A data
+source is a single report file, a directory of reports, or a glob pattern;
+report_paths resolves it to the report files in date order. The date in each
+file name is its partition key, so a date range selects files without
+opening them.
+
+read_dataset parses the files in parallel across a process pool and
+concatenates them into one frame with the same typed schema read_report
+returns for a single file (categoricals get the union of the files'
+categories, and row labels run 0..n-1 across files).
+"""
+
+import glob
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import repeat
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrumented
+from report_io import file_fingerprint, iter_report_chunks, read_report, report_columns, take_report_rows
+
+# Report files in a data directory
+REPORT_GLOB = "domubank_report_*.csv"
+
+# Partition date in a report file name (MMDDYYYY)
+REPORT_DATE_PATTERN = re.compile(r"domubank_report_(\d{8})")
+
+
+def partition_date(path):
+    """The date in a report file name, or None when it has none."""
+    match = REPORT_DATE_PATTERN.search(Path(path).name)
+    if match is None:
+        return None
+    try:
+        return pd.Timestamp(datetime.strptime(match.group(1), "%m%d%Y"))
+    except ValueError:
+        return None
+
+
+def _partition_order(path):
+    date = partition_date(path)
+    # Undated files sort after dated ones, by name
+    return (date is None, date or pd.Timestamp(0), Path(path).name)
+
+
+def report_paths(source):
+    """Report files for a file, directory or glob pattern, oldest partition first."""
+    source = str(source)
+    if os.path.isdir(source):
+        paths = glob.glob(os.path.join(glob.escape(source), REPORT_GLOB))
+    elif os.path.exists(source):
+        paths = [source]
+    else:
+        paths = glob.glob(source)
+    return tuple(sorted((Path(p) for p in paths), key=_partition_order))
+
+
+def prune_partitions(paths, start=None, end=None):
+    """Files whose partition date is within [start, end]; undated files are always kept."""
+    kept = []
+    for path in paths:
+        date = partition_date(path)
+        if date is None or ((start is None or date >= start) and (end is None or date <= end)):
+            kept.append(path)
+    return tuple(kept)
+
+
+def dataset_fingerprint(paths):
+    """Identify a set of report files by each file's fingerprint."""
+    return tuple(file_fingerprint(p) for p in paths)
+
+
+def dataset_columns(paths):
+    """Columns read_dataset can return: the union over the files, in first-seen order."""
+    return list(dict.fromkeys(col for path in paths for col in report_columns(path)))
+
+
+def concat_reports(frames):
+    """Concatenate typed report frames, keeping categoricals categorical."""
+    if len(frames) == 1:
+        return frames[0].reset_index(drop=True)
+    columns = list(dict.fromkeys(col for frame in frames for col in frame.columns))
+    frames = [frame.reindex(columns=columns) for frame in frames]
+    for col in columns:
+        categorical = [frame[col] for frame in frames if isinstance(frame[col].dtype, pd.CategoricalDtype)]
+        if not categorical:
+            # A column that is empty in one file parses as float; give it the other files' dtype
+            typed = [frame[col].dtype for frame in frames if frame[col].notna().any()]
+            if typed:
+                frames = [frame if frame[col].notna().any() else frame.assign(**{col: frame[col].astype(typed[0])})
+                          for frame in frames]
+            continue
+        categories = pd.Index(np.concatenate([values.cat.categories.to_numpy(dtype=object)
+                                              for values in categorical])).unique().sort_values()
+        dtype = pd.CategoricalDtype(categories)
+        frames = [frame.assign(**{col: frame[col].astype(dtype)}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def _read_partition(path, columns):
+    return read_report(path, columns)
+
+
+@instrumented()
+def read_dataset(paths, columns=None, workers=None):
+    """Read report files (in parallel when there are several) into one typed frame.
+
+    workers caps the process pool (default: one per core).
+    """
+    paths = list(paths)
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    if workers <= 1:
+        frames = [read_report(path, columns) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(_read_partition, paths, repeat(columns)))
+    return concat_reports(frames)
+
+
+def iter_dataset_chunks(paths, chunk_rows, columns=None):
+    """Yield report files in order as typed chunks; row labels continue across files."""
+    offset = 0
+    for path in paths:
+        for chunk in iter_report_chunks(path, chunk_rows, columns):
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+
+
+def read_dataset_rows(paths, positions, chunk_rows, columns=None):
+    """Read only the rows at positions (row labels as read_dataset numbers them), in that order.
+
+    Each file is asked for its own rows (see take_report_rows); files after
+    the last wanted row are not opened.
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    wanted = np.unique(positions)
+    frames, offset = [], 0
+    for path in paths:
+        if len(wanted) == 0 or wanted[-1] < offset:
+            break
+        rows, row_count = take_report_rows(path, wanted[wanted >= offset] - offset, chunk_rows, columns)
+        rows.index = rows.index + offset
+        frames.append(rows)
+        offset += row_count
+    if not frames:
+        return pd.DataFrame(columns=columns, index=pd.Index(positions))
+    rows = concat_reports(frames)
+    rows.index = np.concatenate([frame.index.to_numpy() for frame in frames])
+    return rows.loc[positions]
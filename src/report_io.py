@@ -0,0 +1,344 @@
+"""
+Report file I/O for the Domubank call reports.
+
+Parsing the report CSV (datetimes, numeric coercion, categorical codes)
+is done once and stored in a typed Arrow IPC sidecar next to the CSV. Later
+reads memory-map the sidecar instead of re-parsing text. The sidecar records
+the fingerprint of the CSV it was built from and is rebuilt automatically when
+the CSV changes.
+
+Reads can be projected to a subset of columns, so the large free-text columns
+(transcript, summary, recording_url) are only materialized when asked for.
+
+Usage (pre-build sidecars, e.g. after a new export lands):
+    python src/report_io.py "data/domubank_report_11272025 - Domubankreport.csv"
+"""
+
+import gzip
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow is optional; without it every read parses the CSV
+    pa = None
+
+SIDECAR_SUFFIX = ".arrow"
+SIDECAR_VERSION = 3
+SIDECAR_METADATA_KEY = b"domu.source"
+
+# Resolved target path -> lock serializing the writers of that file in this process
+_target_locks = {}
+_target_locks_guard = threading.Lock()
+
+DATETIME_COLUMNS = ['created_at', 'started_at']
+NUMERIC_COLUMNS = ['duration', 'attempt']
+
+# Low-cardinality columns stored as pandas categoricals (integer codes)
+CATEGORICAL_COLUMNS = ['category', 'end_reason', 'status', 'state']
+
+# Free-text columns no metric uses; read them only on demand
+HEAVY_TEXT_COLUMNS = ['recording_url', 'transcript', 'summary']
+
+# Export format -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'csv.gz': ('.csv.gz', 'application/gzip'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet')
+}
+
+
+def file_fingerprint(path):
+    """Identify a report file by resolved path, size and modification time."""
+    path = Path(path).resolve()
+    stat = path.stat()
+    return (str(path), stat.st_size, stat.st_mtime_ns)
+
+
+def sidecar_path(path):
+    """Location of the typed sidecar for a report CSV."""
+    path = Path(path)
+    return path.with_suffix(SIDECAR_SUFFIX)
+
+
+def parse_report_csv(path, usecols=None):
+    """Parse a report CSV into typed columns.
+
+    Missing values are kept as-is (NaT / NaN) so the frame stays faithful to
+    the source; defaults such as duration=0 are applied by the caller.
+    usecols limits parsing to those source columns (unknown names are ignored).
+    """
+    if usecols is None:
+        df = pd.read_csv(path, dtype=_csv_dtypes())
+    else:
+        df = pd.read_csv(path, usecols=_usecols(usecols), dtype=_csv_dtypes())
+    return _type_columns(df)
+
+
+def _csv_dtypes():
+    # Categorical columns are parsed straight into codes, never as strings
+    return {col: 'category' for col in CATEGORICAL_COLUMNS}
+
+
+def _usecols(columns):
+    wanted = set(columns)
+    return lambda col: col in wanted
+
+
+def _type_columns(df):
+    """Coerce datetimes and numerics, in place."""
+    for col in DATETIME_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    return df
+
+
+def _source_metadata(path):
+    _, size, mtime_ns = file_fingerprint(path)
+    return {'version': SIDECAR_VERSION, 'size': size, 'mtime_ns': mtime_ns}
+
+
+def write_sidecar(df, path):
+    """Write df as the sidecar for the CSV at path, atomically."""
+    target = sidecar_path(path)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[SIDECAR_METADATA_KEY] = json.dumps(_source_metadata(path)).encode()
+    return write_table_atomic(table.replace_schema_metadata(metadata), target)
+
+
+def _target_lock(target):
+    key = str(Path(target).resolve())
+    with _target_locks_guard:
+        return _target_locks.setdefault(key, threading.Lock())
+
+
+@contextmanager
+def atomic_target(target):
+    """Yield a fresh temporary path next to target; on a clean exit it replaces target.
+
+    The temporary name is unique (mkstemp), so writers in other threads or
+    processes never share it, and writers of the same target in this process
+    run one at a time. The temporary file is removed if the write fails.
+    """
+    target = Path(target)
+    with _target_lock(target):
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=f"{target.name}.", suffix='.tmp')
+        os.close(fd)
+        tmp = Path(tmp)
+        try:
+            yield tmp
+            os.replace(tmp, target)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+
+def write_table_atomic(table, target):
+    """Write an Arrow table as an IPC file at target, replacing it atomically."""
+    target = Path(target)
+    with atomic_target(target) as tmp:
+        with pa.OSFile(str(tmp), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    return target
+
+
+def read_table_metadata(path, key):
+    """Read an Arrow IPC file written by write_table_atomic.
+
+    Returns (table, metadata) where metadata is the JSON stored under key in
+    the schema, or (None, None) when the file is missing, unreadable or has
+    no such metadata.
+    """
+    if pa is None or not Path(path).exists():
+        return None, None
+    try:
+        with pa.memory_map(str(path), 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+    except (pa.ArrowException, OSError):
+        return None, None
+    stored = (table.schema.metadata or {}).get(key)
+    if stored is None:
+        return None, None
+    return table, json.loads(stored)
+
+
+def _open_sidecar(path):
+    """Memory-mapped Arrow table for the CSV at path, or None if stale/missing."""
+    table, stored = read_table_metadata(sidecar_path(path), SIDECAR_METADATA_KEY)
+    if table is None or stored != _source_metadata(path):
+        return None
+    return table
+
+
+def read_sidecar(path, columns=None):
+    """Memory-map the sidecar for the CSV at path, projected to columns.
+
+    Returns None when there is no sidecar or it was built from a different
+    version of the CSV.
+    """
+    table = _open_sidecar(path)
+    if table is None:
+        return None
+    if columns is not None:
+        table = table.select([c for c in columns if c in table.column_names])
+    return table.to_pandas()
+
+
+def report_columns(path):
+    """Column names read_report can return for path."""
+    if pa is not None:
+        table = _open_sidecar(path)
+        if table is not None:
+            return list(table.column_names)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def ingest_report(path):
+    """Parse the CSV and (re)build its sidecar. Returns the parsed frame."""
+    df = parse_report_csv(path)
+    if pa is not None:
+        try:
+            write_sidecar(df, path)
+        except (pa.ArrowException, OSError):
+            pass  # Unwritable data dir or untypeable column: serve the parsed frame
+    return df
+
+
+def read_report(path, columns=None):
+    """Read a report as typed columns, from the sidecar when it is fresh.
+
+    columns projects the result (None reads everything). Without a fresh
+    sidecar the full CSV is ingested once so later projections are cheap;
+    without pyarrow only the needed CSV columns are parsed.
+    """
+    if pa is not None:
+        df = read_sidecar(path, columns)
+        if df is not None:
+            return df
+        df = ingest_report(path)
+    else:
+        df = parse_report_csv(path, columns)
+
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    return df
+
+
+def iter_report_chunks(path, chunk_rows, columns=None):
+    """Yield a report as typed frames of at most chunk_rows rows.
+
+    A fresh sidecar is sliced (zero-copy on the memory map); otherwise the
+    CSV is parsed incrementally. Either way only one chunk is materialized at
+    a time. Row index labels continue across chunks as in read_report.
+    """
+    table = _open_sidecar(path) if pa is not None else None
+    if table is not None:
+        if columns is not None:
+            table = table.select([c for c in columns if c in table.column_names])
+        for offset in range(0, table.num_rows, chunk_rows):
+            chunk = table.slice(offset, chunk_rows).to_pandas()
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            yield chunk
+        return
+
+    usecols = None if columns is None else _usecols(columns)
+    with pd.read_csv(path, usecols=usecols, dtype=_csv_dtypes(), chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            chunk = _type_columns(chunk)
+            if columns is not None:
+                chunk = chunk[[c for c in columns if c in chunk.columns]]
+            yield chunk
+
+
+def take_report_rows(path, positions, chunk_rows, columns=None):
+    """Read only the rows at positions (sorted, 0-based) of a report.
+
+    Returns (rows, row_count): the rows indexed by their positions and the
+    report's row count, so callers reading several files can place dataset
+    positions. A fresh sidecar serves them with a take on the memory map;
+    otherwise the CSV is scanned chunk by chunk and only those rows are kept.
+    Positions past the end are ignored.
+    """
+    positions = np.asarray(positions, dtype=np.int64)
+    table = _open_sidecar(path) if pa is not None else None
+    if table is not None:
+        if columns is not None:
+            table = table.select([c for c in columns if c in table.column_names])
+        positions = positions[positions < table.num_rows]
+        rows = table.take(pa.array(positions)).to_pandas()
+        rows.index = pd.Index(positions)
+        return rows, table.num_rows
+
+    frames, row_count = [], 0
+    for chunk in iter_report_chunks(path, chunk_rows, columns):
+        frames.append(chunk.loc[chunk.index.intersection(positions)])
+        row_count += len(chunk)
+    return (pd.concat(frames) if frames else pd.DataFrame(columns=columns)), row_count
+
+
+def iter_frame_chunks(df, chunk_rows):
+    """Yield consecutive row slices of df (at least one, even when empty)."""
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def export_formats():
+    """Export formats available in this environment."""
+    return [fmt for fmt in EXPORT_FORMATS if fmt != 'parquet' or pa is not None]
+
+
+def write_export(chunks, dest, fmt='csv'):
+    """Write frames from chunks to the binary file object dest, one at a time.
+
+    fmt is one of EXPORT_FORMATS. Only one chunk is serialized at a time, so
+    memory stays bounded by the chunk size rather than the export size.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(dest, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        return
+
+    raw = gzip.GzipFile(fileobj=dest, mode='wb') if fmt == 'csv.gz' else dest
+    text = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(text, header=(i == 0), index=False)
+    text.flush()
+    text.detach()
+    if raw is not dest:
+        raw.close()  # Writes the gzip trailer; dest itself stays open
+
+
+if __name__ == "__main__":
+    for arg in sys.argv[1:]:
+        if pa is None:
+            sys.exit("pyarrow is required to build sidecars")
+        ingest_report(arg)
+        print(f"Created {sidecar_path(arg)}")
@@ -0,0 +1,304 @@
+"""
+Prebuilt report snapshots for instant dashboard cold starts.
+
+A snapshot holds everything the dashboard draws for the unfiltered report:
+call_metrics, loan_stats, loan_metrics_df, the call aggregate cube and its
+hourly table, the pre-aggregated series behind each chart, the filter options
+and the data quality counts. It records the fingerprints of the report files
+(and the event rules'), so the dashboard renders from it only while it is
+current and falls back to full computation when it is stale or a filter needs
+raw rows.
+
+SnapshotBuilder builds snapshots of a changing set of reports incrementally:
+it keeps the per-file AggregateState and LoanStateStore, plus a profile of
+each file (filter options, time bounds, quality counts), and reads only the
+files that are new or changed, each in one chunked pass. The profiles are
+saved in the snapshot, so a restarted builder picks up where it left off.
+
+The snapshot is one Arrow IPC file: each table is stored as an embedded IPC
+buffer in a (name, data) table, and the scalar values sit in the schema
+metadata. Build it with
+
+    python src/snapshot.py [data source] [-o snapshot file]
+"""
+
+import argparse
+import json
+from datetime import datetime
+
+import pandas as pd
+
+from aggregate_state import AggregateState
+from aggregates import CallAggregates
+from filters import INDEXED_COLUMNS, TIME_COLUMN
+from instrumentation import nbytes_of
+from loan_state import LoanStateStore, LoanSummary
+from metrics import (
+    AGGREGATE_STATE_FILE, DATA_SOURCE, EVENT_RULES_FILE, LOAN_STATE_FILE, SNAPSHOT_FILE, iter_event_chunks
+)
+from report_dataset import report_paths
+from report_io import file_fingerprint, pa, read_table_metadata, write_table_atomic
+
+SNAPSHOT_VERSION = 3
+SNAPSHOT_METADATA_KEY = b"domu.snapshot"
+
+
+def chart_series(call_aggs):
+    """The pre-aggregated series behind each chart and table, by name."""
+    return {
+        'attempt_stats': call_aggs.attempt_stats(),
+        'forward_by_attempt': call_aggs.forward_by_attempt(),
+        'promise_category_counts': call_aggs.promise_category_counts(),
+        'end_reason_counts': call_aggs.end_reason_counts(),
+        'non_value_end_reason_counts': call_aggs.non_value_end_reason_counts(10)
+    }
+
+
+def _table_bytes(df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _table_frame(data):
+    return pa.ipc.open_file(pa.py_buffer(data)).read_all().to_pandas()
+
+
+def _json_value(value):
+    """JSON fallback for numpy scalars and timestamps."""
+    return str(value) if isinstance(value, pd.Timestamp) else value.tolist()
+
+
+class ReportSnapshot:
+    """Precomputed dashboard contents for a set of report files."""
+
+    def __init__(self, sources, depends_on, call_aggs, loan_metrics_df, loan_stats, options, bounds, quality,
+                 series=None, built_at=None, profiles=None):
+        self.sources = sources
+        self.depends_on = depends_on
+        self.call_aggs = call_aggs
+        self.call_metrics = call_aggs.call_metrics()
+        self.loan_metrics_df = loan_metrics_df
+        self.loan_stats = loan_stats
+        self.series = chart_series(call_aggs) if series is None else series
+        self.quality = quality
+        self._options = options
+        self._bounds = bounds
+        self.profiles = profiles or {}  # resolved path -> (fingerprint, profile), see SnapshotBuilder
+        self.built_at = built_at or datetime.now().isoformat(timespec='seconds')
+
+    @property
+    def data_as_of(self):
+        """Modification time of the newest source report."""
+        if not self.sources:
+            return None
+        return datetime.fromtimestamp(max(mtime_ns for _, _, mtime_ns in self.sources) / 1e9).isoformat(timespec='seconds')
+
+    def is_current(self, paths, depends_on=()):
+        """Whether the snapshot was built from exactly these files and dependencies."""
+        return self.sources == [list(file_fingerprint(p)) for p in paths] and \
+            self.depends_on == [list(file_fingerprint(p)) for p in depends_on]
+
+    # Filter widgets (same interface as FilterIndex and SqliteReport)
+
+    def options(self, column):
+        return self._options.get(column, [])
+
+    def date_bounds(self):
+        return self._bounds
+
+    @property
+    def nbytes(self):
+        return self.call_aggs.nbytes + nbytes_of([self.loan_metrics_df, self.series])
+
+    def save(self, path):
+        """Write the snapshot to path atomically (needs pyarrow)."""
+        if pa is None:
+            raise RuntimeError("pyarrow is required to write report snapshots")
+        tables = {'cube': self.call_aggs.cube, 'hourly': self.call_aggs.hourly, 'loan_metrics': self.loan_metrics_df}
+        # Count series are stored as (index, count) frames and restored on load
+        series_index = {}
+        for name, values in self.series.items():
+            if isinstance(values, pd.Series):
+                series_index[name] = values.index.name
+                values = values.reset_index()
+            tables[name] = values
+        table = pa.table({'name': list(tables), 'data': [_table_bytes(df) for df in tables.values()]})
+        metadata = dict(table.schema.metadata or {})
+        metadata[SNAPSHOT_METADATA_KEY] = json.dumps({
+            'version': SNAPSHOT_VERSION,
+            'sources': self.sources,
+            'depends_on': self.depends_on,
+            'built_at': self.built_at,
+            'loan_stats': self.loan_stats,
+            'options': self._options,
+            'bounds': self._bounds,
+            'quality': self.quality,
+            'profiles': self.profiles,
+            'series_index': series_index
+        }, default=_json_value).encode()
+        return write_table_atomic(table.replace_schema_metadata(metadata), path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a saved snapshot; None when missing, unreadable or from another version."""
+        table, stored = read_table_metadata(path, SNAPSHOT_METADATA_KEY)
+        if table is None or stored.get('version') != SNAPSHOT_VERSION:
+            return None
+        frames = {name: _table_frame(data)
+                  for name, data in zip(table.column('name').to_pylist(), table.column('data').to_pylist())}
+        cube, hourly, loan_metrics_df = frames.pop('cube'), frames.pop('hourly'), frames.pop('loan_metrics')
+        series = {}
+        for name, frame in frames.items():
+            if name in stored['series_index']:
+                frame = frame.set_index(frame.columns[0]).iloc[:, 0].rename_axis(stored['series_index'][name])
+            series[name] = frame
+        bounds = stored['bounds']
+        profiles = {source: (tuple(fingerprint), _profile_from_json(profile))
+                    for source, (fingerprint, profile) in stored['profiles'].items()}
+        return cls(
+            stored['sources'], stored['depends_on'], CallAggregates(cube, hourly), loan_metrics_df,
+            stored['loan_stats'], stored['options'],
+            None if bounds is None else (pd.Timestamp(bounds[0]), pd.Timestamp(bounds[1])),
+            stored['quality'], series, stored['built_at'], profiles
+        )
+
+
+def _profile_from_json(profile):
+    bounds = profile['bounds']
+    return dict(profile, bounds=None if bounds is None else [pd.Timestamp(bounds[0]), pd.Timestamp(bounds[1])])
+
+
+def scan_report(path):
+    """(CallAggregates, LoanSummary, profile) of one report file, in one chunked pass.
+
+    The profile holds the file's filter options, the bounds of its call
+    times and its data quality counts.
+    """
+    call_aggs = CallAggregates()
+    loans = LoanSummary()
+    values = {col: set() for col in INDEXED_COLUMNS}
+    first = last = None
+    quality = {'rows': 0, 'dated': 0, 'missing_category': 0}
+    for chunk in iter_event_chunks([path]):
+        call_aggs = call_aggs.merge(CallAggregates.from_frame(chunk))
+        loans.ingest(chunk)
+        for col in values:
+            if col in chunk.columns:
+                values[col].update(chunk[col].dropna().unique().tolist())
+        quality['rows'] += len(chunk)
+        if TIME_COLUMN in chunk.columns and chunk[TIME_COLUMN].notna().any():
+            quality['dated'] += int(chunk[TIME_COLUMN].notna().sum())
+            low, high = chunk[TIME_COLUMN].min(), chunk[TIME_COLUMN].max()
+            first = low if first is None else min(first, low)
+            last = high if last is None else max(last, high)
+        if 'category' in chunk.columns:
+            quality['missing_category'] += int(chunk['category'].isna().sum())
+    profile = {
+        'options': {col: sorted(found) for col, found in values.items() if found},
+        'bounds': None if first is None else [first, last],
+        'quality': quality
+    }
+    return call_aggs, loans, profile
+
+
+def _combine_profiles(profiles):
+    """(options, bounds, quality) over file profiles."""
+    values = {}
+    first = last = None
+    quality = {'rows': 0, 'dated': 0, 'missing_category': 0}
+    for profile in profiles:
+        for col, found in profile['options'].items():
+            values.setdefault(col, set()).update(found)
+        if profile['bounds'] is not None:
+            low, high = profile['bounds']
+            first = low if first is None else min(first, low)
+            last = high if last is None else max(last, high)
+        for name in quality:
+            quality[name] += profile['quality'][name]
+    options = {col: sorted(found) for col, found in values.items()}
+    return options, None if first is None else (first, last), quality
+
+
+class SnapshotBuilder:
+    """Builds snapshots of a changing set of report files, reading only the new or changed ones."""
+
+    def __init__(self, depends_on=(EVENT_RULES_FILE,), aggregate_state=None, loan_store=None, profiles=None):
+        self.depends_on = list(depends_on)
+        self.aggregate_state = AggregateState(self.depends_on) if aggregate_state is None else aggregate_state
+        self.loan_store = LoanStateStore(self.depends_on) if loan_store is None else loan_store
+        self.profiles = dict(profiles or {})  # resolved path -> (fingerprint, profile)
+
+    @classmethod
+    def load(cls, snapshot_path=SNAPSHOT_FILE, depends_on=(EVENT_RULES_FILE,)):
+        """A builder seeded from the persisted aggregate state, loan state and snapshot profiles."""
+        saved = ReportSnapshot.load(snapshot_path)
+        return cls(depends_on, AggregateState.load(AGGREGATE_STATE_FILE, depends_on),
+                   LoanStateStore.load(LOAN_STATE_FILE, depends_on), None if saved is None else saved.profiles)
+
+    def build(self, paths):
+        """A snapshot for the report files; only files not seen in their current version are read."""
+        depends_on = [list(file_fingerprint(p)) for p in self.depends_on]
+        if self.aggregate_state.depends_on != depends_on or self.loan_store.depends_on != depends_on:
+            # The event rules changed: every cube and loan summary is stale
+            self.aggregate_state = AggregateState(self.depends_on)
+            self.loan_store = LoanStateStore(self.depends_on)
+
+        scans = {}
+
+        def scan(path):
+            fingerprint = file_fingerprint(path)
+            if fingerprint not in scans:
+                scans[fingerprint] = scan_report(path)
+            return scans[fingerprint]
+
+        self.aggregate_state.sync(paths, lambda path: scan(path)[0])
+        self.loan_store.sync(paths, lambda path: scan(path)[1])
+        profiles = {}
+        for path in paths:
+            fingerprint = file_fingerprint(path)
+            entry = self.profiles.get(fingerprint[0])
+            if entry is None or tuple(entry[0]) != fingerprint:
+                entry = (fingerprint, scan(path)[2])
+            profiles[fingerprint[0]] = entry
+        self.profiles = profiles
+
+        options, bounds, quality = _combine_profiles(profile for _, profile in profiles.values())
+        loan_metrics_df, loan_stats = self.loan_store.loan_metrics()
+        return ReportSnapshot(
+            [list(file_fingerprint(p)) for p in paths], depends_on, self.aggregate_state.aggregates(),
+            loan_metrics_df, loan_stats, options, bounds, quality, profiles=profiles
+        )
+
+    def save_state(self):
+        """Persist the aggregate and loan state where the dashboard's loaders read them."""
+        for state, path in ((self.aggregate_state, AGGREGATE_STATE_FILE), (self.loan_store, LOAN_STATE_FILE)):
+            try:
+                state.save(path)
+            except (RuntimeError, OSError):
+                pass  # No pyarrow or unwritable data dir: keep the state in memory only
+
+
+def build_snapshot(paths):
+    """Compute a snapshot for the report files, one chunked pass per file."""
+    return SnapshotBuilder().build(paths)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the dashboard snapshot for a set of report files.")
+    parser.add_argument('source', nargs='?', default=DATA_SOURCE,
+                        help="report file, directory of domubank_report_* files, or glob pattern")
+    parser.add_argument('-o', '--output', default=str(SNAPSHOT_FILE), help="snapshot file to write")
+    args = parser.parse_args(argv)
+
+    paths = report_paths(args.source)
+    if not paths:
+        parser.error("no report files found")
+    build_snapshot(paths).save(args.output)
+    print(f"Created {args.output} from {len(paths)} report file(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Optional SQLite backend for report queries.
+
+The cleaned, event-flagged report is loaded once into a SQLite database next
+to the CSV (report.sqlite, or reports_<hash>.sqlite for a set of report
+files), indexed on loan_number, started_at, attempt and
+end_reason. Filters become a WHERE clause; the call aggregate cube is a
+single GROUP BY, so call metrics, the per-attempt and per-day charts and
+Top End Reasons are computed by SQLite without loading rows into memory;
+the Data Explorer reads one page at a time with LIMIT/OFFSET.
+
+Like the Arrow sidecar, the database records the fingerprints of the CSVs
+(and of the event rules) it was built from and is rebuilt when stale. It is
+opened read-only, one connection per query, so reruns on different threads
+never share a connection.
+"""
+
+import hashlib
+import json
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pandas as pd
+
+from aggregates import COUNT_MEASURES, DIMENSIONS, MEASURES, CallAggregates
+from report_io import CATEGORICAL_COLUMNS, atomic_target, file_fingerprint
+
+SQLITE_SUFFIX = ".sqlite"
+SQLITE_VERSION = 3
+TABLE = "calls"
+INDEXED_COLUMNS = ['loan_number', 'started_at', 'attempt', 'end_reason']
+
+
+def sqlite_path(paths):
+    """Location of the SQLite database for a set of report CSVs.
+
+    A single report keeps its database next to it; a set of reports gets one
+    named after a hash of their paths, in the first report's directory.
+    """
+    paths = [Path(p) for p in paths]
+    if len(paths) == 1:
+        return paths[0].with_suffix(SQLITE_SUFFIX)
+    digest = hashlib.sha1("\n".join(str(p.resolve()) for p in paths).encode()).hexdigest()[:12]
+    return paths[0].with_name(f"reports_{digest}{SQLITE_SUFFIX}")
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _source_metadata(paths, depends_on):
+    return {
+        'version': SQLITE_VERSION,
+        'sources': [list(file_fingerprint(p)) for p in paths],
+        'depends_on': [list(file_fingerprint(p)) for p in depends_on]
+    }
+
+
+def _sql_value(value):
+    """Parameter value for a filter criterion (numpy scalars and timestamps to Python)."""
+    if isinstance(value, pd.Timestamp):
+        return str(value)
+    return value.item() if hasattr(value, 'item') else value
+
+
+def build_sqlite(paths, chunks, depends_on=()):
+    """Load the frames from chunks into the database for the report CSVs, atomically.
+
+    chunks yields cleaned, event-flagged frames in file order. Returns the
+    database path.
+    """
+    target = sqlite_path(paths)
+    with atomic_target(target) as tmp:
+        with closing(sqlite3.connect(tmp)) as conn:
+            datetime_columns = bool_columns = None
+            for chunk in chunks:
+                if datetime_columns is None:
+                    datetime_columns = [c for c in chunk.columns if pd.api.types.is_datetime64_any_dtype(chunk[c])]
+                    bool_columns = [c for c in chunk.columns if pd.api.types.is_bool_dtype(chunk[c])]
+                # Timestamps as 'YYYY-MM-DD HH:MM:SS[.ffffff]' text, which sorts chronologically
+                chunk = chunk.assign(**{c: chunk[c].astype(str).where(chunk[c].notna(), None)
+                                        for c in datetime_columns})
+                chunk.to_sql(TABLE, conn, if_exists='append', index=False)
+
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({TABLE})")]
+            for col in INDEXED_COLUMNS:
+                if col in columns:
+                    conn.execute(f"CREATE INDEX {_quote('idx_' + col)} ON {TABLE} ({_quote(col)})")
+            metadata = dict(_source_metadata(paths, depends_on), datetime_columns=datetime_columns or [],
+                            bool_columns=bool_columns or [])
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("INSERT INTO meta VALUES ('source', ?)", (json.dumps(metadata),))
+            conn.commit()
+    return target
+
+
+class SqliteReport:
+    """Read-only queries over a report database built by build_sqlite."""
+
+    def __init__(self, db_path, metadata):
+        self.db_path = Path(db_path).resolve()
+        self.datetime_columns = metadata.get('datetime_columns', [])
+        self.bool_columns = metadata.get('bool_columns', [])
+        with self._connect() as conn:
+            self.columns = [row[1] for row in conn.execute(f"PRAGMA table_info({TABLE})")]
+
+    @classmethod
+    def open(cls, paths, depends_on=()):
+        """The database for the report CSVs, or None when missing or stale."""
+        target = sqlite_path(paths)
+        if not target.exists():
+            return None
+        try:
+            with closing(sqlite3.connect(f"{target.resolve().as_uri()}?mode=ro", uri=True)) as conn:
+                row = conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        metadata = json.loads(row[0])
+        expected = _source_metadata(paths, depends_on)
+        if any(metadata.get(key) != value for key, value in expected.items()):
+            return None
+        return cls(target, metadata)
+
+    def _connect(self):
+        return closing(sqlite3.connect(f"{self.db_path.as_uri()}?mode=ro", uri=True))
+
+    def _query(self, sql, params=()):
+        with self._connect() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    @property
+    def nbytes(self):
+        """Memory held (the data stays on disk)."""
+        return 0
+
+    # Filters
+
+    def _where(self, criteria):
+        """WHERE clause and parameters for FilterIndex-style criteria."""
+        clauses, params = [], []
+        for column, selected in (criteria or {}).items():
+            if column == 'date_range':
+                if 'started_at' not in self.columns:
+                    continue
+                start, end = selected
+                # As in FilterIndex, any date range leaves out calls without started_at
+                clauses.append('started_at IS NOT NULL')
+                if start is not None:
+                    clauses.append('started_at >= ?')
+                    params.append(_sql_value(start))
+                if end is not None:
+                    clauses.append('started_at < ?')
+                    params.append(_sql_value(end))
+            elif column in self.columns and selected:
+                clauses.append(f"{_quote(column)} IN ({', '.join('?' * len(selected))})")
+                params.extend(_sql_value(value) for value in selected)
+        return (f" WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    def options(self, column):
+        """Distinct non-missing values of a column, sorted."""
+        if column not in self.columns:
+            return []
+        q = _quote(column)
+        return [row[0] for row in self._query(f"SELECT DISTINCT {q} FROM {TABLE} WHERE {q} IS NOT NULL ORDER BY {q}")]
+
+    def date_bounds(self):
+        """(earliest, latest) started_at, or None."""
+        if 'started_at' not in self.columns:
+            return None
+        first, last = self._query(f"SELECT MIN(started_at), MAX(started_at) FROM {TABLE}")[0]
+        return None if first is None else (pd.Timestamp(first), pd.Timestamp(last))
+
+    def count(self, criteria=None):
+        where, params = self._where(criteria)
+        return self._query(f"SELECT COUNT(*) FROM {TABLE}{where}", params)[0][0]
+
+    def quality_counts(self):
+        """Row count, rows with started_at and rows missing category, over the whole report."""
+        dated = 'COUNT(started_at)' if 'started_at' in self.columns else '0'
+        missing = 'SUM(category IS NULL)' if 'category' in self.columns else '0'
+        rows, dated, missing = self._query(f"SELECT COUNT(*), {dated}, {missing} FROM {TABLE}")[0]
+        return {'rows': rows, 'dated': dated, 'missing_category': missing or 0}
+
+    # Aggregates
+
+    def aggregates(self, criteria=None):
+        """CallAggregates for the filtered calls: one GROUP BY for the cube, one for the hourly table."""
+        dimensions = []
+        for dim in DIMENSIONS:
+            if dim == 'date':
+                dimensions.append('date(started_at)' if 'started_at' in self.columns else 'NULL')
+            else:
+                dimensions.append(_quote(dim) if dim in self.columns else 'NULL')
+        measures = []
+        for name, (flag, column) in MEASURES.items():
+            value = _quote(column) if column else '1'
+            measures.append(f"SUM(CASE WHEN {_quote(flag)} THEN {value} ELSE 0 END)" if flag else f"SUM({value})")
+
+        where, params = self._where(criteria)
+        select = ', '.join(f"{expr} AS {_quote(name)}"
+                           for expr, name in zip(dimensions + measures, DIMENSIONS + list(MEASURES)))
+        group_by = ', '.join(str(i + 1) for i in range(len(DIMENSIONS)))
+        hourly = None
+        with self._connect() as conn:
+            cube = pd.read_sql(f"SELECT {select} FROM {TABLE}{where} GROUP BY {group_by}", conn, params=params)
+            if len(cube) > 0 and 'started_at' in self.columns:
+                dated = f"{where} AND started_at IS NOT NULL" if where else " WHERE started_at IS NOT NULL"
+                select_hourly = ', '.join([f"strftime('%Y-%m-%d %H:00:00', started_at) AS hour"] + [
+                    f"{expr} AS {_quote(name)}" for expr, name in zip(measures, MEASURES)
+                ])
+                hourly = pd.read_sql(f"SELECT {select_hourly} FROM {TABLE}{dated} GROUP BY 1 ORDER BY 1", conn,
+                                     params=params)
+        if len(cube) == 0:
+            return CallAggregates()
+
+        cube['date'] = pd.to_datetime(cube['date'])
+        for dim in DIMENSIONS:
+            if dim in CATEGORICAL_COLUMNS:
+                cube[dim] = cube[dim].astype('category')
+        measure_types = {name: 'int64' if name in COUNT_MEASURES else 'float64' for name in MEASURES}
+        if hourly is not None:
+            hourly = hourly.assign(hour=pd.to_datetime(hourly['hour'])).astype(measure_types)
+        return CallAggregates(cube.astype(measure_types), hourly)
+
+    # Rows
+
+    def _order_by(self, sort_by, descending):
+        """File order, or sort_by with missing values last and file order for ties."""
+        if sort_by is None:
+            return "rowid"
+        q = _quote(sort_by)
+        return f"{q} IS NULL, {q} {'DESC' if descending else 'ASC'}, rowid"
+
+    def _select(self, columns):
+        columns = self.columns if columns is None else [col for col in columns if col in self.columns]
+        return columns, ', '.join(['rowid - 1 AS "__row"'] + [_quote(col) for col in columns])
+
+    def _restore(self, df):
+        """Row positions as the index and original dtypes for timestamps and flags."""
+        df = df.set_index('__row').rename_axis(None)
+        for col in df.columns:
+            if col in self.datetime_columns:
+                df[col] = pd.to_datetime(df[col])
+            elif col in self.bool_columns:
+                df[col] = df[col].astype(bool)
+        return df
+
+    def page(self, criteria, sort_by, descending, offset, limit, columns=None):
+        """One page of rows in display order, indexed by row position in the report."""
+        columns, select = self._select(columns)
+        where, params = self._where(criteria)
+        sql = (f"SELECT {select} FROM {TABLE}{where} ORDER BY {self._order_by(sort_by, descending)} "
+               "LIMIT ? OFFSET ?")
+        with self._connect() as conn:
+            return self._restore(pd.read_sql(sql, conn, params=params + [int(limit), int(offset)]))
+
+    def position_of(self, criteria, sort_by, descending, column, value):
+        """0-based position of the first row with column == value in display order, or None."""
+        if column not in self.columns:
+            return None
+        where, params = self._where(criteria)
+        sql = (f"SELECT position FROM (SELECT {_quote(column)} AS value, "
+               f"ROW_NUMBER() OVER (ORDER BY {self._order_by(sort_by, descending)}) - 1 AS position "
+               f"FROM {TABLE}{where}) WHERE value = ? ORDER BY position LIMIT 1")
+        row = self._query(sql, params + [value])
+        return row[0][0] if row else None
+
+    def frame(self, criteria=None, columns=None):
+        """Filtered rows in file order (projected to columns) as one frame."""
+        columns, select = self._select(columns)
+        where, params = self._where(criteria)
+        with self._connect() as conn:
+            return self._restore(pd.read_sql(f"SELECT {select} FROM {TABLE}{where} ORDER BY rowid", conn,
+                                             params=params))
+
+    def chunks(self, criteria, chunk_rows, columns=None):
+        """Yield filtered rows in file order, chunk_rows at a time (at least one chunk)."""
+        columns, select = self._select(columns)
+        where, params = self._where(criteria)
+        with self._connect() as conn:
+            empty = True
+            for chunk in pd.read_sql(f"SELECT {select} FROM {TABLE}{where} ORDER BY rowid", conn,
+                                     params=params, chunksize=chunk_rows):
+                empty = False
+                yield self._restore(chunk)
+            if empty:
+                yield self._restore(pd.DataFrame(columns=['__row'] + columns))
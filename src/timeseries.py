@@ -0,0 +1,93 @@
+"""
+Call metrics over time at hour, day, week and month granularity.
+
+CallAggregates keeps, next to its cube, an hourly table: the measures summed
+per clock hour (started_at floored to the hour, as datetime64). Every time
+view is a roll-up of that table, so TimeSeries resamples it once per
+granularity when it is built and switching granularity reads a precomputed
+frame instead of going back to the calls. Periods without calls are kept
+(total 0, rates NaN) so the charts show gaps as gaps.
+
+Rolling rates are ratios of windowed sums (promise calls over calls in the
+trailing 7 or 28 days), not averages of per-period rates, so a quiet day
+weighs what its calls weigh. The windows slide hour by hour, and each period
+shows the window ending at its last hour: at month granularity the 28-day
+rate is that of the month's last 28 days, not the month's own rate. The
+hour-of-day x day-of-week heatmap is a roll-up of the same hourly table.
+"""
+
+import pandas as pd
+
+# Granularity -> resample rule; periods are labelled by their first instant (weeks start on Monday)
+GRANULARITIES = {'hour': 'h', 'day': 'D', 'week': 'W-MON', 'month': 'MS'}
+
+# Trailing windows, in days, of the rolling rates
+ROLLING_DAYS = (7, 28)
+
+# Rate -> (counted measure, base measure) in the hourly table
+RATES = {
+    'promise_rate': ('promise_calls', 'calls'),
+    'value_rate': ('value_calls', 'calls')
+}
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+MEASURES = sorted({measure for pair in RATES.values() for measure in pair})
+
+
+def _with_rates(sums):
+    """Rates (in %) from summed counts; NaN where there were no calls."""
+    rates = {}
+    for rate, (count, base) in RATES.items():
+        rates[rate] = sums[count] / sums[base].where(sums[base] > 0) * 100
+    return sums.assign(**rates)
+
+
+class TimeSeries:
+    """Per-period call counts and rates at every granularity, plus the weekly activity pattern."""
+
+    def __init__(self, hourly):
+        # hourly: one row per clock hour with calls ('hour' column plus the measures)
+        hourly = hourly.loc[hourly['hour'].notna()].set_index('hour').sort_index()
+        counts = hourly.reindex(columns=MEASURES, fill_value=0)
+
+        # Every clock hour from the first call to the last, and the trailing windows ending at each
+        hours = counts.resample('h').sum()
+        windows = {days: hours.rolling(f'{days}D').sum() for days in ROLLING_DAYS}
+
+        self._stats = {}
+        for granularity, rule in GRANULARITIES.items():
+            stats = _with_rates(hours.resample(rule, closed='left', label='left').sum())
+            for days, window in windows.items():
+                window = window.resample(rule, closed='left', label='left').last()
+                for rate, (count, base) in RATES.items():
+                    stats[f'{rate}_{days}d'] = window[count] / window[base].where(window[base] > 0) * 100
+            self._stats[granularity] = stats.rename_axis('period').reset_index()
+
+        by_slot = counts.groupby([counts.index.dayofweek, counts.index.hour]).sum()
+        by_slot.index = by_slot.index.set_names(['weekday', 'hour'])
+        slots = pd.MultiIndex.from_product([range(7), range(24)], names=['weekday', 'hour'])
+        self._slots = _with_rates(by_slot.reindex(slots, fill_value=0))
+
+    def __len__(self):
+        """Clock hours covered, from the first call to the last."""
+        return len(self._stats['hour'])
+
+    def stats(self, granularity='day'):
+        """Per-period totals and rates (columns: period, calls, promise_calls, value_calls, *_rate, *_rate_<n>d)."""
+        if granularity not in self._stats:
+            raise ValueError(f"Unknown granularity {granularity!r}; expected one of {', '.join(GRANULARITIES)}")
+        return self._stats[granularity]
+
+    def heatmap(self, measure='calls'):
+        """measure (a summed count or a rate) by weekday (rows, Monday first) and hour of day (columns)."""
+        if measure not in self._slots.columns:
+            raise ValueError(f"Unknown heatmap measure {measure!r}; expected one of {', '.join(self._slots.columns)}")
+        grid = self._slots[measure].unstack('hour')
+        grid.index = pd.Index([WEEKDAYS[day] for day in grid.index], name='weekday')
+        return grid
+
+    @property
+    def nbytes(self):
+        return int(sum(stats.memory_usage(deep=True).sum() for stats in self._stats.values())
+                   + self._slots.memory_usage(deep=True).sum())
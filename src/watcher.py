@@ -0,0 +1,181 @@
+"""
+Background watcher that keeps the dashboard snapshot up to date.
+
+DataWatcher polls a data source (a directory of reports, a glob or a file)
+on its own thread. When the set of report files or any file's fingerprint
+changes, and then stays unchanged for one more poll (so files still being
+copied in are not picked up half-written), it ingests the new or changed
+files (typed sidecars; reports too large to load whole are read from the CSV
+in chunks instead), folds just those files into the per-file aggregate and
+loan state (see SnapshotBuilder), builds a snapshot of the whole set and
+validates it. Only a snapshot that passes validation is written (atomically) and
+swapped in; until then, and whenever a build fails, sessions keep rendering
+the last good one.
+
+Run it as a script to keep the snapshot file fresh for dashboards running
+in other processes:
+
+    python src/watcher.py [data source]
+"""
+
+import argparse
+import threading
+import time
+
+from metrics import DATA_SOURCE, EVENT_RULES_FILE, SNAPSHOT_FILE, WATCH_INTERVAL_SECONDS, should_stream
+from report_dataset import dataset_columns, dataset_fingerprint, report_paths
+from report_io import _open_sidecar, ingest_report, pa
+from snapshot import ReportSnapshot, SnapshotBuilder
+
+# Columns every report needs for the metrics and event rules
+REQUIRED_COLUMNS = ['loan_number', 'attempt', 'started_at', 'duration', 'category', 'end_reason']
+
+
+def validate_reports(paths):
+    """Raise ValueError when the report files cannot produce the metrics."""
+    if not paths:
+        raise ValueError("no report files")
+    for path in paths:
+        missing = [col for col in REQUIRED_COLUMNS if col not in dataset_columns([path])]
+        if missing:
+            raise ValueError(f"{path.name} is missing columns: {', '.join(missing)}")
+
+
+def validate_snapshot(snapshot):
+    """Raise ValueError when a built snapshot is not internally consistent."""
+    rows = snapshot.quality['rows']
+    if rows == 0:
+        raise ValueError("the reports hold no rows")
+    if snapshot.call_aggs.total_calls != rows:
+        raise ValueError(f"aggregated {snapshot.call_aggs.total_calls:,} calls from {rows:,} rows")
+    if snapshot.call_aggs.dated_calls != snapshot.quality['dated']:
+        raise ValueError("dated call counts disagree")
+    rates = ['promise_rate', 'qualified_handoff_rate', 'waste_rate', 'cost_saved_pct']
+    if any(not 0 <= snapshot.call_metrics[name] <= 100 for name in rates):
+        raise ValueError("a call rate is outside 0-100%")
+    if snapshot.call_metrics['total_minutes'] < 0:
+        raise ValueError("negative call durations")
+
+
+class DataWatcher:
+    """Polls a data source and swaps in a new validated snapshot when reports change."""
+
+    def __init__(self, source=DATA_SOURCE, snapshot_path=SNAPSHOT_FILE, depends_on=(EVENT_RULES_FILE,),
+                 interval=WATCH_INTERVAL_SECONDS):
+        self.source = source
+        self.snapshot_path = snapshot_path
+        self.depends_on = list(depends_on)
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._current = ((), None)  # (paths, snapshot) of the last good build
+        self._built = None  # signature of the last build attempt, good or not
+        self._seen = None  # signature seen by the previous poll
+        self._builder = None  # SnapshotBuilder, created by the first rebuild
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_error = None
+        self.last_checked = None
+
+    def current(self):
+        """(paths, snapshot) of the last good build; snapshot is None before the first one."""
+        with self._lock:
+            return self._current
+
+    @property
+    def pending(self):
+        """Whether a change has been seen that is not swapped in yet."""
+        return self._seen is not None and self._seen != self._built
+
+    def _signature(self, paths):
+        return dataset_fingerprint(paths), dataset_fingerprint(self.depends_on)
+
+    def poll(self):
+        """Check the source once; rebuild when it changed and has settled. Returns whether a snapshot was swapped in."""
+        paths = report_paths(self.source)
+        signature = self._signature(paths)
+        settled = signature == self._seen
+        self._seen = signature
+        self.last_checked = time.time()
+        if signature == self._built:
+            return False
+
+        if self._built is None:
+            # First poll: adopt the saved snapshot when it still matches the files
+            saved = ReportSnapshot.load(self.snapshot_path)
+            if saved is not None and saved.is_current(paths, self.depends_on):
+                self._swap(paths, saved, signature)
+                return True
+        if not settled:
+            return False
+        try:
+            self._swap(paths, self.rebuild(paths), signature)
+        except Exception as e:
+            # Keep serving the last good snapshot; retry once the files change again
+            self._built = signature
+            self.last_error = f"{type(e).__name__}: {e}"
+            return False
+        return True
+
+    def rebuild(self, paths):
+        """Ingest, build and validate a snapshot for paths, and save it; raises when invalid."""
+        validate_reports(paths)
+        if pa is not None:
+            for path in paths:
+                # Reports too large to load whole get no sidecar; the builder reads their CSV in chunks
+                if not should_stream([path]) and _open_sidecar(path) is None:
+                    ingest_report(path)
+        if self._builder is None:
+            self._builder = SnapshotBuilder.load(self.snapshot_path, self.depends_on)
+        snapshot = self._builder.build(paths)
+        validate_snapshot(snapshot)
+        if pa is not None:
+            snapshot.save(self.snapshot_path)
+            self._builder.save_state()
+        return snapshot
+
+    def _swap(self, paths, snapshot, signature):
+        with self._lock:
+            self._current = (tuple(paths), snapshot)
+        self._built = signature
+        self.last_error = None
+
+    def start(self):
+        """Poll on a daemon thread until stop()."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="domu-data-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:  # e.g. a file vanished mid-poll; try again next time
+                self.last_error = f"{type(e).__name__}: {e}"
+            if self._stop.wait(self.interval):
+                return
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the dashboard snapshot whenever the reports change.")
+    parser.add_argument('source', nargs='?', default=DATA_SOURCE,
+                        help="report file, directory of domubank_report_* files, or glob pattern")
+    args = parser.parse_args(argv)
+
+    watcher = DataWatcher(args.source)
+    reported = None
+    while True:
+        if watcher.poll():
+            paths, snapshot = watcher.current()
+            print(f"Snapshot of {len(paths)} report file(s) swapped in, data as of {snapshot.data_as_of}")
+        elif watcher.last_error and watcher.last_error != reported:
+            print(f"Rejected: {watcher.last_error}")
+        reported = watcher.last_error
+        time.sleep(watcher.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+# The app modules import each other as top-level modules from src/, as when run with streamlit
+SRC = Path(__file__).resolve().parents[1] / "src"
+sys.path.insert(0, str(SRC))
+
+BUNDLED_REPORT = SRC.parent / "data" / "domubank_report_11272025 - Domubankreport.csv"
+
+
+@pytest.fixture
+def write_report(tmp_path):
+    """write(name, rows): write those rows of the bundled report as a report CSV in tmp_path."""
+    if not BUNDLED_REPORT.exists():
+        pytest.skip("no bundled report in data/")
+    source = pd.read_csv(BUNDLED_REPORT)
+
+    def write(name, rows):
+        path = tmp_path / name
+        source.iloc[rows].to_csv(path, index=False)
+        return path
+
+    return write
@@ -0,0 +1,135 @@
+"""
+AggregateState: incremental sync, merge, rebuild/verify and persistence.
+
+Report files are slices of the bundled report; cubes are compared with
+CallAggregates.equals.
+"""
+
+import json
+
+import pytest
+
+from aggregate_state import AggregateState
+from metrics import EVENT_RULES_FILE, stream_call_aggregates
+from report_io import pa
+
+
+def build(path):
+    return stream_call_aggregates([path])
+
+
+class CountingBuilder:
+    """build, recording which files were aggregated."""
+
+    def __init__(self):
+        self.built = []
+
+    def __call__(self, path):
+        self.built.append(path.name)
+        return build(path)
+
+
+def fresh(paths):
+    state = AggregateState([EVENT_RULES_FILE])
+    state.sync(paths, build)
+    return state
+
+
+def test_incremental_sync_equals_rebuild(write_report):
+    first = write_report("domubank_report_11252025.csv", slice(0, 300))
+    second = write_report("domubank_report_11262025.csv", slice(300, 600))
+    state = AggregateState([EVENT_RULES_FILE])
+    builder = CountingBuilder()
+    assert state.sync([first, second], builder)
+
+    third = write_report("domubank_report_11272025.csv", slice(600, 1000))
+    assert state.sync([first, second, third], builder)
+    assert builder.built == [first.name, second.name, third.name]
+
+    # A changed file is re-aggregated and replaces its old cube
+    second = write_report(second.name, slice(300, 450))
+    assert state.sync([first, second, third], builder)
+    assert builder.built[3:] == [second.name]
+    assert not state.sync([first, second, third], builder)
+
+    assert state.verify(build) == []
+    assert state.aggregates().equals(state.rebuild(build).aggregates())
+    assert state.aggregates().equals(fresh([first, second, third]).aggregates())
+    assert state.aggregates().total_calls == 850
+
+
+def test_sync_drops_removed_files(write_report):
+    first = write_report("domubank_report_11252025.csv", slice(0, 500))
+    second = write_report("domubank_report_11262025.csv", slice(500, 1000))
+    state = fresh([first, second])
+    assert state.sync([second], build)
+    assert state.sources == [str(second.resolve())]
+    assert state.aggregates().equals(fresh([second]).aggregates())
+
+
+def test_selected_aggregates(write_report):
+    paths = [write_report(f"domubank_report_1125202{i}.csv", slice(i * 250, (i + 1) * 250)) for i in range(4)]
+    state = fresh(paths)
+    assert state.aggregates(paths[1:3]).equals(fresh(paths[1:3]).aggregates())
+
+
+def test_merge_of_disjoint_states_equals_one_state(write_report):
+    first = write_report("domubank_report_11252025.csv", slice(0, 400))
+    second = write_report("domubank_report_11262025.csv", slice(400, 1000))
+    merged = fresh([first]).merge(fresh([second]))
+    assert sorted(merged.sources) == sorted(str(p.resolve()) for p in [first, second])
+    assert merged.aggregates().equals(fresh([first, second]).aggregates())
+
+
+def test_merge_rejects_different_versions_of_a_file(write_report):
+    path = write_report("domubank_report_11252025.csv", slice(0, 400))
+    before = fresh([path])
+    path = write_report(path.name, slice(0, 200))
+    with pytest.raises(ValueError, match="different versions"):
+        before.merge(fresh([path]))
+
+
+def test_merge_rejects_different_event_rules(write_report, tmp_path):
+    path = write_report("domubank_report_11252025.csv", slice(0, 400))
+    rules = tmp_path / "event_rules.json"
+    rules.write_text(EVENT_RULES_FILE.read_text())
+    other = AggregateState([rules])
+    other.sync([path], build)
+    with pytest.raises(ValueError, match="event rules"):
+        fresh([path]).merge(other)
+
+
+def test_verify_detects_drift(write_report):
+    first = write_report("domubank_report_11252025.csv", slice(0, 500))
+    second = write_report("domubank_report_11262025.csv", slice(500, 1000))
+    state = fresh([first, second])
+    # Tamper with one stored cube
+    fingerprint, aggs = state._sources[str(second.resolve())]
+    aggs.cube.loc[0, 'calls'] += 1
+    assert state.verify(build) == [str(second.resolve())]
+
+
+@pytest.mark.skipif(pa is None, reason="pyarrow is required to persist aggregate state")
+def test_save_load_round_trip(write_report, tmp_path):
+    paths = [write_report(f"domubank_report_1125202{i}.csv", slice(i * 500, (i + 1) * 500)) for i in range(2)]
+    state = fresh(paths)
+    state.save(tmp_path / "state.arrow")
+    loaded = AggregateState.load(tmp_path / "state.arrow", [EVENT_RULES_FILE])
+    assert loaded.sources == state.sources
+    assert loaded.verify(build) == []
+    assert loaded.aggregates().equals(state.aggregates())
+    # Nothing to aggregate again
+    assert not loaded.sync(paths, CountingBuilder())
+
+
+@pytest.mark.skipif(pa is None, reason="pyarrow is required to persist aggregate state")
+def test_state_from_other_event_rules_is_discarded(write_report, tmp_path):
+    path = write_report("domubank_report_11252025.csv", slice(0, 500))
+    fresh([path]).save(tmp_path / "state.arrow")
+
+    rules = tmp_path / "event_rules.json"
+    config = json.loads(EVENT_RULES_FILE.read_text())
+    config['events'][0]['any'][0]['in'].append('wants_call_back')
+    rules.write_text(json.dumps(config))
+    loaded = AggregateState.load(tmp_path / "state.arrow", [rules])
+    assert loaded.sources == []
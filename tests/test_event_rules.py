@@ -0,0 +1,115 @@
+"""
+The declarative event rules engine (event_rules.py).
+
+Covers rule-file validation, negation, references to earlier events, the
+error for a condition on a missing column, and the flags of the shipped
+rules against the original hard-coded define_events on the bundled report.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from event_rules import apply_event_rules, load_event_rules, parse_event_rules
+from metrics import EVENT_RULES_FILE, define_events, load_data
+from report_dataset import report_paths
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+
+EVENTS = ['promise_category', 'forward_event', 'value_event', 'waste_event']
+
+
+def reference_define_events(path):
+    """The original hard-coded event flags, on the CSV parsed as the original load_data did."""
+    df = pd.read_csv(path)
+    df['category_lower'] = df['category'].astype(str).str.lower()
+    df['end_reason_lower'] = df['end_reason'].astype(str).str.lower()
+    promise_categories = ['partial_payment_accepted', 'willing_to_pay', 'promise_to_pay']
+    df['promise_category'] = df['category_lower'].isin(promise_categories)
+    df['forward_event'] = df['end_reason_lower'].str.contains('assistant-forward', case=False, na=False)
+    df['value_event'] = df['promise_category'] | df['forward_event']
+    df['waste_event'] = (df['end_reason_lower'] == 'silence-timed-out') | (~df['value_event'])
+    return df
+
+
+def rules(*events):
+    return parse_event_rules({'events': list(events)})
+
+
+def calls():
+    return pd.DataFrame({
+        'category': pd.Categorical(['PROMISE_TO_PAY', 'voicemail', None, 'Willing_To_Pay']),
+        'end_reason': ['customer-ended-call', 'silence-timed-out', 'assistant-forwarded-call', None]
+    })
+
+
+@pytest.mark.parametrize("config, message", [
+    ({}, "non-empty 'events' list"),
+    ({'events': []}, "non-empty 'events' list"),
+    ({'events': [{'any': [{'event': 'x'}]}]}, "needs a 'name'"),
+    ({'events': [{'name': 'a', 'any': []}]}, "non-empty 'any' list"),
+    ({'events': [{'name': 'a', 'any': [{'event': 'b'}]}, {'name': 'b', 'any': [{'column': 'c', 'equals': 'x'}]}]},
+     "not defined before it"),
+    ({'events': [{'name': 'a', 'any': [{'equals': 'x'}]}]}, "without 'column' or 'event'"),
+    ({'events': [{'name': 'a', 'any': [{'column': 'c'}]}]}, "needs exactly one of"),
+    ({'events': [{'name': 'a', 'any': [{'column': 'c', 'equals': 'x', 'in': ['x']}]}]}, "needs exactly one of"),
+])
+def test_invalid_rules_are_rejected(config, message):
+    with pytest.raises(ValueError, match=message):
+        parse_event_rules(config)
+
+
+def test_shipped_rules_load():
+    assert [event['name'] for event in load_event_rules(EVENT_RULES_FILE)] == EVENTS
+
+
+def test_column_operators_are_case_insensitive():
+    events = rules(
+        {'name': 'promise', 'any': [{'column': 'category', 'in': ['promise_to_pay', 'WILLING_TO_PAY']}]},
+        {'name': 'silence', 'any': [{'column': 'end_reason', 'equals': 'Silence-Timed-Out'}]},
+        {'name': 'forward', 'any': [{'column': 'end_reason', 'contains': 'FORWARD'}]}
+    )
+    df = apply_event_rules(calls(), events)
+    assert df['promise'].tolist() == [True, False, False, True]
+    assert df['silence'].tolist() == [False, True, False, False]
+    assert df['forward'].tolist() == [False, False, True, False]
+
+
+def test_negate_inverts_a_condition():
+    events = rules(
+        {'name': 'not_voicemail', 'any': [{'column': 'category', 'equals': 'voicemail', 'negate': True}]}
+    )
+    # Missing values never match, so their negation does
+    assert apply_event_rules(calls(), events)['not_voicemail'].tolist() == [True, False, True, True]
+
+
+def test_events_refer_to_earlier_events():
+    events = rules(
+        {'name': 'promise', 'any': [{'column': 'category', 'in': ['promise_to_pay', 'willing_to_pay']}]},
+        {'name': 'forward', 'any': [{'column': 'end_reason', 'contains': 'forward'}]},
+        {'name': 'value', 'any': [{'event': 'promise'}, {'event': 'forward'}]},
+        {'name': 'no_value', 'any': [{'event': 'value', 'negate': True}]}
+    )
+    df = apply_event_rules(calls(), events)
+    assert df['value'].tolist() == [True, False, True, True]
+    assert df['no_value'].tolist() == [False, True, False, False]
+
+
+@pytest.mark.parametrize("negate", [False, True])
+def test_condition_on_missing_column_raises(negate):
+    events = rules({'name': 'flagged', 'any': [{'column': 'status', 'equals': 'answered', 'negate': negate}]})
+    with pytest.raises(ValueError, match="'flagged'.*'status'"):
+        apply_event_rules(calls(), events)
+
+
+def test_shipped_rules_match_original_define_events():
+    paths = report_paths(DATA_DIR)
+    if len(paths) != 1:
+        pytest.skip("expects the single bundled report in data/")
+    expected = reference_define_events(paths[0])
+    actual = define_events(load_data(paths))
+    for event in EVENTS:
+        np.testing.assert_array_equal(actual[event].to_numpy(dtype=bool), expected[event].to_numpy(dtype=bool),
+                                      err_msg=event)
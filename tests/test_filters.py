@@ -0,0 +1,120 @@
+"""
+FilterIndex and apply_filters against plain boolean masks.
+
+Random filter combinations over categorical columns (the typed report
+columns), factorized ones (attempt, object and float columns), missing
+values and started_at ranges whose bounds fall on actual call times.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from filters import INDEXED_COLUMNS, FilterIndex
+from metrics import apply_filters, define_events, load_data
+from report_dataset import report_paths
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+
+
+def expected_positions(df, criteria):
+    mask = np.ones(len(df), dtype=bool)
+    for column, selected in criteria.items():
+        if column == 'date_range':
+            start, end = selected
+            times = df['started_at']
+            column_mask = times.notna()
+            if start is not None:
+                column_mask &= times >= start
+            if end is not None:
+                column_mask &= times < end
+            mask &= column_mask.to_numpy()
+        elif selected:
+            mask &= df[column].isin(selected).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def random_criteria(rng, df, index):
+    criteria = {}
+    for column in rng.permutation(list(index.columns))[:rng.integers(0, len(index.columns) + 1)]:
+        options = index.options(column)
+        criteria[column] = [options[i] for i in rng.choice(len(options), rng.integers(0, min(len(options), 4) + 1),
+                                                             replace=False)]
+    if rng.random() < 0.6:
+        times = df['started_at'].dropna().to_numpy()
+        # Bounds on actual call times check the inclusive start and exclusive end
+        start, end = (None if rng.random() < 0.2 else pd.Timestamp(rng.choice(times)) for _ in range(2))
+        if start is not None and end is not None and start > end:
+            start, end = end, start
+        criteria['date_range'] = (start, end)
+    return criteria
+
+
+def check_random_filters(df, seed, trials):
+    index = FilterIndex(df)
+    rng = np.random.default_rng(seed)
+    for _ in range(trials):
+        criteria = random_criteria(rng, df, index)
+        expected = expected_positions(df, criteria)
+        positions = index.select(criteria)
+        if positions is None:
+            assert len(expected) == len(df), criteria
+        else:
+            np.testing.assert_array_equal(positions, expected, err_msg=str(criteria))
+        view = apply_filters(df, index, criteria)
+        assert len(view) == len(expected)
+        pd.testing.assert_frame_equal(view.frame(), df.iloc[expected])
+
+
+@pytest.fixture(scope="module")
+def bundled_report():
+    paths = report_paths(DATA_DIR)
+    if not paths:
+        pytest.skip("no bundled report in data/")
+    return define_events(load_data(paths))
+
+
+def test_bundled_report_filters_match_masks(bundled_report):
+    assert isinstance(bundled_report['category'].dtype, pd.CategoricalDtype)
+    assert not isinstance(bundled_report['attempt'].dtype, pd.CategoricalDtype)
+    check_random_filters(bundled_report, seed=0, trials=200)
+
+
+def random_frame(seed, n=2000):
+    """Categorical, object and float columns with missing values, and NaT start times."""
+    rng = np.random.default_rng(seed)
+    categories = ['answered', 'missed', 'voicemailed', 'failed']
+    return pd.DataFrame({
+        'category': pd.Categorical(rng.choice(categories + [None], n), categories=categories + ['unused']),
+        'end_reason': pd.Series(rng.choice(['a', 'b', 'c', None], n), dtype=object),
+        'status': rng.choice(['x', 'y'], n),
+        'state': pd.Categorical(rng.choice(['TX', 'CA', 'NY'], n)),
+        'attempt': np.where(rng.random(n) < 0.1, np.nan, rng.integers(1, 8, n)),
+        'started_at': pd.Series(pd.to_datetime(rng.integers(0, 50, n) * 3600, unit='s',
+                                               origin='2025-11-20')).where(rng.random(n) > 0.2)
+    })
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_random_frame_filters_match_masks(seed):
+    check_random_filters(random_frame(seed), seed=seed, trials=200)
+
+
+def test_options_skip_missing_and_unused_values():
+    df = random_frame(0)
+    index = FilterIndex(df)
+    assert index.options('category') == ['answered', 'missed', 'voicemailed', 'failed']
+    assert index.options('end_reason') == ['a', 'b', 'c']
+    assert set(index.options('attempt')) == set(range(1, 8))
+    assert index.date_bounds() == (df['started_at'].min(), df['started_at'].max())
+    assert sorted(index.columns) == sorted(INDEXED_COLUMNS)
+
+
+def test_no_criteria_selects_every_row():
+    df = random_frame(1)
+    index = FilterIndex(df)
+    assert index.select({}) is None
+    assert index.select({'category': [], 'date_range': (None, None)}) is not None
+    assert apply_filters(df, index, {}).positions is None
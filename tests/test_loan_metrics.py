@@ -0,0 +1,192 @@
+"""
+compute_loan_level_metrics, LoanSummary and LoanStateStore against the original per-loan loop.
+
+reference_loan_level_metrics is the implementation compute_loan_level_metrics
+replaced: group by loan, sort each loan's calls by attempt then started_at
+(NaT last), and sum durations up to the first value event. The vectorized
+version, the incremental LoanSummary and the per-file LoanStateStore must
+give the same loans, attempts and minutes on the bundled report and on
+randomized frames.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from loan_state import EMPTY_LOAN_STATS, LoanStateStore, LoanSummary
+from metrics import compute_loan_level_metrics, define_events, load_data
+from report_dataset import report_paths
+from report_io import pa
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+
+
+def reference_loan_level_metrics(df):
+    """The original per-loan loop (kept as the reference)."""
+    if len(df) == 0 or 'loan_number' not in df.columns:
+        return pd.DataFrame(), dict(EMPTY_LOAN_STATS)
+
+    loan_metrics = []
+    for loan_num, loan_df in df.groupby('loan_number'):
+        loan_df_sorted = loan_df.sort_values(['attempt', 'started_at'], na_position='last').reset_index(drop=True)
+        value_mask = loan_df_sorted['value_event']
+        if value_mask.sum() == 0:
+            continue
+        first_value_idx = value_mask.idxmax()
+        first_value_row = loan_df_sorted.iloc[first_value_idx]
+        seconds_to_value = loan_df_sorted.iloc[:first_value_idx + 1]['duration'].sum()
+        loan_metrics.append({
+            'loan_number': loan_num,
+            'attempts_to_value': first_value_row['attempt'],
+            'minutes_to_value': seconds_to_value / 60.0
+        })
+
+    if len(loan_metrics) == 0:
+        return pd.DataFrame(), dict(EMPTY_LOAN_STATS)
+
+    loan_metrics_df = pd.DataFrame(loan_metrics)
+    stats = {
+        'median_attempts_to_value': int(loan_metrics_df['attempts_to_value'].median()),
+        'mean_attempts_to_value': loan_metrics_df['attempts_to_value'].mean(),
+        'p90_attempts_to_value': int(loan_metrics_df['attempts_to_value'].quantile(0.9)),
+        'median_minutes_to_value': loan_metrics_df['minutes_to_value'].median(),
+        'mean_minutes_to_value': loan_metrics_df['minutes_to_value'].mean(),
+        'p90_minutes_to_value': loan_metrics_df['minutes_to_value'].quantile(0.9)
+    }
+    return loan_metrics_df, stats
+
+
+def random_calls(seed):
+    """Calls with missing loan numbers, NaT starts, tied attempts and loans that never reach value."""
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 1500))
+    loans = [f"L{i}" for i in range(max(1, n // 4))] + [None]
+    return pd.DataFrame({
+        'loan_number': rng.choice(loans, n),
+        'attempt': rng.integers(1, 6, n),
+        'started_at': pd.to_datetime(rng.integers(0, 10**6, n), unit='s').where(rng.random(n) > 0.2),
+        'duration': np.round(rng.random(n) * 100, 3),
+        'value_event': rng.random(n) < rng.choice([0.0, 0.05, 0.3])
+    })
+
+
+def assert_same_metrics(expected, actual):
+    expected_df, expected_stats = expected
+    actual_df, actual_stats = actual
+    if len(expected_df) == 0:
+        assert len(actual_df) == 0
+    else:
+        pd.testing.assert_frame_equal(expected_df.reset_index(drop=True), actual_df.reset_index(drop=True),
+                                      check_dtype=False)
+    assert expected_stats.keys() == actual_stats.keys()
+    for key, value in expected_stats.items():
+        assert actual_stats[key] == pytest.approx(value), key
+
+
+@pytest.fixture(scope="module")
+def bundled_report():
+    paths = report_paths(DATA_DIR)
+    if not paths:
+        pytest.skip("no bundled report in data/")
+    return define_events(load_data(paths))
+
+
+def test_bundled_report_matches_reference(bundled_report):
+    expected = reference_loan_level_metrics(bundled_report)
+    assert len(expected[0]) > 0
+    assert_same_metrics(expected, compute_loan_level_metrics(bundled_report))
+
+
+def test_bundled_report_loan_summary_matches_reference(bundled_report):
+    summary = LoanSummary()
+    for batch in np.array_split(np.arange(len(bundled_report)), 4):
+        summary.ingest(bundled_report.iloc[batch])
+    assert_same_metrics(reference_loan_level_metrics(bundled_report), summary.loan_metrics())
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_random_calls_match_reference(seed):
+    df = random_calls(seed)
+    assert_same_metrics(reference_loan_level_metrics(df), compute_loan_level_metrics(df))
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_random_batches_match_reference(seed):
+    df = random_calls(seed)
+    bounds = np.sort(np.random.default_rng(seed).integers(0, len(df), 3))
+    batches = np.split(np.arange(len(df)), bounds)
+    summary = LoanSummary()
+    for batch in batches:
+        summary.ingest(df.iloc[batch])
+    assert_same_metrics(reference_loan_level_metrics(df), summary.loan_metrics())
+
+
+def test_no_value_events():
+    df = random_calls(0).assign(value_event=False)
+    loan_metrics_df, stats = compute_loan_level_metrics(df)
+    assert len(loan_metrics_df) == 0
+    assert stats == EMPTY_LOAN_STATS
+
+
+def store_of(tmp_path, frames):
+    """A LoanStateStore synced over one placeholder report file per frame (the frames are its calls)."""
+    paths, calls = [], {}
+    for i, frame in enumerate(frames):
+        path = tmp_path / f"domubank_report_112{i}2025.csv"
+        path.write_text(f"report {i}\n")
+        paths.append(path)
+        calls[str(path.resolve())] = frame
+    store = LoanStateStore()
+    store.sync(paths, lambda path: LoanSummary().ingest(calls[str(Path(path).resolve())]))
+    return store, paths
+
+
+def calls_frame(rows):
+    return pd.DataFrame(rows, columns=['loan_number', 'attempt', 'started_at', 'duration', 'value_event']).astype(
+        {'started_at': 'datetime64[us]', 'duration': float, 'value_event': bool})
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_store_combines_files(tmp_path, seed):
+    df = random_calls(seed)
+    first, second = df.iloc[:len(df) // 2], df.iloc[len(df) // 2:]
+    store, paths = store_of(tmp_path, [first, second])
+    assert_same_metrics(reference_loan_level_metrics(df), store.loan_metrics())
+    assert_same_metrics(reference_loan_level_metrics(second), store.loan_metrics(paths[1:]))
+
+
+def test_store_places_earlier_attempt_from_later_file(tmp_path):
+    # Loan A reaches value on attempt 2 in the first file; its attempt 1 only shows up in the second.
+    # Loan B's value event in the second file sorts before a call of the first file.
+    first = calls_frame([
+        ('A', 2, '2025-11-20 10:00', 30.0, True),
+        ('A', 3, '2025-11-21 10:00', 10.0, False),
+        ('B', 2, '2025-11-20 11:00', 40.0, False),
+    ])
+    second = calls_frame([
+        ('A', 1, '2025-11-19 10:00', 20.0, False),
+        ('B', 1, '2025-11-19 11:00', 20.0, True),
+    ])
+    store, _ = store_of(tmp_path, [first, second])
+    loan_metrics_df, _ = store.loan_metrics()
+    assert loan_metrics_df['loan_number'].tolist() == ['A', 'B']
+    assert loan_metrics_df['attempts_to_value'].tolist() == [2, 1]
+    assert loan_metrics_df['minutes_to_value'].tolist() == pytest.approx([50 / 60, 20 / 60])
+    assert_same_metrics(reference_loan_level_metrics(pd.concat([first, second])), (loan_metrics_df, _))
+
+
+@pytest.mark.skipif(pa is None, reason="pyarrow is required to persist the loan state store")
+@pytest.mark.parametrize("seed", range(4))
+def test_store_save_load_round_trip(tmp_path, seed):
+    df = random_calls(seed)
+    frames = [df.iloc[rows] for rows in np.array_split(np.arange(len(df)), 3)]
+    store, paths = store_of(tmp_path, frames)
+    store.save(tmp_path / "loan_state.arrow")
+
+    # Read back without a sync: the saved prefixes alone give the metrics
+    loaded = LoanStateStore.load(tmp_path / "loan_state.arrow")
+    assert loaded.sources == store.sources
+    assert_same_metrics(reference_loan_level_metrics(df), loaded.loan_metrics())
+    assert_same_metrics(compute_loan_level_metrics(pd.concat(frames[1:])), loaded.loan_metrics(paths[1:]))
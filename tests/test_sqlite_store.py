@@ -0,0 +1,85 @@
+"""
+SqliteReport against the in-memory path (load_report + FilterIndex).
+
+The database is built for two slices of the bundled report; random filter
+combinations are compared row for row, as aggregate cubes, and as sorted
+pages (missing values last, ties in file order) and loan_number jumps.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import CallAggregates
+from filters import FilterIndex
+from metrics import EVENT_RULES_FILE, apply_filters, load_report, load_sqlite_report
+from sqlite_store import SqliteReport, sqlite_path
+from test_filters import random_criteria
+
+SORT_COLUMNS = ['started_at', 'category', 'end_reason', 'attempt', 'loan_number']
+
+
+@pytest.fixture
+def reports(write_report):
+    paths = [write_report("domubank_report_11262025.csv", slice(0, 600)),
+             write_report("domubank_report_11272025.csv", slice(600, 1000))]
+    df = load_report(paths)
+    return paths, df, FilterIndex(df), load_sqlite_report(paths)
+
+
+def display_order(view, sort_by, descending):
+    """Row positions within the view in display order, as the in-memory explorer sorts them."""
+    if sort_by is None:
+        return np.arange(len(view))
+    values = view.column(sort_by).reset_index(drop=True)
+    return values.sort_values(ascending=not descending, na_position='last', kind='stable').index.to_numpy()
+
+
+def test_database_is_built_next_to_the_reports(reports):
+    paths, df, index, report = reports
+    assert report.db_path == sqlite_path(paths).resolve()
+    assert SqliteReport.open(paths, depends_on=[EVENT_RULES_FILE]) is not None
+    assert report.count() == len(df)
+    assert report.date_bounds() == index.date_bounds()
+    for column in index.columns:
+        assert report.options(column) == sorted(index.options(column)), column
+
+
+def test_filters_and_aggregates_match_memory(reports):
+    paths, df, index, report = reports
+    rng = np.random.default_rng(0)
+    for _ in range(40):
+        criteria = random_criteria(rng, df, index)
+        view = apply_filters(df, index, criteria)
+        assert report.count(criteria) == len(view), criteria
+        rows = report.frame(criteria, ['loan_number', 'started_at', 'value_event'])
+        expected = view.frame()
+        np.testing.assert_array_equal(rows.index.to_numpy(), np.arange(len(df))[expected.index],
+                                      err_msg=str(criteria))
+        pd.testing.assert_series_equal(rows['started_at'], expected['started_at'].astype(rows['started_at'].dtype),
+                                       check_index=False)
+        assert (rows['value_event'].to_numpy() == expected['value_event'].to_numpy()).all()
+        assert report.aggregates(criteria).equals(CallAggregates.from_frame(expected)), criteria
+
+
+@pytest.mark.parametrize("sort_by", [None] + SORT_COLUMNS)
+@pytest.mark.parametrize("descending", [False, True])
+def test_pages_and_jumps_match_memory(reports, sort_by, descending):
+    paths, df, index, report = reports
+    rng = np.random.default_rng(1)
+    for _ in range(10):
+        criteria = random_criteria(rng, df, index)
+        view = apply_filters(df, index, criteria)
+        order = display_order(view, sort_by, descending)
+        positions = view.frame().index.to_numpy()[order]
+        offset, limit = int(rng.integers(0, max(len(view), 1))), 25
+        page = report.page(criteria, sort_by, descending, offset, limit, ['loan_number'])
+        np.testing.assert_array_equal(page.index.to_numpy(), positions[offset:offset + limit],
+                                      err_msg=str(criteria))
+
+        if len(view):
+            loans = view.column('loan_number').to_numpy()[order]
+            loan = loans[rng.integers(0, len(loans))]
+            assert report.position_of(criteria, sort_by, descending, 'loan_number', loan) == \
+                int(np.flatnonzero(loans == loan)[0])
+        assert report.position_of(criteria, sort_by, descending, 'loan_number', 'no such loan') is None